@@ -2,43 +2,22 @@
 """0212涨价实验报告生成器
 按同事口径：DWD表 + type NOT IN (3,4,5) + 仅饮品 + 门店订单 + 生命周期分层
 """
-import subprocess, json, time, sys, os
+import json, sys, os
 from datetime import datetime
 
-def run_sql(sql, max_retries=4, wait=10):
-    for attempt in range(max_retries):
-        result = subprocess.run(
-            [os.path.expanduser('~/.claude/skills/cyberdata-query/run_sql.sh'), sql],
-            capture_output=True, text=True, timeout=120
-        )
-        output = result.stdout.strip()
-        if '查询失败或无结果' in output or not output:
-            if attempt < max_retries - 1:
-                print(f"  重试 {attempt+2}/{max_retries}...")
-                time.sleep(wait)
-                continue
-            return None
-        lines = output.split('\n')
-        data_start = 0
-        for i, line in enumerate(lines):
-            if '\t' in line and not line.startswith('提交') and not line.startswith('任务') and not line.startswith('等待'):
-                data_start = i
-                break
-        if data_start >= len(lines):
-            if attempt < max_retries - 1:
-                time.sleep(wait)
-                continue
-            return None
-        headers = lines[data_start].split('\t')
-        rows = []
-        for line in lines[data_start+1:]:
-            if line.strip() and '\t' in line:
-                rows.append(dict(zip(headers, line.split('\t'))))
-        if rows:
-            return rows
-        if attempt < max_retries - 1:
-            time.sleep(wait)
-    return None
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cyberdata'))
+from cyberdata_query import CyberDataClient, QueryError
+
+client = CyberDataClient(verbose=False)
+
+def run_sql(sql):
+    """跑一条 SQL，返回 [{列名: 值}, ...]；失败或无数据返回 None"""
+    try:
+        headers, rows = client.run(sql)
+    except QueryError as e:
+        print(f"  {e}")
+        return None
+    return [dict(zip(headers, r)) for r in rows] or None
 
 # ============================================================
 # 人群组名映射
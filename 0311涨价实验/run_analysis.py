@@ -4,14 +4,13 @@
 分析期间: 2026-03-11 ~ 2026-03-16
 """
 
-import json, time, os, subprocess, sys
+import json, time, os, sys
 from datetime import datetime
 
 # ============ CONFIG ============
 EXPERIMENT_START = '2026-03-11'
 END_DATE = '2026-03-16'
 GROUP_DT = '2026-03-15'
-AUTH_FILE = os.path.expanduser('~/.claude/skills/cyberdata-query/auth.json')
 OUTPUT_DIR = os.path.expanduser('~/Vibe coding/0311涨价实验')
 
 # Experiment design
@@ -37,85 +36,19 @@ GROUP_ORDER = ['涨价组1', '涨价组2', '对照组3']
 LIFECYCLE_ORDER = ['0-15天', '16-30天', '31+天']
 
 # ============ API ============
-def load_auth():
-    with open(AUTH_FILE) as f:
-        return json.load(f)
-
-def run_sql(sql, auth, wait=6, max_poll=4):
-    """Submit SQL query and poll for results"""
-    cookies = auth['cookies']
-    jwttoken = auth['jwttoken']
-    ts = str(int(time.time() * 1000))
-
-    submit_body = json.dumps({
-        "_t": int(ts), "tenantId": "1001", "userId": "47",
-        "projectId": "1906904360294313985", "resourceGroupId": 1,
-        "taskId": "1990991087752757249", "variables": {},
-        "sqlStatement": sql, "env": 5
-    })
-
-    r = subprocess.run(
-        ['curl', '-s', 'https://idpcd.luckincoffee.us/api/dev/task/run',
-         '-H', 'accept: application/json, text/plain, */*',
-         '-H', 'content-type: application/json; charset=UTF-8',
-         '-b', cookies, '-H', f'jwttoken: {jwttoken}',
-         '-H', 'productkey: CyberData',
-         '-H', 'origin: https://idpcd.luckincoffee.us',
-         '--data-raw', submit_body],
-        capture_output=True, text=True, timeout=30
-    )
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cyberdata'))
+from cyberdata_query import CyberDataClient
 
-    resp = json.loads(r.stdout)
-    if resp.get('code') != '200':
-        raise Exception(f"Submit failed: {resp}")
-
-    task_id = resp['data']
-
-    for attempt in range(max_poll):
-        time.sleep(wait)
-        ts = str(int(time.time() * 1000))
-        get_body = json.dumps({
-            "_t": int(ts), "tenantId": "1001", "userId": "47",
-            "projectId": "1906904360294313985", "env": 5,
-            "taskInstanceId": task_id
-        })
-
-        r = subprocess.run(
-            ['curl', '-s', 'https://idpcd.luckincoffee.us/api/logger/getQueryLog',
-             '-H', 'accept: application/json, text/plain, */*',
-             '-H', 'content-type: application/json; charset=UTF-8',
-             '-b', cookies, '-H', f'jwttoken: {jwttoken}',
-             '-H', 'productkey: CyberData',
-             '-H', 'origin: https://idpcd.luckincoffee.us',
-             '--data-raw', get_body],
-            capture_output=True, text=True, timeout=30
-        )
-
-        resp = json.loads(r.stdout)
-        if resp.get('code') == '200' and resp.get('data'):
-            columns = resp['data'][0].get('columns', [])
-            if columns and len(columns) >= 1:
-                headers = columns[0]
-                rows = columns[1:] if len(columns) > 1 else []
-                return headers, rows
-
-    raise Exception(f"Query timed out after {max_poll} polls (task: {task_id})")
-
-def query(name, sql, auth, wait=6, max_poll=4):
-    """Run a named query with logging"""
+def print_result(name, headers, rows):
+    """Print a short preview of a query result"""
     print(f"\n{'='*50}")
-    print(f"[{name}] Running...")
-    start = time.time()
-    headers, rows = run_sql(sql, auth, wait=wait, max_poll=max_poll)
-    elapsed = time.time() - start
-    print(f"[{name}] Done in {elapsed:.1f}s — {len(rows)} rows")
+    print(f"[{name}] {len(rows)} rows")
     if rows:
         print(f"  Headers: {headers}")
         for row in rows[:3]:
             print(f"  {row}")
         if len(rows) > 3:
             print(f"  ... and {len(rows)-3} more rows")
-    return headers, rows
 
 # ============ SQL QUERIES ============
 
@@ -935,7 +868,6 @@ new Chart(document.getElementById('chartCups'), {{type:'line', data:{{labels, da
 
 def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    auth = load_auth()
 
     print("=" * 60)
     print("0311 价格实验分析")
@@ -943,12 +875,25 @@ def main():
     print(f"人群 dt: {GROUP_DT}")
     print("=" * 60)
 
-    # Run all queries
-    _, overall_rows = query("Q1: 整体指标", SQL_OVERALL, auth, wait=8, max_poll=5)
-    _, lifecycle_rows = query("Q2: 分层指标", SQL_LIFECYCLE, auth, wait=8, max_poll=5)
-    _, visit_overall_rows = query("Q3: 整体到访", SQL_VISIT_OVERALL, auth, wait=8, max_poll=5)
-    _, visit_lc_rows = query("Q4: 分层到访", SQL_VISIT_LIFECYCLE, auth, wait=8, max_poll=5)
-    _, daily_rows = query("Q5: 日度趋势", SQL_DAILY, auth, wait=8, max_poll=5)
+    # Submit all queries up front, then poll them together
+    client = CyberDataClient()
+    start = time.time()
+    results = client.run_many({
+        "Q1: 整体指标": SQL_OVERALL,
+        "Q2: 分层指标": SQL_LIFECYCLE,
+        "Q3: 整体到访": SQL_VISIT_OVERALL,
+        "Q4: 分层到访": SQL_VISIT_LIFECYCLE,
+        "Q5: 日度趋势": SQL_DAILY,
+    })
+    print(f"\nAll queries done in {time.time() - start:.1f}s")
+    for name, (headers, rows) in results.items():
+        print_result(name, headers, rows)
+
+    overall_rows = results["Q1: 整体指标"][1]
+    lifecycle_rows = results["Q2: 分层指标"][1]
+    visit_overall_rows = results["Q3: 整体到访"][1]
+    visit_lc_rows = results["Q4: 分层到访"][1]
+    daily_rows = results["Q5: 日度趋势"][1]
 
     # Parse results
     overall_headers = ['grp', 'total_users', 'order_users', 'drink_cnt', 'drink_pay', 'drink_origin', 'order_cnt', 'itt_pay', 'itt_cups', 'price_per_cup', 'aov', 'conv_rate', 'discount_rate']
@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 """0311 价格实验 — 5 子群分析脚本"""
-import json, time, os, subprocess, sys
+import json, time, os, sys
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cyberdata'))
+from cyberdata_query import CyberDataClient
+
 EXPERIMENT_START = '2026-03-11'
 END_DATE = '2026-03-16'
 GROUP_DT = '2026-03-15'
-AUTH_FILE = os.path.expanduser('~/.claude/skills/cyberdata-query/auth.json')
 OUTPUT_DIR = os.path.expanduser('~/Vibe coding/0311涨价实验')
 
 SUB_GROUPS = {
@@ -25,49 +27,10 @@ COMPARISONS = [
 ]
 
 # ============ API ============
-def load_auth():
-    with open(AUTH_FILE) as f:
-        return json.load(f)
-
-def run_sql(sql, auth, wait=8, max_poll=5):
-    cookies, jwttoken = auth['cookies'], auth['jwttoken']
-    ts = str(int(time.time() * 1000))
-    body = json.dumps({"_t": int(ts), "tenantId": "1001", "userId": "47",
-        "projectId": "1906904360294313985", "resourceGroupId": 1,
-        "taskId": "1990991087752757249", "variables": {}, "sqlStatement": sql, "env": 5})
-    r = subprocess.run(['curl', '-s', 'https://idpcd.luckincoffee.us/api/dev/task/run',
-        '-H', 'accept: application/json, text/plain, */*', '-H', 'content-type: application/json; charset=UTF-8',
-        '-b', cookies, '-H', f'jwttoken: {jwttoken}', '-H', 'productkey: CyberData',
-        '-H', 'origin: https://idpcd.luckincoffee.us', '--data-raw', body],
-        capture_output=True, text=True, timeout=30)
-    resp = json.loads(r.stdout)
-    if resp.get('code') != '200': raise Exception(f"Submit failed: {resp}")
-    task_id = resp['data']
-    for _ in range(max_poll):
-        time.sleep(wait)
-        ts = str(int(time.time() * 1000))
-        gb = json.dumps({"_t": int(ts), "tenantId": "1001", "userId": "47",
-            "projectId": "1906904360294313985", "env": 5, "taskInstanceId": task_id})
-        r = subprocess.run(['curl', '-s', 'https://idpcd.luckincoffee.us/api/logger/getQueryLog',
-            '-H', 'accept: application/json, text/plain, */*', '-H', 'content-type: application/json; charset=UTF-8',
-            '-b', cookies, '-H', f'jwttoken: {jwttoken}', '-H', 'productkey: CyberData',
-            '-H', 'origin: https://idpcd.luckincoffee.us', '--data-raw', gb],
-            capture_output=True, text=True, timeout=30)
-        resp = json.loads(r.stdout)
-        if resp.get('code') == '200' and resp.get('data'):
-            cols = resp['data'][0].get('columns', [])
-            if cols and len(cols) >= 1:
-                return cols[0], cols[1:] if len(cols) > 1 else []
-    raise Exception(f"Timeout (task: {task_id})")
-
-def query(name, sql, auth, wait=8):
-    print(f"\n{'='*50}\n[{name}] Running...")
-    t0 = time.time()
-    h, rows = run_sql(sql, auth, wait=wait)
-    print(f"[{name}] {len(rows)} rows in {time.time()-t0:.1f}s")
+def print_result(name, h, rows):
+    print(f"[{name}] {len(rows)} rows")
     for r in rows[:3]: print(f"  {r}")
     if len(rows) > 3: print(f"  ... +{len(rows)-3} more")
-    return h, rows
 
 # ============ SUB-GROUP CTE (reused across queries) ============
 SUB_GROUP_CTE = f"""
@@ -358,13 +321,20 @@ def generate_excel(overall, lifecycle, visits, daily):
 # ============ MAIN ============
 def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    auth = load_auth()
     print(f"{'='*60}\n0311 价格实验 — 5 子群分析\n{EXPERIMENT_START} ~ {END_DATE}\n{'='*60}")
 
-    h1, r1 = query("Q1: 5子群整体", SQL_OVERALL, auth, wait=10)
-    h2, r2 = query("Q2: 5子群×生命周期", SQL_LIFECYCLE, auth, wait=10)
-    h3, r3 = query("Q3: 5子群到访", SQL_VISIT, auth, wait=10)
-    h4, r4 = query("Q4: 日度趋势", SQL_DAILY, auth, wait=10)
+    client = CyberDataClient()
+    t0 = time.time()
+    results = client.run_many({
+        "Q1: 5子群整体": SQL_OVERALL,
+        "Q2: 5子群×生命周期": SQL_LIFECYCLE,
+        "Q3: 5子群到访": SQL_VISIT,
+        "Q4: 日度趋势": SQL_DAILY,
+    })
+    print(f"\n{len(results)} queries in {time.time()-t0:.1f}s")
+    for name, (h, rows) in results.items():
+        print_result(name, h, rows)
+    (h1, r1), (h2, r2), (h3, r3), (h4, r4) = results.values()
 
     oh = ['sub_grp','total_users','order_users','drink_cnt','drink_pay','drink_origin','order_cnt','itt_pay','itt_cups','price_per_cup','aov','conv_rate','discount_rate']
     lh = ['sub_grp','lifecycle'] + oh[1:]
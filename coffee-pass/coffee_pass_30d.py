@@ -1,95 +1,21 @@
 #!/usr/bin/env python3
 """Coffee Pass R2: 购买前后30天消费频次对比"""
-import requests, json, time, os
+import json, os, sys
 
-BASE_URL = "https://idpcd.luckincoffee.us"
-AUTH_FILE = os.path.expanduser("~/.claude/skills/cyberdata-query/auth.json")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cyberdata"))
+from cyberdata_query import CyberDataClient, QueryError
 
-with open(AUTH_FILE) as f:
-    auth = json.load(f)
-
-HEADERS = {
-    "accept": "application/json, text/plain, */*",
-    "content-type": "application/json; charset=UTF-8",
-    "jwttoken": auth["jwttoken"],
-    "productkey": "CyberData",
-    "origin": BASE_URL,
-}
-COOKIES = {}
-for part in auth["cookies"].split(";"):
-    part = part.strip()
-    if "=" in part:
-        k, v = part.split("=", 1)
-        COOKIES[k.strip()] = v.strip()
-
-
-def submit_sql(sql, label=""):
-    payload = {
-        "_t": int(time.time() * 1000),
-        "tenantId": "1001", "userId": "47",
-        "projectId": "1906904360294313985", "resourceGroupId": 1,
-        "taskId": "1985617719742480386", "variables": {},
-        "sqlStatement": sql, "env": 5,
-    }
-    resp = requests.post(f"{BASE_URL}/api/dev/task/run", json=payload, headers=HEADERS, cookies=COOKIES)
-    if resp.status_code != 200:
-        print(f"[{label}] HTTP {resp.status_code}")
-        return None
-    if not resp.text.strip():
-        print(f"[{label}] 空响应 — Token 可能已过期")
-        return None
-    data = resp.json()
-    if data.get("code") not in [0, "200", 200]:
-        print(f"[{label}] 提交失败: {data}")
-        return None
-    task_id = data["data"]
-    print(f"[{label}] 已提交, taskInstanceId={task_id}")
-    return task_id
-
-
-def get_result(task_instance_id, label="", max_wait=300):
-    payload = {
-        "_t": int(time.time() * 1000),
-        "tenantId": "1001", "userId": "47",
-        "projectId": "1906904360294313985", "env": 5,
-        "taskInstanceId": task_instance_id,
-    }
-    for i in range(max_wait // 3):
-        time.sleep(3)
-        try:
-            resp = requests.post(f"{BASE_URL}/api/logger/getQueryLog", json=payload, headers=HEADERS, cookies=COOKIES, timeout=30)
-        except Exception as e:
-            print(f"[{label}] 网络错误，重试... {e}")
-            time.sleep(5)
-            continue
-        data = resp.json()
-        records = data.get("data", [])
-        if not records:
-            if i % 5 == 0:
-                print(f"[{label}] 等待中... ({i*3}s)")
-            continue
-        rec = records[0]
-        columns = rec.get("columns", [])
-        if columns:
-            header = columns[0]
-            rows = columns[1:]
-            print(f"[{label}] 完成: {len(rows)} 行")
-            # Convert to list of dicts
-            return [dict(zip(header, r)) for r in rows]
-        err = rec.get("errorMessage", "")
-        if err:
-            print(f"[{label}] 失败: {err[:200]}")
-            return None
-    print(f"[{label}] TIMEOUT")
-    return None
+client = CyberDataClient(task_id="1985617719742480386")
 
 
 def run_query(sql, label=""):
     print(f">>> {label}")
-    qid = submit_sql(sql, label)
-    if not qid:
+    try:
+        header, rows = client.run(sql, label)
+    except QueryError as e:
+        print(f"[{label}] 失败: {e}")
         return None
-    return get_result(qid, label)
+    return [dict(zip(header, r)) for r in rows]
 
 
 # --- 购买前后30天对比（单次扫描，避免 UNION 超时） ---
@@ -5,102 +5,24 @@
 活动时间: 2026-02-06 ~ 2026-02-15
 """
 
-import requests
 import json
-import time
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "cyberdata"))
+from cyberdata_query import CyberDataClient, QueryError
 
-BASE_URL = "https://idpcd.luckincoffee.us"
-AUTH_FILE = os.path.expanduser("~/.claude/skills/cyberdata-query/auth.json")
 OUTPUT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "coffee_pass_data.json")
 
-# 读取认证
-with open(AUTH_FILE) as f:
-    auth = json.load(f)
-
-HEADERS = {
-    "accept": "application/json, text/plain, */*",
-    "content-type": "application/json; charset=UTF-8",
-    "jwttoken": auth["jwttoken"],
-    "productkey": "CyberData",
-    "origin": BASE_URL,
-}
-# 解析 cookies 字符串
-cookie_str = auth["cookies"]
-COOKIES = {}
-for part in cookie_str.split(";"):
-    part = part.strip()
-    if "=" in part:
-        k, v = part.split("=", 1)
-        COOKIES[k.strip()] = v.strip()
-
-
-def submit_sql(sql, label=""):
-    payload = {
-        "_t": int(time.time() * 1000),
-        "tenantId": "1001",
-        "userId": "47",
-        "projectId": "1906904360294313985",
-        "resourceGroupId": 1,
-        "taskId": "1985617719742480386",
-        "variables": {},
-        "sqlStatement": sql,
-        "env": 5,
-    }
-    resp = requests.post(f"{BASE_URL}/api/dev/task/run", json=payload, headers=HEADERS, cookies=COOKIES)
-    if resp.status_code != 200:
-        print(f"[{label}] HTTP {resp.status_code}: {resp.text[:200]}")
-        return None
-    if not resp.text.strip():
-        print(f"[{label}] 空响应 — Token 可能已过期，请更新认证")
-        return None
-    data = resp.json()
-    if data.get("code") not in [0, "200", 200]:
-        print(f"[{label}] 提交失败: {data}")
-        return None
-    task_id = data["data"] if isinstance(data["data"], str) else data["data"]
-    print(f"[{label}] 已提交, taskInstanceId={task_id}")
-    return task_id
-
-
-def get_result(task_instance_id, label="", max_wait=180):
-    payload = {
-        "_t": int(time.time() * 1000),
-        "tenantId": "1001",
-        "userId": "47",
-        "projectId": "1906904360294313985",
-        "env": 5,
-        "taskInstanceId": task_instance_id,
-    }
-    for i in range(max_wait // 3):
-        time.sleep(3)
-        resp = requests.post(f"{BASE_URL}/api/logger/getQueryLog", json=payload, headers=HEADERS, cookies=COOKIES)
-        data = resp.json()
-        records = data.get("data", [])
-        if not records:
-            print(f"[{label}] 等待中... ({i*3}s)")
-            continue
-        rec = records[0]
-        columns = rec.get("columns", [])
-        if columns:
-            header = columns[0]
-            rows = columns[1:]
-            print(f"[{label}] 完成: {len(rows)} 行")
-            return header, rows
-        status = rec.get("status")
-        if status == 3 or rec.get("log"):
-            print(f"[{label}] 失败: {str(rec)[:300]}")
-            return None, None
-        print(f"[{label}] 等待中... ({i*3}s)")
-    print(f"[{label}] 超时 ({max_wait}s)")
-    return None, None
+client = CyberDataClient(task_id="1985617719742480386", max_wait=180)
 
 
 def run_query(sql, label=""):
-    task_id = submit_sql(sql, label)
-    if not task_id:
+    try:
+        return client.run(sql, label)
+    except QueryError as e:
+        print(f"[{label}] {e}")
         return None, None
-    return get_result(task_id, label)
 
 
 def to_dicts(header, rows):
@@ -486,22 +408,14 @@ def main():
     print("Step 2: 批量执行分析查询")
     print("=" * 60)
 
-    # 提交所有查询（并行提交）
-    task_ids = {}
-    for label, sql in queries[1:]:  # 跳过 Q0
-        task_id = submit_sql(sql, label)
-        if task_id:
-            task_ids[label] = task_id
-        time.sleep(0.5)  # 避免频率限制
-
-    # 等待所有结果
-    print("\n收集查询结果...")
-    for label, task_id in task_ids.items():
-        h, r = get_result(task_id, label, max_wait=180)
-        if h:
-            results[label] = to_dicts(h, r)
-        else:
+    # 先全部提交，再统一轮询；单条失败记为空结果，不影响其他查询
+    batch = client.run_many(dict(queries[1:]), return_exceptions=True)  # 跳过 Q0
+    for label, result in batch.items():
+        if isinstance(result, QueryError):
+            print(f"  ⚠️  {label} 失败: {result}")
             results[label] = []
+        else:
+            results[label] = to_dicts(*result)
 
     # 保存到 JSON
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
@@ -0,0 +1,111 @@
+"""
+相同查询合并 — 同一台机器上同时跑的报表不重复向数仓提交同一条 SQL
+
+日报 cron、周报、临时刷新的实验脚本经常在同一时间提交逐字相同的 SQL。
+每条 SQL（规范化后）对应一个锁文件：
+  拿到锁的一方（leader）正常提交、轮询，完成后把结果写进 spool 文件再放锁；
+  没拿到锁的一方（follower）不提交，等锁释放后直接读 spool。
+leader 失败时不写 spool，follower 拿到锁后自己提交，相当于接替执行。
+
+锁用 fcntl.flock：跨进程有效，同一进程内不同线程各自 open 的文件描述符之间
+同样互斥；进程崩溃时系统自动释放。没有 fcntl 的平台（Windows）不做合并。
+"""
+
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+
+from result_cache import cache_key
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
+SPOOL_DIR = Path.home() / ".cache/cyberdata/inflight"
+SPOOL_TTL = 3600        # spool 只用于交接，超过 1 小时的直接清理
+
+
+class Takeover(Exception):
+    """leader 放锁但没有留下结果（失败退出），由当前等待方持锁接替执行"""
+
+    def __init__(self, fd):
+        super().__init__("leader 未完成，接替执行")
+        self.fd = fd
+
+
+class Inflight:
+    """进行中查询的锁 + 结果交接（锁以文件描述符为单位，可跨线程共用一个实例）"""
+
+    def __init__(self, path=SPOOL_DIR):
+        self.path = Path(path)
+
+    @property
+    def enabled(self):
+        return fcntl is not None
+
+    def key(self, sql):
+        return cache_key(sql)
+
+    def _spool_file(self, key):
+        return self.path / f"{key}.json.gz"
+
+    def acquire(self, key):
+        """尝试成为这条 SQL 的 leader：成功返回持锁的 fd，已有人在跑返回 None"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path / f"{key}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def release(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def publish(self, key, fd, headers, rows):
+        """leader 完成：写 spool 后放锁"""
+        f = self._spool_file(key)
+        tmp = f.with_suffix(f".{os.getpid()}.{fd}.tmp")
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8") as fp:
+                json.dump({"headers": headers, "rows": rows}, fp,
+                          ensure_ascii=False, separators=(",", ":"))
+            tmp.replace(f)
+        except OSError:
+            pass
+        self.release(fd)
+
+    def collect(self, key, since):
+        """
+        follower 检查 leader 是否完成：
+          None            leader 还在跑
+          (headers, rows) leader 在 since 之后写好了结果
+          抛 Takeover      锁已释放但没有结果，调用方持 e.fd 自己执行
+        """
+        fd = self.acquire(key)
+        if fd is None:
+            return None
+        f = self._spool_file(key)
+        try:
+            if f.stat().st_mtime >= since - 1:     # 留 1 秒给文件系统时间戳精度
+                with gzip.open(f, "rt", encoding="utf-8") as fp:
+                    entry = json.load(fp)
+                self.release(fd)
+                return entry["headers"], entry["rows"]
+        except (OSError, ValueError):
+            pass
+        raise Takeover(fd)
+
+    def cleanup(self):
+        cutoff = time.time() - SPOOL_TTL
+        for f in self.path.glob("*.json.gz"):
+            try:
+                if f.stat().st_mtime < cutoff:
+                    f.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+CyberData 查询客户端 — 各报表/实验脚本共用
+
+提交 SQL 到 /api/dev/task/run，再轮询 /api/logger/getQueryLog 取结果。
+run_many() 先把一份报表的所有查询全部提交，再统一轮询所有未完成的
+taskInstanceId，总耗时约等于最慢的那一条，而不是逐条相加。
+轮询节奏见 poller.py：短间隔起步、指数退避，并按历史耗时预判首次轮询时机。
+已落地分区上的查询结果会缓存到本地（见 result_cache.py），重跑报表不再打数仓；
+传 cache=False 可强制重新查询。
+
+同一进程内所有客户端共用一个 keep-alive 连接池（get_session()）和一份认证
+（shared_auth()）。服务端返回 401 或空响应时自动重读 auth.json 并重发请求，
+长任务跑到一半 token 过期，只需在浏览器里重新复制认证写回文件即可继续。
+每条查询的耗时、轮询次数、行数等写入遥测 JSONL（见 telemetry.py）。
+同一台机器上其他线程/进程正在跑逐字相同的 SQL 时不再重复提交，等对方完成后
+直接取结果（见 coalesce.py）。
+
+用法：
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "cyberdata"))
+    from cyberdata_query import CyberDataClient
+
+    client = CyberDataClient()
+    headers, rows = client.run(sql, label="Q1")
+    results = client.run_many({"Q1": sql_1, "Q2": sql_2})   # {label: (headers, rows)}
+    results = client.run_many(queries, return_exceptions=True)   # 失败的查询值为 QueryError
+    frame = client.query(sql)          # QueryFrame，数值列已是 NumPy 数组，见 frame.py
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from coalesce import Inflight, Takeover
+from frame import QueryFrame
+from poller import LatencyStats, PollSchedule
+from result_cache import ResultCache
+from sqltext import fingerprint, normalize_sql
+from telemetry import SQL_PREVIEW, Telemetry
+
+BASE_URL = "https://idpcd.luckincoffee.us"
+AUTH_FILE = Path.home() / ".claude/skills/cyberdata-query/auth.json"
+
+SUBMIT_PATH = "/api/dev/task/run"
+RESULT_PATH = "/api/logger/getQueryLog"
+
+DEFAULT_TASK_ID = "1990991087752757249"
+PAYLOAD_BASE = {
+    "tenantId": "1001",
+    "userId": "47",
+    "projectId": "1906904360294313985",
+    "env": 5,
+}
+OK_CODES = (0, "0", 200, "200")
+AUTH_CODES = (401, "401")
+FAILED_STATUS = (3, "3")   # getQueryLog 里 status == 3 表示执行失败
+
+
+class QueryError(RuntimeError):
+    """查询提交失败、执行失败或超时"""
+
+
+def load_auth(path=AUTH_FILE):
+    """加载认证信息（cookies + jwttoken）"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class AuthFile:
+    """auth.json 只读一次；reload() 在文件内容变化时才替换"""
+
+    def __init__(self, path=AUTH_FILE):
+        self.path = Path(path)
+        self._data = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._data is None:
+                self._data = load_auth(self.path)
+            return self._data
+
+    def reload(self):
+        """重读文件，认证有变化返回 True"""
+        try:
+            data = load_auth(self.path)
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            changed = data != self._data
+            self._data = data
+        return changed
+
+
+_auth_files = {}
+_session = None
+_shared_lock = threading.Lock()
+
+
+def shared_auth(path=AUTH_FILE):
+    """进程内共享的认证对象（同一路径只有一个）"""
+    with _shared_lock:
+        key = str(Path(path).expanduser())
+        if key not in _auth_files:
+            _auth_files[key] = AuthFile(key)
+        return _auth_files[key]
+
+
+def get_session():
+    """进程内共享的 keep-alive 连接池"""
+    global _session
+    with _shared_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _error_message(record):
+    """getQueryLog 不同版本的报错字段名不一致"""
+    return (record.get("errorMessage") or record.get("errorMsg")
+            or record.get("error_msg") or "")
+
+
+class CyberDataClient:
+    """CyberData 查询客户端：先提交、后统一轮询"""
+
+    def __init__(self, auth=None, base_url=BASE_URL, task_id=DEFAULT_TASK_ID,
+                 poll_interval=1.0, max_poll_interval=15.0, max_wait=600,
+                 latency_stats=None, cache=None, telemetry=None, inflight=None,
+                 auth_wait=0, verbose=True):
+        # auth: None = 共享的 auth.json；AuthFile = 指定文件；dict = 固定认证（不热加载）
+        self._auth = shared_auth() if auth is None else auth
+        self.auth_wait = auth_wait      # token 过期后等待 auth.json 更新的秒数，0 = 直接报错
+        self.base_url = base_url.rstrip("/")
+        self.task_id = task_id
+        self.poll_interval = poll_interval          # 首轮轮询间隔
+        self.max_poll_interval = max_poll_interval  # 退避上限
+        self.max_wait = max_wait
+        self.latency = latency_stats if latency_stats is not None else LatencyStats()
+        self.cache = ResultCache() if cache is None else cache   # False = 不走缓存
+        self.telemetry = Telemetry() if telemetry is None else telemetry   # False = 不记录
+        self.inflight = Inflight() if inflight is None else inflight   # False = 不合并相同查询
+        if self.inflight and not self.inflight.enabled:
+            self.inflight = False
+        if self.inflight:
+            self.inflight.cleanup()
+        self.verbose = verbose
+
+    def _log(self, msg):
+        if self.verbose:
+            print(msg)
+
+    @property
+    def auth(self):
+        return self._auth.get() if isinstance(self._auth, AuthFile) else self._auth
+
+    def _headers(self):
+        return {
+            "accept": "application/json, text/plain, */*",
+            "content-type": "application/json; charset=UTF-8",
+            "jwttoken": self.auth["jwttoken"],
+            "productkey": "CyberData",
+            "origin": BASE_URL,
+            "Cookie": self.auth["cookies"],
+        }
+
+    def _reload_auth(self):
+        """token 失效时重读 auth.json；最多等 auth_wait 秒让人更新文件"""
+        if not isinstance(self._auth, AuthFile):
+            return False
+        deadline = time.time() + self.auth_wait
+        while True:
+            if self._auth.reload():
+                self._log("认证已更新，继续执行")
+                return True
+            if time.time() >= deadline:
+                return False
+            self._log(f"Token 已过期，等待更新 {self._auth.path} ...")
+            time.sleep(min(10, max(0.1, deadline - time.time())))
+
+    def _record(self, sql, label, **fields):
+        if self.telemetry:
+            self.telemetry.record(label=label, fingerprint=fingerprint(sql),
+                                  sql=normalize_sql(sql)[:SQL_PREVIEW], **fields)
+
+    def _post(self, path, payload):
+        return self._request(path, payload).json()
+
+    def _request(self, path, payload):
+        """发送请求，返回 requests.Response；401/空响应时热加载认证后重发一次"""
+        for attempt in range(2):
+            body = {"_t": int(time.time() * 1000), **PAYLOAD_BASE, **payload}
+            resp = get_session().post(f"{self.base_url}{path}", json=body,
+                                      headers=self._headers(), timeout=30)
+            if resp.status_code in AUTH_CODES or not resp.text.strip():
+                reason = "空响应" if resp.status_code == 200 else f"HTTP {resp.status_code}"
+            elif resp.status_code != 200:
+                raise QueryError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+            else:
+                if str(resp.json().get("code", "")) not in AUTH_CODES:
+                    return resp
+                reason = "401"
+            if attempt == 0 and self._reload_auth():
+                continue
+            raise QueryError(f"{reason} — Token 可能已过期，请更新认证")
+
+    # ── 单条查询 ──────────────────────────────
+
+    def submit(self, sql, label=""):
+        """提交 SQL，返回 taskInstanceId"""
+        data = self._post(SUBMIT_PATH, {
+            "resourceGroupId": 1,
+            "taskId": self.task_id,
+            "variables": {},
+            "sqlStatement": sql,
+        })
+        if data.get("code") not in OK_CODES:
+            raise QueryError(f"[{label}] 提交失败: {str(data)[:300]}")
+        # data 字段可能直接是 taskInstanceId 字符串，也可能是对象
+        raw = data.get("data")
+        if isinstance(raw, dict):
+            raw = raw.get("taskInstanceId")
+        task_instance_id = str(raw)
+        self._log(f"[{label}] 已提交, taskInstanceId={task_instance_id}")
+        return task_instance_id
+
+    def poll(self, task_instance_id, label=""):
+        """查询一次执行状态：完成返回 (headers, rows)，未完成返回 None，失败抛 QueryError"""
+        return self._poll(task_instance_id, label)[0]
+
+    def _poll(self, task_instance_id, label=""):
+        """同 poll()，另外返回响应字节数"""
+        resp = self._request(RESULT_PATH, {"taskInstanceId": str(task_instance_id)})
+        records = resp.json().get("data") or []
+        if not isinstance(records, list):
+            return None, len(resp.content)
+        for rec in records:
+            columns = rec.get("columns") or []
+            if columns:
+                return (columns[0], columns[1:]), len(resp.content)
+            err = _error_message(rec)
+            if err or rec.get("status") in FAILED_STATUS:
+                raise QueryError(f"[{label}] 执行失败: {str(err or rec)[:300]}")
+        return None, len(resp.content)
+
+    def run(self, sql, label="", attempt=0):
+        """提交并等待单条查询，返回 (headers, rows)；attempt 为调用方的重试序号，记入遥测"""
+        return self.run_many({label: sql}, attempt)[label]
+
+    # ── 批量查询 ──────────────────────────────
+
+    def run_many(self, queries, attempt=0, return_exceptions=False):
+        """
+        批量执行一组互不依赖的查询
+
+        Args:
+            queries: {label: sql}，label 用于日志和结果索引
+            attempt: 调用方的重试序号（0 = 首次），记入遥测
+            return_exceptions: False = 任一查询失败/超时即抛 QueryError（其余已提交的
+                查询服务端仍会跑完，只是不再取结果）；True = 失败的查询在结果里
+                记为 QueryError 实例，其余查询照常等完
+
+        Returns:
+            dict: {label: (headers, rows) 或 QueryError}，顺序与 queries 一致
+        """
+        start = time.time()
+        results = {}
+        pending = {}        # 本方提交、正在轮询的查询
+        waiting = {}        # 别的线程/进程正在跑相同 SQL，等它的结果
+        try:
+            for label, sql in queries.items():
+                cached = self.cache.get(sql) if self.cache else None
+                if cached is not None:
+                    results[label] = cached
+                    self._record(sql, label, cache_hit=True, rows=len(cached[1]), retries=attempt)
+                    self._log(f"[{label}] 命中本地缓存: {len(cached[1])} 行")
+                    continue
+                lock = None
+                if self.inflight:
+                    key = self.inflight.key(sql)
+                    lock = self.inflight.acquire(key)
+                    if lock is None:
+                        waiting[label] = {"sql": sql, "key": key, "since": time.time(),
+                                          "schedule": PollSchedule(initial=self.poll_interval,
+                                                                   max_interval=self.max_poll_interval)}
+                        waiting[label]["next_poll"] = time.time() + waiting[label]["schedule"].next_delay()
+                        self._log(f"[{label}] 相同查询正在执行，等待其结果")
+                        continue
+                try:
+                    pending[label] = self._start(label, sql, lock)
+                except QueryError as e:
+                    if not return_exceptions:
+                        raise
+                    results[label] = e
+                    self._record(sql, label, error=str(e)[:300], retries=attempt, cache_hit=False)
+
+            while pending or waiting:
+                next_poll = min(p["next_poll"] for p in [*pending.values(), *waiting.values()])
+                if next_poll - start > self.max_wait:
+                    error = QueryError(f"查询超时 ({self.max_wait}s): {', '.join([*pending, *waiting])}")
+                    if not return_exceptions:
+                        raise error
+                    for label, p in pending.items():
+                        self._finish(p)
+                        self._record_pending(label, p, attempt, error=f"未完成: {error}"[:300])
+                        results[label] = error
+                    for label in waiting:
+                        results[label] = error
+                    pending.clear()
+                    waiting.clear()
+                    break
+                time.sleep(max(0.0, next_poll - time.time()))
+
+                for label, w in list(waiting.items()):
+                    if w["next_poll"] > time.time():
+                        continue
+                    try:
+                        result = self.inflight.collect(w["key"], w["since"])
+                    except Takeover as t:
+                        del waiting[label]
+                        self._log(f"[{label}] 相同查询未完成，改为自行提交")
+                        try:
+                            pending[label] = self._start(label, w["sql"], t.fd)
+                        except QueryError as e:
+                            if not return_exceptions:
+                                raise
+                            results[label] = e
+                        continue
+                    if result is None:
+                        w["next_poll"] = time.time() + w["schedule"].next_delay()
+                        continue
+                    del waiting[label]
+                    results[label] = result
+                    self._record(w["sql"], label, coalesced=True, rows=len(result[1]),
+                                 latency=round(time.time() - w["since"], 3), retries=attempt)
+                    self._log(f"[{label}] 取到相同查询的结果: {len(result[1])} 行")
+
+                for label, p in list(pending.items()):
+                    if p["next_poll"] > time.time():
+                        continue
+                    p["polls"] += 1
+                    try:
+                        result, nbytes = self._poll(p["task_instance_id"], label)
+                    except QueryError as e:
+                        del pending[label]
+                        self._finish(p)
+                        self._record_pending(label, p, attempt, error=str(e)[:300])
+                        if not return_exceptions:
+                            raise
+                        results[label] = e
+                        self._log(f"[{label}] {e}")
+                        continue
+                    if result is None:
+                        p["next_poll"] = time.time() + p["schedule"].next_delay()
+                        continue
+                    del pending[label]
+                    results[label] = result
+                    self._finish(p, result)
+                    self.latency.record(p["fingerprint"], time.time() - p["submitted_at"])
+                    self._record_pending(label, p, attempt, rows=len(result[1]), bytes=nbytes)
+                    if self.cache:
+                        self.cache.put(p["sql"], *result)
+                    self._log(f"[{label}] 完成: {len(result[1])} 行 "
+                              f"({time.time() - start:.1f}s, 轮询 {p['polls']} 次)")
+        except QueryError as e:
+            # 超时或其他查询失败时，还没完成的查询也各记一条
+            for label, p in pending.items():
+                self._record_pending(label, p, attempt, error=f"未完成: {str(e)[:300]}")
+            raise
+        finally:
+            for p in pending.values():
+                self._finish(p)
+            self.latency.save()
+
+        return {label: results[label] for label in queries}
+
+    def _start(self, label, sql, lock=None):
+        """提交一条查询，返回轮询状态；lock 为合并查询的锁（完成后交出结果）"""
+        fp = fingerprint(sql)
+        try:
+            task_instance_id = self.submit(sql, label)
+        except Exception:
+            if lock is not None:
+                self.inflight.release(lock)
+            raise
+        schedule = PollSchedule(expected=self.latency.expected(fp),
+                                initial=self.poll_interval,
+                                max_interval=self.max_poll_interval)
+        return {
+            "sql": sql,
+            "task_instance_id": task_instance_id,
+            "fingerprint": fp,
+            "submitted_at": time.time(),
+            "schedule": schedule,
+            "next_poll": time.time() + schedule.next_delay(),
+            "polls": 0,
+            "lock": lock,
+        }
+
+    def _finish(self, p, result=None):
+        """放掉合并查询的锁；有结果时先写给等待方"""
+        lock, p["lock"] = p["lock"], None
+        if lock is None:
+            return
+        if result is not None:
+            self.inflight.publish(self.inflight.key(p["sql"]), lock, *result)
+        else:
+            self.inflight.release(lock)
+
+    def _record_pending(self, label, p, attempt, **fields):
+        self._record(p["sql"], label, task_instance_id=p["task_instance_id"],
+                     latency=round(time.time() - p["submitted_at"], 3), polls=p["polls"],
+                     retries=attempt, cache_hit=False, **fields)
+
+    # ── 列式结果 ──────────────────────────────
+
+    def query(self, sql, label="", text_columns=()):
+        """同 run()，结果转成按列存储、已推断类型的 QueryFrame"""
+        return self.query_many({label: sql}, text_columns)[label]
+
+    def query_many(self, queries, text_columns=()):
+        """同 run_many()，返回 {label: QueryFrame}；text_columns 中的列保持字符串"""
+        return {label: QueryFrame.from_rows(headers, rows, text_columns)
+                for label, (headers, rows) in self.run_many(queries).items()}
@@ -0,0 +1,191 @@
+"""
+门店日度销售聚合的本地存储 — 日报/周报共用
+
+日报、周报都在反复聚合 dw_ads.ads_mg_sku_shop_sales_statistic_d_1d：周报每周一
+重扫最近 6 周，其中 5 周和上周一模一样。这里把「门店 × 日 × 一级品类」粒度的
+聚合存进本地 SQLite，每次只补拉缺失的、以及上次拉取时还没落地的 dt 分区，
+日/周汇总在本地计算。
+
+分区落地规则与 result_cache.FRESH_DAYS 一致：拉取时距 dt 不足 FRESH_DAYS 天
+的分区视为可能还会回补，下次运行会重新拉取覆盖。返回 0 行的分区（上游还没跑完）
+不记为已同步，本地已有的数据也不清掉，下次运行再拉。
+
+用法：
+    store = DailyStore(client)
+    store.sync("2026-02-02", "2026-03-15")        # 只补拉缺的分区
+    store.daily(["2026-03-14", "2026-03-15"])     # 日度汇总 DataFrame
+    store.weekly("2026-02-02", "2026-03-15")      # 按 ISO 周（同 YEARWEEK(dt, 1)）汇总
+"""
+
+import sqlite3
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from result_cache import FRESH_DAYS
+
+STORE_FILE = Path.home() / ".cache/cyberdata/daily_sales.db"
+SOURCE_TABLE = "dw_ads.ads_mg_sku_shop_sales_statistic_d_1d"
+EXCLUDED_SHOPS = ("NJ Test Kitchen", "NJ Test Kitchen 2")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shop_day (
+    dt TEXT NOT NULL,
+    shop_name TEXT NOT NULL,
+    one_category_name TEXT NOT NULL,
+    sku_cnt REAL,
+    order_cnt REAL,
+    pay_amount REAL,
+    PRIMARY KEY (dt, shop_name, one_category_name)
+);
+CREATE TABLE IF NOT EXISTS synced (
+    dt TEXT PRIMARY KEY,
+    synced_on TEXT NOT NULL,
+    rows INTEGER NOT NULL
+);
+"""
+
+SYNC_RANGE_DAYS = 7     # 每条查询最多覆盖的连续天数（单次返回行数有上限）
+SYNC_CONCURRENCY = 4    # 同时提交的查询数上限，首次同步 6 周也不会一下压几十条给数仓
+
+_PARTITION_SQL = """
+SELECT dt, shop_name, one_category_name,
+       SUM(sku_cnt) AS sku_cnt, SUM(order_cnt) AS order_cnt, SUM(pay_amount) AS pay_amount
+FROM {table}
+WHERE tenant = 'LKUS' AND dt BETWEEN '{start}' AND '{end}'
+GROUP BY dt, shop_name, one_category_name
+"""
+
+
+def _days(start, end):
+    d = datetime.strptime(start, "%Y-%m-%d").date()
+    last = datetime.strptime(end, "%Y-%m-%d").date()
+    while d <= last:
+        yield d.isoformat()
+        d += timedelta(days=1)
+
+
+def _ranges(dts, max_days=SYNC_RANGE_DAYS):
+    """升序 dt 列表切成连续区间 [(start, end)]，每段不超过 max_days 天"""
+    ranges = []
+    for dt in dts:
+        d = datetime.strptime(dt, "%Y-%m-%d").date()
+        if ranges:
+            start, end = ranges[-1]
+            if (d - end).days == 1 and (d - start).days < max_days:
+                ranges[-1] = (start, d)
+                continue
+        ranges.append((d, d))
+    return [(start.isoformat(), end.isoformat()) for start, end in ranges]
+
+
+def _num(v):
+    return float(v) if v not in (None, "", "NULL") else None
+
+
+class DailyStore:
+    """门店 × 日 × 品类 聚合的本地增量副本"""
+
+    def __init__(self, client, path=STORE_FILE):
+        self.client = client
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # ── 增量同步 ──────────────────────────────
+
+    def stale_partitions(self, start, end, today=None):
+        """区间内需要（重新）拉取的 dt：从没拉过，或拉取时还没落地"""
+        today = today or date.today()
+        synced = dict(self.db.execute(
+            "SELECT dt, synced_on FROM synced WHERE dt BETWEEN ? AND ?", (start, end)))
+        stale = []
+        for dt in _days(start, end):
+            if dt >= today.isoformat():
+                continue    # 今天及以后的分区还没有数据
+            settled_on = (datetime.strptime(dt, "%Y-%m-%d").date()
+                          + timedelta(days=FRESH_DAYS)).isoformat()
+            if dt not in synced or synced[dt] < settled_on:
+                stale.append(dt)
+        return stale
+
+    def sync(self, start, end, today=None):
+        """补拉区间内缺失/未落地的分区，返回本次拉取的 dt 列表"""
+        today = today or date.today()
+        stale = self.stale_partitions(start, end, today)
+        if not stale:
+            return []
+        # 连续的待拉分区合成一条区间查询，每批最多 SYNC_CONCURRENCY 条并发
+        queries = {f"{lo}~{hi}": _PARTITION_SQL.format(table=SOURCE_TABLE, start=lo, end=hi)
+                   for lo, hi in _ranges(stale)}
+        labels = list(queries)
+        by_dt = {dt: [] for dt in stale}
+        for i in range(0, len(labels), SYNC_CONCURRENCY):
+            results = self.client.run_many({label: queries[label]
+                                            for label in labels[i:i + SYNC_CONCURRENCY]})
+            for headers, rows in results.values():
+                if not rows:
+                    continue
+                day, shop, cat, cups, orders, pay = (headers.index(c) for c in (
+                    "dt", "shop_name", "one_category_name", "sku_cnt", "order_cnt", "pay_amount"))
+                for r in rows:
+                    dt = str(r[day])[:10]
+                    if dt in by_dt:
+                        by_dt[dt].append((dt, r[shop] or "", r[cat] or "",
+                                          _num(r[cups]), _num(r[orders]), _num(r[pay])))
+        with self.db:
+            for dt, records in by_dt.items():
+                if not records:
+                    continue
+                self.db.execute("DELETE FROM shop_day WHERE dt = ?", (dt,))
+                self.db.executemany("INSERT INTO shop_day VALUES (?, ?, ?, ?, ?, ?)", records)
+                self.db.execute("INSERT OR REPLACE INTO synced VALUES (?, ?, ?)",
+                                (dt, today.isoformat(), len(records)))
+        return stale
+
+    # ── 本地汇总 ──────────────────────────────
+
+    def frame(self, start, end, category="Drink", exclude_shops=EXCLUDED_SHOPS):
+        """区间内 门店 × 日 明细（已按品类过滤、剔除测试店）"""
+        marks = ",".join("?" * len(exclude_shops)) or "''"
+        df = pd.read_sql_query(
+            f"""SELECT dt, shop_name, SUM(sku_cnt) AS sku_cnt, SUM(order_cnt) AS order_cnt,
+                       SUM(pay_amount) AS pay_amount
+                FROM shop_day
+                WHERE dt BETWEEN ? AND ? AND one_category_name = ? AND shop_name NOT IN ({marks})
+                GROUP BY dt, shop_name""",
+            self.db, params=(start, end, category, *exclude_shops))
+        iso = pd.to_datetime(df["dt"]).dt.isocalendar()
+        df["week_id"] = iso["year"].astype(str) + iso["week"].astype(str).str.zfill(2)
+        return df
+
+    def daily(self, dates, **kwargs):
+        """按日汇总：dt, shop_count, sku_cnt, order_cnt, pay_amount"""
+        df = self.frame(min(dates), max(dates), **kwargs)
+        df = df[df["dt"].isin(dates)]
+        return (df.groupby("dt")
+                  .agg(shop_count=("shop_name", "nunique"), sku_cnt=("sku_cnt", "sum"),
+                       order_cnt=("order_cnt", "sum"), pay_amount=("pay_amount", "sum"))
+                  .reset_index())
+
+    def weekly(self, start, end, **kwargs):
+        """按周汇总：week_id, shop_count, biz_days, sku_cnt, order_cnt, pay_amount"""
+        df = self.frame(start, end, **kwargs)
+        return (df.groupby("week_id")
+                  .agg(shop_count=("shop_name", "nunique"), biz_days=("dt", "nunique"),
+                       sku_cnt=("sku_cnt", "sum"), order_cnt=("order_cnt", "sum"),
+                       pay_amount=("pay_amount", "sum"))
+                  .reset_index())
+
+    def shop_weekly(self, start, end, **kwargs):
+        """按 门店 × 周 汇总：shop_name, week_id, biz_days, sku_cnt, order_cnt, pay_amount"""
+        df = self.frame(start, end, **kwargs)
+        return (df.groupby(["shop_name", "week_id"])
+                  .agg(biz_days=("dt", "nunique"), sku_cnt=("sku_cnt", "sum"),
+                       order_cnt=("order_cnt", "sum"), pay_amount=("pay_amount", "sum"))
+                  .reset_index())
@@ -0,0 +1,121 @@
+"""
+查询结果列式表 — 替代各脚本里逐行拼 dict / 逐列 astype(float)
+
+getQueryLog 返回的是「表头 + 字符串行」。QueryFrame 一次性转成按列存储：
+数值列是 NumPy int64/float64 数组（空值 → NaN），YYYY-MM-DD 列是
+datetime64[D]，其余保留为字符串（object 数组）。类型推断对整列向量化完成，
+不生成逐行 dict；几十万行的用户级明细也只是几个数组。
+
+编号类的值不当数值：*_no / *_id 列默认保持字符串；其他列里出现前导零
+（'00123'）、nan/inf 字面量，或整数超出 float64 精确范围（≥ 2**53）时，
+整列也保持字符串，避免悄悄丢精度。
+
+用法：
+    frame = client.query(sql)                   # QueryFrame
+    frame["drink_pay"].sum()                    # np.ndarray
+    df = frame.to_pandas()                      # 数值列已是数值类型，无需 astype
+    frame = client.query(sql, text_columns=("grp",))       # 指定列保持字符串
+"""
+
+import re
+
+import numpy as np
+
+_NULLS = ("", "NULL", "null", "None", "\\N")
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_LEADING_ZERO = re.compile(r"^[+-]?0\d")
+_ID_COLUMN = re.compile(r"(?:^|_)(?:no|id)$", re.I)
+
+
+def is_id_column(name):
+    """user_no / shop_id / week_id 这类编号列"""
+    return bool(_ID_COLUMN.search(str(name)))
+
+
+def _null_mask(arr):
+    mask = np.equal(arr, None)
+    for token in _NULLS:
+        mask |= arr == token
+    return mask
+
+
+def infer_column(values):
+    """把一列原始值转成最合适的 NumPy 数组"""
+    arr = np.asarray(values, dtype=object)
+    if arr.size == 0:
+        return arr
+    nulls = _null_mask(arr)
+    present = arr[~nulls]
+    if present.size == 0:
+        return np.full(arr.shape, np.nan)
+
+    # 数值：先按字符串整体转 float，失败说明不是数值列
+    text = present.astype(str)
+    try:
+        floats = text.astype(np.float64)
+    except ValueError:
+        floats = None
+    # nan/inf 字面量、前导零编号、超出精确范围的整数都按字符串处理
+    if floats is not None and np.all(np.isfinite(floats)) and not any(map(_LEADING_ZERO.match, text)):
+        integral = np.all(np.mod(floats, 1) == 0)
+        exact = np.all(np.abs(floats) < 2 ** 53)
+        if integral and exact and not nulls.any():
+            return floats.astype(np.int64)
+        if exact or not integral:
+            out = np.full(arr.shape, np.nan)
+            out[~nulls] = floats
+            return out
+
+    # 日期：整列都是 YYYY-MM-DD
+    if not nulls.any() and all(_DATE.match(str(v)) for v in present[:50]):
+        try:
+            return present.astype(str).astype("datetime64[D]")
+        except ValueError:
+            pass
+
+    out = arr.copy()
+    out[nulls] = None
+    return out
+
+
+class QueryFrame:
+    """按列存储的查询结果"""
+
+    def __init__(self, headers, columns):
+        self.headers = list(headers)
+        self.columns = dict(zip(self.headers, columns))
+
+    @classmethod
+    def from_rows(cls, headers, rows, text_columns=()):
+        """从 getQueryLog 的行数据构建；text_columns 和 *_no / *_id 列不做类型推断"""
+        raw = list(zip(*rows)) if rows else [() for _ in headers]
+        columns = []
+        for name, values in zip(headers, raw):
+            if name in text_columns or is_id_column(name):
+                columns.append(np.asarray(values, dtype=object))
+            else:
+                columns.append(infer_column(values))
+        return cls(headers, columns)
+
+    def __len__(self):
+        return len(self.columns[self.headers[0]]) if self.headers else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def dtypes(self):
+        return {name: col.dtype for name, col in self.columns.items()}
+
+    def to_pandas(self):
+        """转 DataFrame（直接用现有数组，不再逐列转换）"""
+        import pandas as pd
+        return pd.DataFrame(self.columns, columns=self.headers, copy=False)
+
+    def to_records(self):
+        """转 [{列名: 值}, ...]，仅用于写 JSON 等需要逐行结构的场景"""
+        cols = [self.columns[h].tolist() for h in self.headers]
+        return [dict(zip(self.headers, row)) for row in zip(*cols)]
@@ -0,0 +1,82 @@
+"""
+自适应轮询 — 替代各脚本里写死的 time.sleep(3/6/8)
+
+PollSchedule：单条查询的轮询节奏。没有历史数据时从短间隔开始，
+              指数退避 + 随机抖动；有历史数据时第一轮直接等到预计完成前后。
+LatencyStats：按 SQL 指纹记录最近几次的执行耗时，持久化到本地 JSON，
+              下次同类查询据此决定第一次轮询的时机。
+"""
+
+import json
+import random
+import statistics
+import threading
+from pathlib import Path
+
+LATENCY_FILE = Path.home() / ".cache/cyberdata/latency.json"
+HISTORY_SIZE = 20       # 每个指纹保留最近 N 次耗时
+
+
+class PollSchedule:
+    """单条查询的轮询间隔序列"""
+
+    def __init__(self, expected=None, initial=1.0, factor=1.6, max_interval=15.0, jitter=0.2):
+        self.expected = expected
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self._interval = initial
+        self._first = True
+
+    def _jittered(self, seconds):
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def next_delay(self):
+        """下一次轮询前要等多久（秒）"""
+        if self._first:
+            self._first = False
+            # 已知典型耗时：第一次轮询放在预计完成时间的 90% 处，之后回到短间隔
+            if self.expected and self.expected > self.initial:
+                return self._jittered(min(self.expected * 0.9, self.max_interval * 4))
+            return self._jittered(self.initial)
+        self._interval = min(self._interval * self.factor, self.max_interval)
+        return self._jittered(self._interval)
+
+
+class LatencyStats:
+    """按 SQL 指纹统计的历史耗时（秒）"""
+
+    def __init__(self, path=LATENCY_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._history = {}
+        if self.path.exists():
+            try:
+                self._history = json.loads(self.path.read_text(encoding="utf-8"))
+            except Exception:
+                self._history = {}
+
+    def expected(self, fp):
+        """该指纹的典型耗时（中位数），没有记录返回 None"""
+        with self._lock:
+            samples = self._history.get(fp)
+            return statistics.median(samples) if samples else None
+
+    def record(self, fp, seconds):
+        with self._lock:
+            samples = self._history.setdefault(fp, [])
+            samples.append(round(seconds, 2))
+            del samples[:-HISTORY_SIZE]
+
+    def save(self):
+        """原子写回磁盘（先写临时文件再 rename）"""
+        with self._lock:
+            data = json.dumps(self._history, ensure_ascii=False)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(data, encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError:
+            pass  # 统计文件写不了不影响查询
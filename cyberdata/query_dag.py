@@ -0,0 +1,152 @@
+"""
+查询 DAG 执行器 — 多查询实验报表用
+
+每个查询是一个具名节点，声明自己的输入：
+  params  固定参数（日期范围、分组定义等）
+  after   依赖的上游节点，上游结果会作为同名参数传给 sql
+sql 可以是字符串，也可以是 sql(**params, **上游结果) -> str 的函数。
+
+互不依赖的节点并发执行（max_concurrency 限制同时在数仓跑的查询数），
+单节点失败按 retries 重试。每完成一个节点就写一次 checkpoint 文件，
+中途失败后重跑只补跑没完成的节点；节点 SQL 变了会自动重跑。
+
+用法：
+    dag = QueryDAG(client, checkpoint="out/拆解.checkpoint.json", max_concurrency=3)
+    dag.add("A1", SQL_A1)
+    dag.add("B1", build_b1, params={"start": "2026-02-12"}, after=["A1"])
+    results = dag.run()     # {name: (headers, rows)}
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from sqltext import normalize_sql
+
+
+class DAGError(RuntimeError):
+    """有节点最终失败；已完成的节点结果保存在 checkpoint 中"""
+
+    def __init__(self, failed, skipped):
+        self.failed = failed        # {name: 错误信息}
+        self.skipped = skipped      # 因上游失败没跑的节点
+        detail = "; ".join(f"{k}: {v}" for k, v in failed.items())
+        super().__init__(f"{len(failed)} 个节点失败，{len(skipped)} 个节点跳过 — {detail}")
+
+
+def _sql_digest(sql):
+    return hashlib.sha256(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+class QueryDAG:
+    """具名查询节点 + 依赖关系 + 并发上限 + 断点续跑"""
+
+    def __init__(self, client, checkpoint=None, max_concurrency=3, retries=2, retry_wait=5):
+        self.client = client
+        self.checkpoint = Path(checkpoint) if checkpoint else None
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.retry_wait = retry_wait
+        self.nodes = {}             # name -> {"sql", "params", "after"}
+        self._done = {}             # name -> {"digest", "headers", "rows"}
+        self._lock = threading.Lock()
+
+    def add(self, name, sql, params=None, after=()):
+        if name in self.nodes:
+            raise ValueError(f"节点重名: {name}")
+        for dep in after:
+            if dep not in self.nodes:
+                raise ValueError(f"{name} 依赖的节点 {dep} 尚未定义")
+        self.nodes[name] = {"sql": sql, "params": dict(params or {}), "after": list(after)}
+        return self
+
+    # ── checkpoint ────────────────────────────
+
+    def _load_checkpoint(self):
+        if self.checkpoint and self.checkpoint.exists():
+            try:
+                self._done = json.loads(self.checkpoint.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._done = {}
+
+    def _save_checkpoint(self):
+        if not self.checkpoint:
+            return
+        with self._lock:
+            data = json.dumps(self._done, ensure_ascii=False)
+        self.checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.checkpoint.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        tmp.replace(self.checkpoint)
+
+    # ── 执行 ──────────────────────────────────
+
+    def _render(self, name, results):
+        node = self.nodes[name]
+        if not callable(node["sql"]):
+            return node["sql"]
+        upstream = {dep: results[dep] for dep in node["after"]}
+        return node["sql"](**node["params"], **upstream)
+
+    def _run_node(self, name, sql):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.client.run(sql, label=name, attempt=attempt)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                print(f"[{name}] 失败，{self.retry_wait * (attempt + 1)}s 后重试 "
+                      f"({attempt + 1}/{self.retries}): {str(e)[:100]}")
+                time.sleep(self.retry_wait * (attempt + 1))
+
+    def run(self):
+        """执行全部节点，返回 {name: (headers, rows)}；有节点失败抛 DAGError"""
+        self._load_checkpoint()
+        results, failed, skipped = {}, {}, []
+        remaining = dict(self.nodes)
+        running = {}        # future -> (name, digest)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            while remaining or running:
+                for name in list(remaining):
+                    deps = self.nodes[name]["after"]
+                    if any(d in failed or d in skipped for d in deps):
+                        skipped.append(name)
+                        del remaining[name]
+                        continue
+                    if not all(d in results for d in deps):
+                        continue
+                    sql = self._render(name, results)
+                    digest = _sql_digest(sql)
+                    done = self._done.get(name)
+                    if done and done["digest"] == digest:
+                        results[name] = (done["headers"], done["rows"])
+                        print(f"[{name}] 已在 checkpoint 中，跳过")
+                        del remaining[name]
+                        continue
+                    if len(running) >= self.max_concurrency:
+                        continue
+                    running[pool.submit(self._run_node, name, sql)] = (name, digest)
+                    del remaining[name]
+
+                if not running:
+                    continue    # 本轮全是 checkpoint 命中，回头再扫一遍下游
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, digest = running.pop(future)
+                    try:
+                        headers, rows = future.result()
+                    except Exception as e:
+                        failed[name] = str(e)[:200]
+                        continue
+                    results[name] = (headers, rows)
+                    with self._lock:
+                        self._done[name] = {"digest": digest, "headers": headers, "rows": rows}
+                    self._save_checkpoint()
+
+        if failed:
+            raise DAGError(failed, skipped)
+        return {name: results[name] for name in self.nodes}
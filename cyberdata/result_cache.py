@@ -0,0 +1,151 @@
+"""
+查询结果本地缓存 — 同一条 SQL 跑过一次，改报表模板重跑时不再打数仓
+
+键：规范化 SQL 文本 + 它涉及的日期分区（sha256）
+值：按列存储的 gzip JSON（表头 + 每列一个数组），比逐行 JSON 小得多
+淘汰：总大小超过上限时按最近访问时间（文件 mtime）LRU 删除
+跳过：SQL 里没有日期字面量、引用了 CURDATE()/NOW()，或涉及最近
+      FRESH_DAYS 天内（T+1 分区可能还没跑完/会回补）的分区时不走缓存；
+      有下界没上界的日期条件（dt >= '2026-03-01'）范围还在增长，也不缓存
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqltext import normalize_sql
+
+CACHE_DIR = Path.home() / ".cache/cyberdata/results"
+MAX_BYTES = 512 * 1024 * 1024
+FRESH_DAYS = 2          # 今天、昨天的分区视为未完成
+
+# 日期字面量：'yyyy-mm-dd[ hh:mm:ss]'，或 yyyymmdd（带不带引号都算）
+_YMD = r"(?:19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])"
+_LIT = rf"(?:'\d{{4}}-\d{{2}}-\d{{2}}[^']*'|'{_YMD}'|\b{_YMD}\b)"
+_COL = r"([A-Za-z_][\w.]*)\)?"          # DATE(dt) >= ... 也按 dt 算
+_DATE = re.compile(rf"'(\d{{4}}-\d{{2}}-\d{{2}})|\b({_YMD})\b")
+_LOWER = [re.compile(rf"{_COL}\s*>=?\s*{_LIT}"), re.compile(rf"{_LIT}\s*<=?\s*{_COL}")]
+_UPPER = [re.compile(rf"{_COL}\s*(?:<=?|=)\s*{_LIT}"), re.compile(rf"{_LIT}\s*(?:>=?|=)\s*{_COL}"),
+          re.compile(rf"{_COL}\s+BETWEEN\s+{_LIT}\s+AND\s+{_LIT}", re.I),
+          re.compile(rf"{_COL}\s+IN\s*\(\s*{_LIT}", re.I)]
+_VOLATILE = re.compile(r"\b(CURDATE|CURRENT_DATE|CURRENT_TIMESTAMP|NOW|SYSDATE|UNIX_TIMESTAMP)\b", re.I)
+
+
+def _iso(text):
+    return text if "-" in text else f"{text[:4]}-{text[4:6]}-{text[6:]}"
+
+
+def partitions(sql):
+    """SQL 中出现的日期字面量（即涉及的日期分区），统一成 yyyy-mm-dd 后去重排序"""
+    return sorted({_iso(dashed or compact) for dashed, compact in _DATE.findall(sql)})
+
+
+def _bounded_columns(sql, patterns):
+    return {m.group(1).lower() for pattern in patterns for m in pattern.finditer(sql)}
+
+
+def cache_key(sql):
+    text = normalize_sql(sql) + "\n" + ",".join(partitions(sql))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(sql, today=None):
+    """
+    只缓存结果不会再变的查询：有明确日期范围、且范围都已落地
+
+    每个带日期下界的列都必须同时有上界（<=、<、=、BETWEEN、IN）；
+    只写了 dt >= '2026-03-01' 的查询每天都会多出新分区，不能缓存。
+    """
+    if _VOLATILE.search(sql):
+        return False
+    dts = partitions(sql)
+    if not dts:
+        return False
+    upper = _bounded_columns(sql, _UPPER)
+    if not upper or _bounded_columns(sql, _LOWER) - upper:
+        return False
+    cutoff = (today or date.today()) - timedelta(days=FRESH_DAYS - 1)
+    return max(dts) < cutoff.isoformat()
+
+
+class ResultCache:
+    """内容寻址的查询结果缓存"""
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _file(self, sql):
+        return self.path / f"{cache_key(sql)}.json.gz"
+
+    def get(self, sql):
+        """命中返回 (headers, rows)，未命中或不可缓存返回 None"""
+        if not is_cacheable(sql):
+            return None
+        f = self._file(sql)
+        try:
+            with gzip.open(f, "rt", encoding="utf-8") as fp:
+                entry = json.load(fp)
+            os.utime(f)  # 刷新 mtime，作为 LRU 访问时间
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        rows = [list(r) for r in zip(*entry["columns"])] if entry["columns"] else []
+        return entry["headers"], rows
+
+    def put(self, sql, headers, rows):
+        if not is_cacheable(sql):
+            return
+        entry = {
+            "sql": normalize_sql(sql),
+            "partitions": partitions(sql),
+            "headers": headers,
+            "columns": [list(c) for c in zip(*rows)] if rows else [],
+        }
+        f = self._file(sql)
+        tmp = None
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            # 临时文件名每次唯一：DAG 并发节点可能同时写同一个键
+            with tempfile.NamedTemporaryFile(dir=self.path, prefix=f.name + ".",
+                                             suffix=".tmp", delete=False) as raw:
+                tmp = Path(raw.name)
+                with gzip.open(raw, "wt", encoding="utf-8") as fp:
+                    json.dump(entry, fp, ensure_ascii=False, separators=(",", ":"))
+            tmp.replace(f)
+        except OSError:
+            if tmp:
+                tmp.unlink(missing_ok=True)
+            return  # 缓存写失败不影响查询
+        self._evict()
+
+    def _evict(self):
+        """超出大小上限时，从最久未访问的开始删"""
+        with self._lock:
+            files = []
+            for f in self.path.glob("*.json.gz"):
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, f))
+            total = sum(size for _, size, _ in files)
+            for _, size, f in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                f.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self):
+        for f in self.path.glob("*.json.gz"):
+            f.unlink(missing_ok=True)
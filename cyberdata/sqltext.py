@@ -0,0 +1,38 @@
+"""
+SQL 文本工具 — 规范化与指纹
+
+normalize_sql()：去注释、压空白，只改排版不改语义（缓存键用它）；
+               字符串字面量原样保留，'a  b' 和 'a b'、'x -- y' 都不会被改写
+fingerprint()：在规范化基础上把字符串/数字字面量替换成 ?，
+               同一条 SQL 换个日期参数仍是同一个指纹（延迟统计、埋点用它）
+"""
+
+import hashlib
+import re
+
+# 逐个切词：引号内的内容整体作为一个词，注释和空白合并成一个空格
+_TOKEN = re.compile(r"""
+    (?P<quoted>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`)
+  | (?P<space>\s+|--[^\n]*|/\*.*?\*/)
+  | (?P<other>[^'"`\s/-]+|.)
+""", re.S | re.X)
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def normalize_sql(sql):
+    """去掉注释和多余空白（引号内不动），结尾分号也去掉"""
+    parts = []
+    for m in _TOKEN.finditer(sql):
+        if m.lastgroup != "space":
+            parts.append(m.group())
+        elif parts and parts[-1] != " ":
+            parts.append(" ")
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def fingerprint(sql):
+    """SQL 结构指纹（12 位 hex），忽略字面量取值与大小写"""
+    text = _STRING.sub("?", normalize_sql(sql))
+    text = _NUMBER.sub("?", text).lower()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
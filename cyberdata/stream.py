@@ -0,0 +1,196 @@
+"""
+大结果集分页拉取 — 用户级明细导出用
+
+getQueryLog 单次返回的行数有限，而且一次性把几万用户读进内存再写 Excel
+会让内存随分组规模线性增长。iter_batches() 按键值分页（keyset）：
+
+    SELECT * FROM (<原 SQL>) _page WHERE user_no > '<上一页最后一个>' ORDER BY user_no LIMIT 500
+
+每页只依赖上一页的最后一个键，不像 LIMIT/OFFSET 那样越往后越慢，也不会因
+排序不稳定漏行/重行。每页拿到后立即交给 sink 写盘，内存占用与总行数无关。
+
+游标默认按字符串比较：接口返回的值都是文本，看不出列类型，而 user_no 这类
+字符串列 ORDER BY 按字典序、和不加引号的数字比较却按数值，两边不一致会悄悄
+漏行（'100' < '1000' < '20'，WHERE user_no > 1000 会跳过 '20'）。键列确实是
+数值类型时传 numeric_key=True。
+
+用法：
+    with open_sink("out/对照组.xlsx", sheet_name="对照组") as sink:
+        for headers, rows in iter_batches(client, sql, key="user_no"):
+            sink.write(headers, rows)
+
+支持 .csv / .xlsx（openpyxl 只写模式）/ .parquet（需安装 pyarrow）。
+"""
+
+import csv
+import importlib.util
+import math
+import time
+from pathlib import Path
+
+from cyberdata_query import QueryError
+
+PAGE_SIZE = 500
+
+
+def _literal(value, numeric=False):
+    """
+    键值转 SQL 字面量
+
+    默认一律按字符串转义；numeric=True 时按数字输出，只接受有限数值（nan/inf 抛 ValueError）
+    """
+    text = str(value)
+    if not numeric:
+        return "'" + text.replace("\\", "\\\\").replace("'", "''") + "'"
+    try:
+        return str(int(text.strip()))
+    except ValueError:
+        number = float(text)
+    if not math.isfinite(number):
+        raise ValueError(f"数值分页键不是有限数: {value!r}")
+    return repr(number)
+
+
+def page_sql(sql, key, after=None, limit=PAGE_SIZE, numeric_key=False):
+    """把任意 SELECT 包成按 key 分页的一页；numeric_key 表示键列是数值类型"""
+    where = f"\nWHERE {key} > {_literal(after, numeric_key)}" if after is not None else ""
+    return f"SELECT * FROM (\n{sql.strip().rstrip(';')}\n) _page{where}\nORDER BY {key}\nLIMIT {limit}"
+
+
+def iter_batches(client, sql, key, page_size=PAGE_SIZE, label="", retries=2, retry_wait=5,
+                 numeric_key=False, after=None):
+    """
+    逐页执行查询，yield (headers, rows)
+
+    Args:
+        client: CyberDataClient
+        sql: 原始查询（结果里必须包含 key 列，且 key 唯一）
+        key: 分页键，通常是 user_no
+        page_size: 每页行数
+        retries: 单页失败重试次数
+        numeric_key: 键列是数值类型时为 True（游标不加引号）；字符串列保持默认
+        after: 从这个键之后开始拉（断点续传时传上次最后一个键）
+    """
+    page = 0
+    while True:
+        page += 1
+        page_label = f"{label or key}#{page}"
+        for attempt in range(retries + 1):
+            try:
+                headers, rows = client.run(page_sql(sql, key, after, page_size, numeric_key),
+                                           label=page_label, attempt=attempt)
+                break
+            except QueryError as e:
+                if attempt == retries:
+                    raise
+                print(f"[{page_label}] 失败，{retry_wait}s 后重试: {str(e)[:100]}")
+                time.sleep(retry_wait)
+        if rows:
+            yield headers, rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1][headers.index(key)]
+
+
+# ── 写出 ──────────────────────────────────────
+
+class CsvSink:
+    """逐批追加写 CSV（utf-8-sig，Excel 直接打开不乱码）"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.rows = 0
+        self._fp = open(self.path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.writer(self._fp)
+        self._header_written = False
+
+    def write(self, headers, rows):
+        if not self._header_written:
+            self._writer.writerow(headers)
+            self._header_written = True
+        self._writer.writerows(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class XlsxSink:
+    """
+    openpyxl 只写模式：行写入后即落到临时文件，不在内存里保留整张表。
+    需要表头说明、列宽等时，在第一次 write() 之前直接操作 self.ws。
+    """
+
+    def __init__(self, path, sheet_name="Sheet1", header=True):
+        import openpyxl
+        self.path = Path(path)
+        self.rows = 0
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(sheet_name)
+        self._header_written = not header
+
+    def write(self, headers, rows):
+        if not self._header_written:
+            self.ws.append(headers)
+            self._header_written = True
+        for row in rows:
+            self.ws.append(row)
+        self.rows += len(rows)
+
+    def close(self):
+        self.wb.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParquetSink:
+    """每批一个 row group；所有列按字符串写出"""
+
+    def __init__(self, path):
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ImportError("写 Parquet 需要 pyarrow：pip install pyarrow")
+        self.path = Path(path)
+        self.rows = 0
+        self._writer = None
+
+    def write(self, headers, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = [[None if v is None else str(v) for v in col] for col in zip(*rows)]
+        table = pa.table(dict(zip(headers, columns)))
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+        self.rows += len(rows)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_sink(path, **kwargs):
+    """按扩展名选择写出格式"""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return CsvSink(path)
+    if suffix == ".xlsx":
+        return XlsxSink(path, **kwargs)
+    if suffix == ".parquet":
+        return ParquetSink(path)
+    raise ValueError(f"不支持的导出格式: {suffix}")
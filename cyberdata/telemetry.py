@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+查询遥测 — 每次执行一行 JSONL，看清楚数仓时间花在哪些 SQL 上
+
+CyberDataClient 每跑完（或失败）一条查询就追加一条记录：
+    ts, script, label, fingerprint（规范化 SQL 去掉字面量后的指纹）, sql（规范化后截断）,
+    latency（提交 → 拿到结果，秒）, polls, rows, bytes, retries, cache_hit, error
+
+汇总：
+    python3 telemetry.py                    # 总耗时最多的前 20 个指纹
+    python3 telemetry.py --by slowest -n 10 # 平均耗时最慢
+    python3 telemetry.py --by count --days 7  # 最近 7 天重复跑得最多的
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+TELEMETRY_FILE = Path.home() / ".cache/cyberdata/telemetry.jsonl"
+SQL_PREVIEW = 300
+
+
+class Telemetry:
+    """追加写 JSONL；写失败不影响查询"""
+
+    def __init__(self, path=TELEMETRY_FILE):
+        self.path = Path(path)
+        self.script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else ""
+        self._lock = threading.Lock()
+
+    def record(self, **fields):
+        entry = {"ts": round(time.time(), 3), "script": self.script, **fields}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError:
+                pass
+
+
+def load(path=TELEMETRY_FILE, since=None):
+    """读取遥测记录，since 为起始时间戳"""
+    try:
+        f = open(path, encoding="utf-8")
+    except OSError:
+        return
+    with f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue    # 并发写入时可能出现半行
+            if since is None or rec.get("ts", 0) >= since:
+                yield rec
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def rollup(records):
+    """按指纹汇总：{fingerprint: {...}}"""
+    groups = defaultdict(lambda: {"runs": 0, "cache_hits": 0, "errors": 0, "retries": 0,
+                                  "latencies": [], "rows": 0, "bytes": 0,
+                                  "labels": set(), "scripts": set(), "sql": ""})
+    for rec in records:
+        g = groups[rec.get("fingerprint", "")]
+        g["runs"] += 1
+        g["retries"] += rec.get("retries") or 0
+        g["labels"].add(rec.get("label") or "")
+        g["scripts"].add(rec.get("script") or "")
+        g["sql"] = g["sql"] or rec.get("sql", "")
+        if rec.get("cache_hit"):
+            g["cache_hits"] += 1
+            continue
+        if rec.get("error"):
+            g["errors"] += 1
+        if rec.get("latency") is not None:
+            g["latencies"].append(rec["latency"])
+        g["rows"] += rec.get("rows") or 0
+        g["bytes"] += rec.get("bytes") or 0
+
+    summary = {}
+    for fp, g in groups.items():
+        lat = g.pop("latencies")
+        g.update(total_latency=sum(lat), avg_latency=sum(lat) / len(lat) if lat else 0.0,
+                 p95_latency=_percentile(lat, 0.95), executed=len(lat))
+        summary[fp] = g
+    return summary
+
+
+SORT_KEYS = {
+    "total": lambda g: g["total_latency"],
+    "slowest": lambda g: g["avg_latency"],
+    "count": lambda g: g["runs"],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CyberData 查询遥测汇总")
+    parser.add_argument("--by", choices=sorted(SORT_KEYS), default="total",
+                        help="排序：total 总耗时 / slowest 平均耗时 / count 执行次数")
+    parser.add_argument("-n", "--top", type=int, default=20)
+    parser.add_argument("--days", type=float, help="只看最近 N 天")
+    parser.add_argument("--file", default=str(TELEMETRY_FILE))
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else None
+    summary = rollup(load(args.file, since))
+    if not summary:
+        print(f"没有遥测记录: {args.file}")
+        return
+
+    ranked = sorted(summary.items(), key=lambda kv: SORT_KEYS[args.by](kv[1]), reverse=True)
+    total = sum(g["total_latency"] for g in summary.values())
+    print(f"{len(summary)} 个查询指纹，数仓总耗时 {total / 60:.1f} 分钟\n")
+    print(f"{'指纹':<13}{'次数':>6}{'缓存':>6}{'失败':>6}{'平均(s)':>9}{'P95(s)':>9}"
+          f"{'总计(s)':>9}{'占比':>7}{'行数':>9}  来源")
+    for fp, g in ranked[:args.top]:
+        share = g["total_latency"] / total * 100 if total else 0
+        labels = ", ".join(sorted(x for x in g["labels"] if x))[:40]
+        scripts = ", ".join(sorted(x for x in g["scripts"] if x))[:40]
+        print(f"{fp:<13}{g['runs']:>6}{g['cache_hits']:>6}{g['errors']:>6}{g['avg_latency']:>9.1f}"
+              f"{g['p95_latency']:>9.1f}{g['total_latency']:>9.0f}{share:>6.1f}%{g['rows']:>9}  "
+              f"{scripts} [{labels}]")
+        print(f"{'':<13}{g['sql'][:110]}")
+
+
+if __name__ == "__main__":
+    main()
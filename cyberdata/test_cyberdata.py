@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""
+CyberData 查询客户端回测脚本
+本地起一个假的 CyberData 服务（模拟 /api/dev/task/run 和 /api/logger/getQueryLog），
+不连真实数仓。
+
+用法：python3 test_cyberdata.py
+"""
+
+import json
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from coalesce import Inflight
+from cyberdata_query import AuthFile, CyberDataClient, QueryError, get_session
+from daily_store import SOURCE_TABLE, SYNC_CONCURRENCY, DailyStore
+from frame import QueryFrame
+from poller import LatencyStats, PollSchedule
+from query_dag import DAGError, QueryDAG
+from result_cache import ResultCache, is_cacheable, partitions
+from sqltext import fingerprint, normalize_sql
+from stream import CsvSink, XlsxSink, iter_batches, page_sql
+from telemetry import Telemetry, load, rollup
+
+TMP_DIR = Path(tempfile.mkdtemp(prefix="cyberdata_test_"))
+PASS = 0
+FAIL = 0
+
+
+def check(name, condition, detail=""):
+    global PASS, FAIL
+    if condition:
+        PASS += 1
+        print(f"  ✅ {name}")
+    else:
+        FAIL += 1
+        print(f"  ❌ {name} — {detail}")
+
+
+# ── 假 CyberData 服务 ─────────────────────────
+
+class FakeCyberData:
+    """
+    模拟两个接口。SQL 文本决定行为：
+      delays[sql]   执行耗时（秒），默认 0
+      failures      执行失败的 SQL 集合（按提交时刻判定）
+      results[sql]  返回的 columns（首行为表头），默认 [["n"], ["1"]]
+    token 不为 None 时，jwttoken 不一致的请求返回 code 401
+    """
+
+    def __init__(self):
+        self.delays = {}
+        self.failures = set()
+        self.results = {}
+        self.submitted = []     # [(task_instance_id, sql)]
+        self.polls = 0
+        self.token = None
+        self._tasks = {}        # task_instance_id -> (sql, submit_ts, failed)
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if fake.token is not None and self.headers.get("jwttoken") != fake.token:
+                    resp = {"code": "401", "msg": "token expired"}
+                elif self.path == "/api/dev/task/run":
+                    resp = fake.handle_submit(body)
+                elif self.path == "/api/logger/getQueryLog":
+                    resp = fake.handle_result(body)
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                raw = json.dumps(resp).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle_submit(self, body):
+        with self._lock:
+            tid = str(1000 + len(self.submitted))
+            self.submitted.append((tid, body["sqlStatement"]))
+            sql = body["sqlStatement"]
+            self._tasks[tid] = (sql, time.time(), sql in self.failures)
+        return {"code": "200", "data": tid}
+
+    def handle_result(self, body):
+        with self._lock:
+            self.polls += 1
+            sql, submit_ts, failed = self._tasks[body["taskInstanceId"]]
+        if time.time() - submit_ts < self.delays.get(sql, 0):
+            return {"code": "200", "data": [{"status": 1, "columns": []}]}
+        if failed:
+            return {"code": "200", "data": [{"status": 3, "errorMessage": "SQL 语法错误"}]}
+        return {"code": "200", "data": [{"status": 2,
+                                         "columns": self.results.get(sql, [["n"], ["1"]])}]}
+
+    def close(self):
+        self.server.shutdown()
+
+
+def make_client(fake, **kwargs):
+    kwargs.setdefault("poll_interval", 0.05)
+    kwargs.setdefault("verbose", False)
+    kwargs.setdefault("latency_stats", LatencyStats(TMP_DIR / "latency.json"))
+    kwargs.setdefault("cache", False)
+    kwargs.setdefault("telemetry", False)
+    kwargs.setdefault("inflight", False)
+    kwargs.setdefault("auth", {"cookies": "a=1", "jwttoken": "t"})
+    return CyberDataClient(base_url=fake.url, **kwargs)
+
+
+# ── 测试 ──────────────────────────────────────
+
+def test_single_query():
+    print("\n[测试] 单条查询")
+    fake = FakeCyberData()
+    fake.results["SELECT 1"] = [["grp", "cnt"], ["A", "10"], ["B", "20"]]
+    headers, rows = make_client(fake).run("SELECT 1", label="Q1")
+    check("表头正确", headers == ["grp", "cnt"], headers)
+    check("数据行正确", rows == [["A", "10"], ["B", "20"]], rows)
+    fake.close()
+
+
+def test_run_many_concurrent():
+    print("\n[测试] run_many 先提交后统一轮询")
+    fake = FakeCyberData()
+    queries = {f"Q{i}": f"SELECT {i}" for i in range(1, 6)}
+    for i, sql in enumerate(queries.values(), 1):
+        fake.delays[sql] = 0.1 * i          # 0.1 ~ 0.5s，串行合计 1.5s
+    start = time.time()
+    results = make_client(fake).run_many(queries)
+    elapsed = time.time() - start
+    check("5 条全部返回", list(results) == list(queries), list(results))
+    check("提交先于轮询全部完成", len(fake.submitted) == 5)
+    check("耗时接近最慢一条", elapsed < 1.0, f"{elapsed:.2f}s")
+    fake.close()
+
+
+def test_failure_and_timeout():
+    print("\n[测试] 执行失败 / 超时")
+    fake = FakeCyberData()
+    fake.failures.add("SELECT bad")
+    try:
+        make_client(fake).run("SELECT bad", label="bad")
+        check("执行失败抛 QueryError", False, "没有抛异常")
+    except QueryError as e:
+        check("执行失败抛 QueryError", "SQL 语法错误" in str(e), str(e))
+    check("失败后立即停止轮询", fake.polls == 1, f"polls={fake.polls}")
+
+    fake.delays["SELECT slow"] = 10
+    try:
+        make_client(fake, max_wait=0.3).run("SELECT slow", label="slow")
+        check("超时抛 QueryError", False, "没有抛异常")
+    except QueryError as e:
+        check("超时抛 QueryError", "超时" in str(e), str(e))
+
+    fake.delays["SELECT ok"] = 0.2
+    batch = make_client(fake, max_wait=2).run_many(
+        {"bad": "SELECT bad", "ok": "SELECT ok"}, return_exceptions=True)
+    check("return_exceptions 失败项为 QueryError", isinstance(batch["bad"], QueryError), batch)
+    check("return_exceptions 其余查询照常返回", batch["ok"] == (["n"], [["1"]]), batch)
+    # 独立的延迟统计：不受前面用例学到的预期耗时影响，ok 一定在超时前轮询到
+    batch = make_client(fake, max_wait=1, latency_stats=LatencyStats(TMP_DIR / "latency_batch.json")).run_many(
+        {"slow": "SELECT slow", "ok": "SELECT 1"}, return_exceptions=True)
+    check("return_exceptions 超时项为 QueryError",
+          isinstance(batch["slow"], QueryError) and batch["ok"] == (["n"], [["1"]]), batch)
+    fake.close()
+
+
+def test_sql_fingerprint():
+    print("\n[测试] SQL 规范化与指纹")
+    a = "SELECT *  -- 注释\nFROM t WHERE dt = '2026-03-11';"
+    b = "select * from t\n where dt = '2026-03-12'"
+    check("规范化去注释和空白", normalize_sql(a) == "SELECT * FROM t WHERE dt = '2026-03-11'",
+          normalize_sql(a))
+    check("换日期参数指纹不变", fingerprint(a) == fingerprint(b))
+    check("字符串内空白不压缩", normalize_sql("SELECT 'a  b'") != normalize_sql("SELECT 'a b'"))
+    check("字符串内 -- 不当注释", normalize_sql("SELECT 'x -- y' FROM t") == "SELECT 'x -- y' FROM t",
+          normalize_sql("SELECT 'x -- y' FROM t"))
+    check("不同结构指纹不同", fingerprint(a) != fingerprint("SELECT 1 FROM t"))
+
+
+def test_poll_schedule():
+    print("\n[测试] 轮询退避")
+    s = PollSchedule(initial=1, factor=2, max_interval=5, jitter=0)
+    delays = [s.next_delay() for _ in range(6)]
+    check("指数退避且封顶", delays == [1, 2, 4, 5, 5, 5], delays)
+    s = PollSchedule(expected=20, initial=1, jitter=0)
+    check("有历史耗时时首轮等到预计完成前", s.next_delay() == 18)
+    s = PollSchedule(initial=1, jitter=0.2)
+    check("抖动在范围内", 0.8 <= s.next_delay() <= 1.2)
+
+
+def test_learned_latency():
+    print("\n[测试] 按指纹学习耗时")
+    fake = FakeCyberData()
+    fake.delays["SELECT slow"] = 0.6
+    stats = LatencyStats(TMP_DIR / "learned.json")
+    make_client(fake, latency_stats=stats).run("SELECT slow")
+    first_polls = fake.polls
+    expected = LatencyStats(TMP_DIR / "learned.json").expected(fingerprint("SELECT slow"))
+    check("耗时已持久化", expected is not None and expected >= 0.6, expected)
+
+    fake.polls = 0
+    make_client(fake, latency_stats=LatencyStats(TMP_DIR / "learned.json")).run("SELECT slow")
+    check("第二次轮询次数更少", fake.polls < first_polls, f"{fake.polls} vs {first_polls}")
+    fake.close()
+
+
+def test_result_cache():
+    print("\n[测试] 本地结果缓存")
+    sql = "SELECT grp, cnt FROM t WHERE dt BETWEEN '2026-02-12' AND '2026-03-04'"
+    check("提取日期分区", partitions(sql) == ["2026-02-12", "2026-03-04"], partitions(sql))
+    check("历史分区可缓存", is_cacheable(sql, today=date(2026, 3, 10)))
+    check("含昨天分区不缓存", not is_cacheable(sql, today=date(2026, 3, 5)))
+    check("无日期不缓存", not is_cacheable("SELECT COUNT(*) FROM t"))
+    check("CURDATE() 不缓存", not is_cacheable("SELECT 1 FROM t WHERE dt < CURDATE() AND dt > '2026-01-01'"))
+    check("只有下界不缓存", not is_cacheable("SELECT 1 FROM t WHERE dt >= '2026-03-01'", today=date(2026, 3, 10)))
+    check("上下界都已落地可缓存",
+          is_cacheable("SELECT 1 FROM t WHERE dt >= '2026-03-01' AND dt < '2026-03-05'", today=date(2026, 3, 10)))
+    compact = "SELECT 1 FROM t WHERE dt BETWEEN 20260301 AND 20260309"
+    check("识别 yyyymmdd", partitions(compact) == ["2026-03-01", "2026-03-09"], partitions(compact))
+    check("yyyymmdd 含昨天分区不缓存", not is_cacheable(compact, today=date(2026, 3, 10)))
+
+    fake = FakeCyberData()
+    fake.results[sql] = [["grp", "cnt"], ["A", "10"], ["B", "20"]]
+    cache = ResultCache(TMP_DIR / "results")
+    first = make_client(fake, cache=cache).run(sql)
+    submitted = len(fake.submitted)
+    # 换个排版重跑：规范化后同一个键
+    second = make_client(fake, cache=cache).run("  " + sql.replace(" ", "\n", 3) + ";")
+    check("重跑命中缓存、不再提交", len(fake.submitted) == submitted, len(fake.submitted))
+    check("缓存结果与原结果一致", first == second, second)
+    check("命中计数", cache.hits == 1, cache.hits)
+
+    # 多线程同时写同一个键（内容各不相同）：各用各的临时文件，最后留下的是某一次完整的写入
+    payloads = [[[str(i), str(k) * 50] for i in range(3000 * (k + 1))] for k in range(8)]
+    intact = True
+    for round_no in range(3):
+        shared = ResultCache(TMP_DIR / f"concurrent{round_no}")
+        writers = [threading.Thread(target=shared.put, args=(sql, ["n", "s"], rows)) for rows in payloads]
+        for t in writers:
+            t.start()
+        for t in writers:
+            t.join()
+        stored = shared.get(sql)
+        intact &= (stored is not None and stored[1] in payloads
+                   and not list((TMP_DIR / f"concurrent{round_no}").glob("*.tmp")))
+    check("并发写同一个键不串文件", intact)
+
+    small = ResultCache(TMP_DIR / "lru", max_bytes=1)
+    small.put(sql, ["n"], [["1"]])
+    check("超出上限被淘汰", not list((TMP_DIR / "lru").glob("*.json.gz")))
+    fake.close()
+
+
+def test_query_dag():
+    print("\n[测试] 查询 DAG")
+    fake = FakeCyberData()
+    fake.delays["SELECT a"] = 0.6
+    fake.delays["SELECT b"] = 0.6
+    fake.results["SELECT a"] = [["n"], ["2"]]
+    fake.failures.add("SELECT d")
+    ckpt = TMP_DIR / "dag.checkpoint.json"
+
+    def build(A, B, dt):
+        return f"SELECT c {int(A[1][0][0]) + int(B[1][0][0])} '{dt}'"
+
+    def make_dag():
+        dag = QueryDAG(make_client(fake), checkpoint=ckpt, max_concurrency=2, retries=1, retry_wait=0)
+        dag.add("A", "SELECT a")
+        dag.add("B", "SELECT b")
+        dag.add("C", build, params={"dt": "2026-02-12"}, after=["A", "B"])
+        dag.add("D", "SELECT d", after=["A"])
+        dag.add("E", "SELECT e", after=["D"])
+        return dag
+
+    start = time.time()
+    try:
+        make_dag().run()
+        check("失败节点抛 DAGError", False, "没有抛异常")
+    except DAGError as e:
+        check("失败节点抛 DAGError", list(e.failed) == ["D"], e.failed)
+        check("下游节点跳过", e.skipped == ["E"], e.skipped)
+    check("独立节点并发执行", time.time() - start < 1.3, f"{time.time() - start:.2f}s")
+    sqls = [sql for _, sql in fake.submitted]
+    check("上游结果传入下游 SQL", "SELECT c 3 '2026-02-12'" in sqls, sqls)
+    check("失败节点按 retries 重试", sqls.count("SELECT d") == 2, sqls.count("SELECT d"))
+
+    fake.failures.clear()
+    before = len(fake.submitted)
+    results = make_dag().run()
+    rerun = [sql for _, sql in fake.submitted[before:]]
+    check("断点续跑只补跑未完成节点", rerun == ["SELECT d", "SELECT e"], rerun)
+    check("返回全部节点结果", list(results) == ["A", "B", "C", "D", "E"], list(results))
+    fake.close()
+
+
+def test_query_frame():
+    print("\n[测试] 列式结果与类型推断")
+    headers = ["week_id", "grp", "users", "revenue", "dt"]
+    rows = [["202610", "A", "10", "12.5", "2026-03-02"],
+            ["202611", "B", "20", "", "2026-03-09"]]
+    frame = QueryFrame.from_rows(headers, rows, text_columns=("week_id",))
+    check("整数列为 int64", frame["users"].dtype.kind == "i", frame.dtypes)
+    check("含空值数值列为 float64 + NaN",
+          frame["revenue"].dtype.kind == "f" and frame["revenue"][1] != frame["revenue"][1], frame["revenue"])
+    check("日期列为 datetime64", frame["dt"].dtype.kind == "M", frame["dt"].dtype)
+    check("指定列保持字符串", list(frame["week_id"]) == ["202610", "202611"], frame["week_id"])
+    check("文本列保持字符串", list(frame["grp"]) == ["A", "B"], frame["grp"])
+    df = frame.to_pandas()
+    check("转 DataFrame 保留类型", df["users"].sum() == 30 and str(df["users"].dtype) == "int64", df.dtypes)
+    check("空结果", len(QueryFrame.from_rows(["n"], [])) == 0)
+
+    ids = QueryFrame.from_rows(["user_no", "code", "big", "flag"],
+                               [["123", "00123", "9007199254740993", "nan"],
+                                ["45", "7", "", "1"]])
+    check("*_no 列默认保持字符串", list(ids["user_no"]) == ["123", "45"], ids["user_no"])
+    check("前导零保持字符串", list(ids["code"]) == ["00123", "7"], ids["code"])
+    check("超出 2**53 的整数保持字符串", ids["big"][0] == "9007199254740993", ids["big"])
+    check("nan 字面量不当数值", ids["flag"].dtype == object, ids["flag"].dtype)
+
+    fake = FakeCyberData()
+    fake.results["SELECT 1"] = [["grp", "cnt"], ["A", "10"], ["B", "20"]]
+    frame = make_client(fake).query("SELECT 1")
+    check("client.query 返回 QueryFrame", int(frame["cnt"].sum()) == 30, frame.to_records())
+    fake.close()
+
+
+def test_stream_batches():
+    print("\n[测试] 分页拉取 + 边拉边写")
+    fake = FakeCyberData()
+    sql = "SELECT user_no FROM t"
+    users = [[f"U{i:04d}"] for i in range(1, 1201)]
+    fake.results[page_sql(sql, "user_no", None, 500)] = [["user_no"]] + users[:500]
+    fake.results[page_sql(sql, "user_no", "U0500", 500)] = [["user_no"]] + users[500:1000]
+    fake.results[page_sql(sql, "user_no", "U1000", 500)] = [["user_no"]] + users[1000:]
+    check("键值转义", "WHERE k > 'a''b'" in page_sql(sql, "k", "a'b"), page_sql(sql, "k", "a'b"))
+    check("字符串键一律加引号", "WHERE k > '42'" in page_sql(sql, "k", "42"), page_sql(sql, "k", "42"))
+    check("数值键不加引号", "WHERE k > 42" in page_sql(sql, "k", "42", numeric_key=True))
+    try:
+        page_sql(sql, "k", "nan", numeric_key=True)
+        check("数值键拒绝 nan", False)
+    except ValueError:
+        check("数值键拒绝 nan", True)
+
+    client = make_client(fake)
+    csv_path, xlsx_path = TMP_DIR / "users.csv", TMP_DIR / "users.xlsx"
+    sizes = []
+    with CsvSink(csv_path) as csv_sink, XlsxSink(xlsx_path, "users") as xlsx_sink:
+        for headers, rows in iter_batches(client, sql, key="user_no"):
+            sizes.append(len(rows))
+            csv_sink.write(headers, rows)
+            xlsx_sink.write(headers, rows)
+    check("按页返回", sizes == [500, 500, 200], sizes)
+    check("最后一页不足一页即停止", len(fake.submitted) == 3, len(fake.submitted))
+    lines = csv_path.read_text(encoding="utf-8-sig").splitlines()
+    check("CSV 表头只写一次 + 全部行", len(lines) == 1201 and lines[0] == "user_no", len(lines))
+    import openpyxl
+    n = sum(1 for _ in openpyxl.load_workbook(xlsx_path, read_only=True)["users"].iter_rows())
+    check("XLSX 全部行", n == 1201, n)
+
+    # 长度不同的字符串键：字典序 '100' < '1000' < '20'，游标必须按字符串比较
+    short = "SELECT user_no FROM short"
+    fake.results[page_sql(short, "user_no", None, 2)] = [["user_no"], ["100"], ["1000"]]
+    fake.results[page_sql(short, "user_no", "1000", 2)] = [["user_no"], ["20"]]
+    got = [row[0] for _, rows in iter_batches(client, short, key="user_no", page_size=2) for row in rows]
+    check("不同长度的键不漏行", got == ["100", "1000", "20"], (got, fake.submitted[-1][1]))
+    fake.close()
+
+
+def test_auth_reload():
+    print("\n[测试] 连接复用 + 认证热加载")
+    fake = FakeCyberData()
+    fake.token = "new"
+    auth_path = TMP_DIR / "auth.json"
+    auth_path.write_text(json.dumps({"cookies": "a=1", "jwttoken": "old"}))
+    auth = AuthFile(auth_path)
+    try:
+        make_client(fake, auth=auth).run("SELECT 1")
+        check("认证未更新时报错", False, "没有抛异常")
+    except QueryError as e:
+        check("认证未更新时报错", "Token" in str(e), str(e))
+
+    # 任务跑到一半 token 过期：另一个线程稍后写回新认证，客户端等待后继续
+    def refresh():
+        time.sleep(0.3)
+        auth_path.write_text(json.dumps({"cookies": "a=1", "jwttoken": "new"}))
+    threading.Thread(target=refresh).start()
+    headers, rows = make_client(fake, auth=auth, auth_wait=5).run("SELECT 1")
+    check("更新 auth.json 后自动继续", rows == [["1"]], rows)
+    check("认证只在需要时重读", auth.get()["jwttoken"] == "new")
+    check("进程内共用一个连接池", get_session() is get_session())
+    fake.close()
+
+
+def test_daily_store():
+    print("\n[测试] 门店日度聚合本地增量存储")
+    header = ["dt", "shop_name", "one_category_name", "sku_cnt", "order_cnt", "pay_amount"]
+    day_rows = {}
+    for day in range(2, 23):           # 2026-03-02（周一）起三周
+        dt = f"2026-03-{day:02d}"
+        day_rows[dt] = [
+            [dt, "Shop A", "Drink", "100", "80", "350.5"],
+            [dt, "Shop B", "Drink", "50", "40", "180"],
+            [dt, "Shop A", "Food", "10", "10", "30"],
+            [dt, "NJ Test Kitchen", "Drink", "5", "5", "10"],
+        ]
+
+    class RangeResults(dict):
+        """按 SQL 里的 dt BETWEEN 区间拼出各天的行"""
+
+        def get(self, sql, default=None):
+            m = re.search(r"dt BETWEEN '([\d-]+)' AND '([\d-]+)'", sql)
+            if not m:
+                return super().get(sql, default)
+            return [header] + [row for dt, rows in sorted(day_rows.items())
+                               if m.group(1) <= dt <= m.group(2) for row in rows]
+
+    fake = FakeCyberData()
+    fake.results = RangeResults()
+    store = DailyStore(make_client(fake), TMP_DIR / "daily.db")
+    synced = store.sync("2026-03-02", "2026-03-15", today=date(2026, 3, 16))
+    check("首次拉取全部分区", len(synced) == 14, len(synced))
+    check("连续分区按区间合并查询", len(fake.submitted) == 2
+          and "BETWEEN '2026-03-02' AND '2026-03-08'" in fake.submitted[0][1], len(fake.submitted))
+    check("未落地的分区标记为待重拉",
+          store.stale_partitions("2026-03-02", "2026-03-15", today=date(2026, 3, 16)) == ["2026-03-15"],
+          store.stale_partitions("2026-03-02", "2026-03-15", today=date(2026, 3, 16)))
+
+    before = len(fake.submitted)
+    synced = store.sync("2026-03-02", "2026-03-22", today=date(2026, 3, 20))
+    check("再次运行只补拉新增/未落地分区",
+          synced == ["2026-03-15", "2026-03-16", "2026-03-17", "2026-03-18", "2026-03-19"], synced)
+    check("补拉的连续分区一条查询", len(fake.submitted) - before == 1, len(fake.submitted) - before)
+
+    weekly = store.weekly("2026-03-02", "2026-03-15")
+    check("按 ISO 周汇总", list(weekly["week_id"]) == ["202610", "202611"], list(weekly["week_id"]))
+    w = weekly.iloc[0]
+    check("周汇总剔除测试店和非 Drink",
+          (w["shop_count"], w["biz_days"], w["sku_cnt"]) == (2, 7, 1050), w.to_dict())
+    daily = store.daily(["2026-03-14", "2026-03-15"])
+    check("日度汇总", list(daily["sku_cnt"]) == [150, 150], daily.to_dict())
+    shop = store.shop_weekly("2026-03-02", "2026-03-08")
+    check("门店 × 周汇总", list(shop["sku_cnt"]) == [700, 350], shop.to_dict())
+
+    day_rows["2026-03-20"] = []
+    day_rows["2026-03-21"] = [["2026-03-21", None, "Drink", "1", "1", "2"]]
+    store.sync("2026-03-20", "2026-03-21", today=date(2026, 3, 30))
+    check("空分区不记为已同步",
+          store.stale_partitions("2026-03-20", "2026-03-21", today=date(2026, 3, 30)) == ["2026-03-20"],
+          store.stale_partitions("2026-03-20", "2026-03-21", today=date(2026, 3, 30)))
+    check("shop_name 为 NULL 不影响同步", store.daily(["2026-03-21"])["sku_cnt"].tolist() == [1])
+    store.close()
+
+    # 首次同步六周：区间查询分批提交，同时在跑的不超过 SYNC_CONCURRENCY
+    client = make_client(fake)
+    batches = []
+    original_run_many = client.run_many
+    client.run_many = lambda queries, **kw: batches.append(len(queries)) or original_run_many(queries, **kw)
+    fresh = DailyStore(client, TMP_DIR / "daily_fresh.db")
+    synced = fresh.sync("2026-01-05", "2026-02-15", today=date(2026, 3, 30))
+    check("六周首次同步分批提交", len(synced) == 42 and batches == [SYNC_CONCURRENCY, 6 - SYNC_CONCURRENCY],
+          batches)
+    fresh.close()
+    fake.close()
+
+
+def test_telemetry():
+    print("\n[测试] 查询遥测")
+    fake = FakeCyberData()
+    path = TMP_DIR / "telemetry.jsonl"
+    fake.delays["SELECT slow FROM t WHERE dt = '2026-01-01'"] = 0.3
+    fake.results["SELECT slow FROM t WHERE dt = '2026-01-01'"] = [["n"], ["1"], ["2"]]
+    fake.failures.add("SELECT bad")
+    client = make_client(fake, telemetry=Telemetry(path), cache=ResultCache(TMP_DIR / "tele_cache"))
+    client.run("SELECT slow FROM t WHERE dt = '2026-01-01'", label="slow")
+    client.run("SELECT slow FROM t WHERE dt = '2026-01-01'", label="slow")
+    client.run("SELECT fast", label="fast")
+    try:
+        client.run("SELECT bad", label="bad", attempt=1)
+    except QueryError:
+        pass
+
+    records = list(load(path))
+    check("每次执行一条记录", len(records) == 4, len(records))
+    slow = records[0]
+    check("记录耗时/轮询/行数/字节", slow["latency"] >= 0.3 and slow["polls"] >= 1
+          and slow["rows"] == 2 and slow["bytes"] > 0, slow)
+    check("缓存命中单独标记", records[1]["cache_hit"] is True, records[1])
+    check("失败记录错误和重试序号", "SQL 语法错误" in records[3]["error"] and records[3]["retries"] == 1,
+          records[3])
+
+    summary = rollup(records)
+    g = summary[fingerprint("SELECT slow FROM t WHERE dt = '2026-01-01'")]
+    check("按指纹汇总", g["runs"] == 2 and g["cache_hits"] == 1 and g["executed"] == 1, g)
+    check("汇总失败次数", summary[fingerprint("SELECT bad")]["errors"] == 1)
+    fake.close()
+
+
+def test_coalesce():
+    print("\n[测试] 相同查询合并")
+    fake = FakeCyberData()
+    sql = "SELECT shared FROM t"
+    fake.delays[sql] = 0.5
+    fake.results[sql] = [["n"], ["42"]]
+    spool = TMP_DIR / "inflight"
+    results = []
+
+    def worker():
+        results.append(make_client(fake, inflight=Inflight(spool)).run(sql, label="shared"))
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+        time.sleep(0.05)
+    for t in threads:
+        t.join()
+    check("三个线程只提交一次", len(fake.submitted) == 1, len(fake.submitted))
+    check("所有等待方拿到结果", results == [(["n"], [["42"]])] * 3, results)
+
+    fake.submitted.clear()
+    both = make_client(fake, inflight=Inflight(spool)).run_many({"a": sql, "b": " " + sql + ";"})
+    check("同一批里的相同查询只提交一次", len(fake.submitted) == 1, len(fake.submitted))
+    check("同一批两个标签都有结果", both["a"] == both["b"] == (["n"], [["42"]]), both)
+
+    # leader 失败：等待方接替自行提交
+    fake.submitted.clear()
+    fake.failures.add("SELECT flaky")
+    fake.delays["SELECT flaky"] = 0.3
+    errors, got = [], []
+
+    def leader():
+        try:
+            make_client(fake, inflight=Inflight(spool)).run("SELECT flaky")
+        except QueryError as e:
+            errors.append(e)
+
+    t = threading.Thread(target=leader)
+    t.start()
+    time.sleep(0.1)
+    fake.failures.discard("SELECT flaky")
+    got.append(make_client(fake, inflight=Inflight(spool)).run("SELECT flaky"))
+    t.join()
+    check("leader 失败后等待方接替执行",
+          len(errors) == 1 and got == [(["n"], [["1"]])] and len(fake.submitted) == 2,
+          (errors, got, len(fake.submitted)))
+    fake.close()
+
+
+if __name__ == "__main__":
+    test_sql_fingerprint()
+    test_poll_schedule()
+    test_single_query()
+    test_run_many_concurrent()
+    test_failure_and_timeout()
+    test_learned_latency()
+    test_result_cache()
+    test_query_dag()
+    test_query_frame()
+    test_stream_batches()
+    test_auth_reload()
+    test_daily_store()
+    test_telemetry()
+    test_coalesce()
+
+    print(f"\n{'='*50}")
+    print(f"结果：✅ {PASS} 通过 / ❌ {FAIL} 失败")
+    print(f"{'='*50}")
+    sys.exit(1 if FAIL > 0 else 0)
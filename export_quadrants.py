@@ -1,58 +1,12 @@
-import json, time, requests, openpyxl
+import os, sys
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 
-auth = json.load(open('/Users/xiaoxiao/.claude/skills/cyberdata-query/auth.json'))
-cookies_str = auth['cookies']
-jwttoken = auth['jwttoken']
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cyberdata'))
+from cyberdata_query import CyberDataClient
+from stream import XlsxSink, iter_batches
 
-api_headers = {
-    'accept': 'application/json, text/plain, */*',
-    'content-type': 'application/json; charset=UTF-8',
-    'jwttoken': jwttoken,
-    'productkey': 'CyberData',
-    'origin': 'https://idpcd.luckincoffee.us',
-}
-cookie_dict = {}
-for item in cookies_str.split('; '):
-    if '=' in item:
-        k, v = item.split('=', 1)
-        cookie_dict[k] = v
-
-def run_sql(sql, wait=8):
-    ts = int(time.time() * 1000)
-    payload = {
-        "_t": ts, "tenantId": "1001", "userId": "47",
-        "projectId": "1906904360294313985", "resourceGroupId": 1,
-        "taskId": "1990991087752757249", "variables": {},
-        "sqlStatement": sql, "env": 5
-    }
-    r = requests.post('https://idpcd.luckincoffee.us/api/dev/task/run',
-                       headers=api_headers, cookies=cookie_dict, json=payload)
-    resp = r.json()
-    if resp.get('code') != '200':
-        print(f"  Submit failed: {resp}")
-        return None
-    task_id = resp['data']
-    print(f"  Task: {task_id}, waiting {wait}s...")
-    time.sleep(wait)
-
-    ts2 = int(time.time() * 1000)
-    payload2 = {
-        "_t": ts2, "tenantId": "1001", "userId": "47",
-        "projectId": "1906904360294313985", "env": 5,
-        "taskInstanceId": str(task_id)
-    }
-    r2 = requests.post('https://idpcd.luckincoffee.us/api/logger/getQueryLog',
-                        headers=api_headers, cookies=cookie_dict, json=payload2)
-    data = r2.json()
-    if data.get('code') == '200' and data.get('data'):
-        rows = []
-        for item in data['data']:
-            cols = item.get('columns', [])
-            if cols:
-                rows.extend(cols)
-        return rows
-    return None
+client = CyberDataClient()
 
 base_cte = """
 WITH user_4wk AS (
@@ -123,10 +77,10 @@ SELECT
 FROM user_all
 GROUP BY 1 ORDER BY 1
 """
-count_rows = run_sql(count_sql)
-if count_rows:
-    for r in count_rows:
-        print(f"  {r}")
+headers, count_rows = client.run(count_sql, label='counts')
+print(f"  {headers}")
+for r in count_rows:
+    print(f"  {r}")
 
 # Step 2: Batch fetch users per quadrant (500 per batch)
 BATCH = 500
@@ -140,73 +94,61 @@ thin_border = Border(left=Side(style='thin'), right=Side(style='thin'),
                      top=Side(style='thin'), bottom=Side(style='thin'))
 base_path = '/Users/xiaoxiao/Vibe coding/'
 
+def styled(ws, value, font=None, fill=None, alignment=None, border=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if font: cell.font = font
+    if fill: cell.fill = fill
+    if alignment: cell.alignment = alignment
+    if border: cell.border = border
+    return cell
+
 for q in quadrants:
     print(f"\n{'='*50}")
     print(f"Fetching {q['name']}...")
-    
-    all_users = []
-    offset = 0
-    while True:
-        sql = base_cte + f"SELECT user_no FROM user_all WHERE {q['condition']} ORDER BY user_no LIMIT {BATCH} OFFSET {offset}"
-        rows = run_sql(sql, wait=6)
-        if rows is None:
-            print(f"  Query failed at offset {offset}")
-            break
-        # Skip header row
-        batch_users = [r[0] for r in rows if r[0] != 'user_no']
-        all_users.extend(batch_users)
-        print(f"  Batch offset={offset}: got {len(batch_users)} rows (total: {len(all_users)})")
-        if len(batch_users) < BATCH:
-            break
-        offset += BATCH
-
-    print(f"  Total users for {q['name']}: {len(all_users)}")
 
-    # Create Excel
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = q['sheet']
+    # 只写模式：按 user_no 分页拉取，每页写完即落盘，内存不随人数增长。
+    # 用户数要写在表头说明里，先用 Step 1 的计数
+    count = dict(count_rows).get(f"Q{q['id']}", '?')
+    filepath = base_path + q['file']
+    sink = XlsxSink(filepath, q['sheet'], header=False)
+    ws = sink.ws
     ws.column_dimensions['A'].width = 30
     ws.column_dimensions['B'].width = 55
 
-    ws.merge_cells('A1:B1')
-    ws['A1'] = f"提频任务 — {q['name']}"
-    ws['A1'].font = Font(name='Arial', size=13, bold=True, color=q['color'])
+    ws.merged_cells.add('A1:B1')
+    ws.append([styled(ws, f"提频任务 — {q['name']}",
+                      font=Font(name='Arial', size=13, bold=True, color=q['color']))])
 
     info_rows = [
         ('象限', q['name']),
         ('划分条件', q['desc']),
         ('运营策略', q['strategy']),
         ('剔除规则', '已剔除最近1周消费≥3杯的用户'),
-        ('用户数', f'{len(all_users):,} 人'),
+        ('用户数', f'{int(count):,} 人' if str(count).isdigit() else count),
         ('数据窗口', '4周: 2026-02-16~03-15 | 最近1周: 2026-03-09~03-15'),
     ]
-    for i, (label, val) in enumerate(info_rows):
-        r = 2 + i
-        ws.cell(row=r, column=1, value=label).font = Font(name='Arial', size=10, bold=True)
-        ws.cell(row=r, column=1).alignment = left_align
-        ws.cell(row=r, column=2, value=val).font = info_font
-        ws.cell(row=r, column=2).alignment = left_align
+    for label, val in info_rows:
+        ws.append([styled(ws, label, font=Font(name='Arial', size=10, bold=True), alignment=left_align),
+                   styled(ws, val, font=info_font, alignment=left_align)])
 
-    data_start = 9
-    ws.cell(row=data_start, column=1, value='user_no')
-    ws.cell(row=data_start, column=1).font = header_font
-    ws.cell(row=data_start, column=1).fill = header_fill
-    ws.cell(row=data_start, column=1).alignment = center
-    ws.cell(row=data_start, column=1).border = thin_border
+    ws.append([])
+    ws.append([styled(ws, 'user_no', font=header_font, fill=header_fill,
+                      alignment=center, border=thin_border)])
 
     q_fill = PatternFill(start_color=q['fill'], end_color=q['fill'], fill_type='solid')
-    for i, uno in enumerate(all_users):
-        r = data_start + 1 + i
-        cell = ws.cell(row=r, column=1, value=uno)
-        cell.font = normal_font
-        cell.alignment = center
-        cell.border = thin_border
-        if i % 2 == 0:
-            cell.fill = q_fill
-
-    filepath = base_path + q['file']
-    wb.save(filepath)
+    sql = base_cte + f"SELECT user_no FROM user_all WHERE {q['condition']}"
+    i = 0
+    for headers, rows in iter_batches(client, sql, key='user_no', page_size=BATCH, label=q['sheet']):
+        cells = []
+        for (uno,) in rows:
+            cells.append([styled(ws, uno, font=normal_font, alignment=center, border=thin_border,
+                                 fill=q_fill if i % 2 == 0 else None)])
+            i += 1
+        sink.write(headers, cells)
+        print(f"  got {len(rows)} rows (total: {sink.rows})")
+
+    sink.close()
+    print(f"  Total users for {q['name']}: {sink.rows}")
     print(f"  Saved: {filepath}")
 
 print("\n\n=== ALL DONE ===")
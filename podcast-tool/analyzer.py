@@ -9,6 +9,7 @@ import os
 import sys
 import json
 import re
+import threading
 import concurrent.futures
 
 try:
@@ -17,10 +18,17 @@ except ImportError:
     print("❌ 缺少依赖，请运行：pip install openai")
     sys.exit(1)
 
+from llm_cache import LLMCache
+
 # 通义千问 API 配置
 QWEN_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 QWEN_MODEL = "qwen-plus"
 
+# 响应缓存：同一 (模型, prompt, 转录, max_tokens) 直接返回上次结果
+# LLM_CACHE_BYPASS=1 或 CLI --no-cache 跳过读缓存（结果仍会写入）
+llm_cache = LLMCache()
+CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS") == "1"
+
 SYSTEM_PROMPT = """你是一位播客内容整理编辑，负责将播客转录文本整理为结构化内容。
 
 ## 核心原则
@@ -254,12 +262,147 @@ label 格式为 "MM:SS"（由 start_sec 换算），detailed_timeline 的 label
 ## 输出纯 JSON，不要加 ```json 代码块标记，不要加解释文字
 """
 
+# ===== 长转录分段分析（map-reduce）=====
+# 超过 CHUNK_THRESHOLD 字的转录按段落标记切成若干段并发分析（map），每段只整理本段的
+# 章节/时间轴/观点/概念/知识卡片；再把各段大纲交给一次轻量的合并调用（reduce），生成
+# 全局模块（概览/思维导图/测验/延伸阅读/精选金句）。总耗时≈最慢的一段 + 合并，
+# 不再随转录长度线性增长，也不会撞上下文长度上限。
+CHUNK_THRESHOLD = 30000     # 字符数
+CHUNK_CHARS = 12000         # 每段目标字符数（约 15-20 分钟对话）
+CHUNK_WORKERS = 4
+CHUNK_MAX_TOKENS = 8192
+MERGE_MAX_TOKENS = 8192
+
+# 通用规则直接取自完整分析的 prompt，保持两种模式输出口径一致
+_DIAGRAM_RULES = SYSTEM_PROMPT[SYSTEM_PROMPT.index("14. **key_points_grouped**"):SYSTEM_PROMPT.index("16. **输出纯 JSON**")]
+_QUALITY_RULES = SYSTEM_PROMPT[SYSTEM_PROMPT.index("## 文字质量要求"):]
+
+SYSTEM_PROMPT_CHUNK = """你是播客内容整理编辑。你拿到的是一期长播客转录中的一段（消息里会注明第几段），只整理这一段的内容；其他段由其他编辑并行整理，最后统一合并。
+
+必须输出合法 JSON，顶层包含以下字段：
+
+```json
+{
+  "participants": [{"id": "host", "name": "名字", "role": "host", "bio": "简短介绍（可选）"}],
+  "sections": [
+    {
+      "id": "intro",
+      "title": "章节主标题",
+      "subtitle": "章节副标题",
+      "start_sec": 0,
+      "end_sec": 480,
+      "is_ad": false,
+      "key_points": ["核心观点1", "核心观点2", "核心观点3"],
+      "quotes": ["金句1"],
+      "stories": [{"narrator_id": "host", "text": "个人故事或案例描述"}],
+      "key_points_grouped": [{"label": "分组名", "visual_type": "list", "points": [{"text": "要点", "detail": "补充"}]}],
+      "diagram": {"type": "flow", "title": "图表标题", "steps": [{"label": "步骤", "desc": "说明"}]},
+      "section_context": "这段聊了什么（一句大白话）"
+    }
+  ],
+  "detailed_timeline": [
+    {"id": "tl-1", "start_sec": 0, "end_sec": 480, "label": "00:00 – 08:00", "headline": "段落小标题（10字内）",
+     "narrative": "这段讲了什么（50-100字，备忘录式）", "topics": ["话题标签"]}
+  ],
+  "quote_candidates": ["本段最有力量的原话"],
+  "arguments": [{"id": "arg-1", "claim": "观点陈述", "evidence_type": "个人经历", "evidence": "论据概述", "source_section_id": "intro", "strength": "strong"}],
+  "key_concepts": [{"id": "concept-1", "term": "概念名称", "definition": "简洁定义", "explanation": "播客中如何阐述", "examples": ["具体例子"], "related_concepts": [], "source_section_id": "intro"}],
+  "knowledge_cards": [{"id": "kc-1", "claim": "论点一句话", "evidence_summary": "论据摘要（50-80字）", "extension": "延伸解释（50-100字）", "tags": ["标签"], "related_card_ids": [], "source_section_id": "intro"}],
+  "recommendations": [{"type": "book", "title": "书名", "author": "作者", "quote": "推荐理由"}]
+}
+```
+
+## 数量要求（只针对本段）
+- sections：按话题转换划分 1-3 个章节，广告段标记 is_ad: true，只填 title/subtitle/start_sec/end_sec/section_context
+- detailed_timeline：每5-10分钟一段
+- quote_candidates：2-4 句，必须是本段实际说出的原话
+- arguments：2-4 个；key_concepts：1-3 个；knowledge_cards：3-6 张，不要从广告内容中提取
+- participants：只列本段出现的说话人；姓名只能从标题、简介、转录中提取，不确定写"未知"
+- recommendations：本段提到的书单/影单/播客推荐，可为空数组
 
-def _call_qwen(client, system_prompt, user_message):
-    """单次通义千问 API 调用"""
+## 时间戳
+转录中的 [MM:SS - MM:SS] 是整期节目的绝对时间，直接换算成秒数，不要从 0 重新计时。
+
+## 章节字段要求（与完整分析一致）
+""" + _DIAGRAM_RULES + "\n" + _QUALITY_RULES + """
+## 输出纯 JSON，不要加 ```json 代码块标记，不要加解释文字
+"""
+
+SYSTEM_PROMPT_MERGE = """你是播客内容整理编辑。一期长播客已经分段整理完毕，你拿到的是各段整理结果的大纲（章节、时间轴、观点、概念、知识卡片、候选金句）。请基于大纲生成整期的全局模块。
+
+必须输出合法 JSON，顶层包含以下字段：
+
+```json
+{
+  "meta": {"podcast_name": "播客名称", "episode_number": 59, "title": "本期标题", "subtitle": "一句话描述本期主题", "total_duration_sec": 5400, "language": "zh"},
+  "featured_work": {"type": "book", "title": "书名", "author": "作者名"},
+  "core_quotes": ["精选金句"],
+  "content_overview": {
+    "one_sentence_summary": "一句话概括核心主旨（15-30字，大白话）",
+    "content_blocks": [{"id": "block-1", "title": "组块标题", "summary": "组块概要", "section_ids": ["大纲中的章节 id"], "icon": "🎯"}],
+    "block_connections": [{"from": "block-1", "to": "block-2", "relation": "延伸/因果/递进/对比", "description": "一句话说清两个组块之间的关系"}]
+  },
+  "mind_map": {
+    "central_theme": "核心主题",
+    "nodes": [{"id": "node-1", "label": "节点标签", "type": "theme", "parent_id": null, "detail": "节点说明"}]
+  },
+  "quiz": {
+    "intro": "自测引导语",
+    "questions": [{"id": "q1", "text": "问题", "type": "choice", "options": [{"label": "选项A", "score": 0}, {"label": "选项B", "score": 1}, {"label": "选项C", "score": 2}, {"label": "选项D", "score": 3}]}],
+    "result_levels": [{"max_avg_score": 1.0, "level_label": "新手级", "description": "结果描述"}, {"max_avg_score": 2.0, "level_label": "进阶级", "description": "结果描述"}, {"max_avg_score": 3.0, "level_label": "高手级", "description": "结果描述"}]
+  },
+  "extended_reading": [{"id": "ext-1", "topic": "延伸主题", "context": "话题背景", "deep_dive": "延伸解读", "related_concept_ids": ["大纲中的概念 id"], "further_resources": "推荐方向"}]
+}
+```
+
+## 要求
+- **core_quotes**：从候选金句中挑选 5-10 句，保持原话，不要改写或新编
+- **content_overview**：把章节归纳为 3-5 个组块，section_ids 必须使用大纲中已有的章节 id；relation 和 description 必填
+- **mind_map**：2-3 层树状结构，type 为 theme/concept/argument/example，一级 3-5 个节点
+- **quiz**：5 道与本期主题紧密相关的自测题
+- **featured_work**：仅当本期明确围绕某书/电影/作品展开时填写，否则省略
+- **extended_reading**：4-6 个延伸方向，严禁编造具体论文、期刊、年份、项目名称、百分比数据
+- **meta.total_duration_sec**：取最后一个章节的 end_sec
+- 只依据大纲内容，不要补充大纲里没有的观点
+
+## 输出纯 JSON，不要加 ```json 代码块标记，不要加解释文字
+"""
+
+# 分段结果里需要合并的列表字段，以及合并调用负责生成的全局字段
+CHUNK_LIST_FIELDS = ("sections", "detailed_timeline", "arguments", "key_concepts",
+                     "knowledge_cards", "recommendations")
+MERGE_FIELDS = ("meta", "featured_work", "core_quotes", "content_overview", "mind_map",
+                "quiz", "extended_reading")
+
+_PARAGRAPH_RE = re.compile(r"^\[[\d:]+ - [\d:]+\] 说话人", re.MULTILINE)
+
+
+def _log_cache(hit, key, system_prompt):
+    try:
+        from logger import log_event
+        log_event("llm_cache_hit" if hit else "llm_cache_miss", key=key[:16],
+                  prompt=system_prompt[:20], hits=llm_cache.hits, misses=llm_cache.misses)
+    except Exception:
+        pass
+
+
+def _call_qwen(client, system_prompt, user_message, max_tokens=16384, use_cache=True):
+    """单次通义千问 API 调用（带响应缓存）"""
+    key = LLMCache.key(QWEN_MODEL, system_prompt, user_message, max_tokens)
+    if use_cache and not CACHE_BYPASS:
+        cached = llm_cache.get(key)
+        _log_cache(cached is not None, key, system_prompt)
+        if cached is not None:
+            return cached
+    result = _call_qwen_uncached(client, system_prompt, user_message, max_tokens)
+    llm_cache.put(key, result)
+    return result
+
+
+def _call_qwen_uncached(client, system_prompt, user_message, max_tokens):
     response = client.chat.completions.create(
         model=QWEN_MODEL,
-        max_tokens=16384,
+        max_tokens=max_tokens,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_message},
@@ -268,7 +411,158 @@ def _call_qwen(client, system_prompt, user_message):
     return _parse_json_output(response.choices[0].message.content.strip())
 
 
-def analyze_transcript(transcript_path: str, output_path: str = None, metadata: dict = None) -> dict:
+def split_transcript(text: str, max_chars: int = CHUNK_CHARS) -> list:
+    """按 [MM:SS - MM:SS] 说话人N 段落标记切分，每段不超过 max_chars（单个段落超长时独占一段）"""
+    starts = [m.start() for m in _PARAGRAPH_RE.finditer(text)]
+    if not starts:
+        return [text]
+    chunks = []
+    current, paragraphs = text[:starts[0]], 0     # 标记之前的标题行并入第一段
+    for begin, end in zip(starts, starts[1:] + [len(text)]):
+        paragraph = text[begin:end]
+        if paragraphs and len(current) + len(paragraph) > max_chars:
+            chunks.append(current)
+            current, paragraphs = "", 0
+        current += paragraph
+        paragraphs += 1
+    chunks.append(current)
+    return chunks
+
+
+def _prefix_ids(part: dict, prefix: str) -> dict:
+    """给一段结果里的 id 加前缀，并同步段内引用，避免各段 id 合并后冲突"""
+    def known(field):
+        return {x["id"] for x in part.get(field) or [] if isinstance(x, dict) and x.get("id")}
+
+    section_ids, concept_ids, card_ids = known("sections"), known("key_concepts"), known("knowledge_cards")
+
+    def ref(value, ids):
+        return prefix + value if value in ids else value
+
+    for field in ("sections", "detailed_timeline", "arguments", "key_concepts", "knowledge_cards"):
+        for item in part.get(field) or []:
+            if not isinstance(item, dict):
+                continue
+            if item.get("id"):
+                item["id"] = prefix + item["id"]
+            if "source_section_id" in item:
+                item["source_section_id"] = ref(item["source_section_id"], section_ids)
+            if isinstance(item.get("related_concepts"), list):
+                item["related_concepts"] = [ref(x, concept_ids) for x in item["related_concepts"]]
+            if isinstance(item.get("related_card_ids"), list):
+                item["related_card_ids"] = [ref(x, card_ids) for x in item["related_card_ids"]]
+    return part
+
+
+def merge_chunks(parts: list) -> tuple:
+    """合并各段结果（按时间顺序），返回 (episode_data, 候选金句)"""
+    merged = {field: [] for field in CHUNK_LIST_FIELDS}
+    merged["participants"] = []
+    candidates = []
+    seen_people, seen_terms, seen_titles = set(), set(), set()
+    for part in parts:
+        for field in CHUNK_LIST_FIELDS:
+            for item in part.get(field) or []:
+                if field == "key_concepts":
+                    term = item.get("term") if isinstance(item, dict) else None
+                    if term in seen_terms:
+                        continue
+                    seen_terms.add(term)
+                if field == "recommendations":
+                    title = item.get("title") if isinstance(item, dict) else None
+                    if title in seen_titles:
+                        continue
+                    seen_titles.add(title)
+                merged[field].append(item)
+        for person in part.get("participants") or []:
+            key = person.get("name") or person.get("id")
+            if key and key not in seen_people:
+                seen_people.add(key)
+                merged["participants"].append(person)
+        candidates.extend(part.get("quote_candidates") or [])
+
+    for field in ("sections", "detailed_timeline"):
+        merged[field].sort(key=lambda x: x.get("start_sec", 0) if isinstance(x, dict) else 0)
+    return merged, candidates
+
+
+def _outline(merged: dict, candidates: list) -> dict:
+    """合并调用的输入：只保留大纲字段，长度与转录长度无关"""
+    return {
+        "sections": [{k: s.get(k) for k in ("id", "title", "subtitle", "start_sec", "end_sec",
+                                             "is_ad", "section_context", "key_points")}
+                     for s in merged["sections"]],
+        "timeline": [t.get("headline") for t in merged["detailed_timeline"]],
+        "quote_candidates": candidates,
+        "arguments": [a.get("claim") for a in merged["arguments"]],
+        "key_concepts": [{"id": c.get("id"), "term": c.get("term")} for c in merged["key_concepts"]],
+        "knowledge_cards": [k.get("claim") for k in merged["knowledge_cards"]],
+        "participants": merged["participants"],
+    }
+
+
+def _analyze_chunked(client, transcript_text: str, meta_hint: str, use_cache: bool = True) -> dict:
+    """map：各段并发分析；reduce：本地合并列表字段 + 一次合并调用生成全局模块"""
+    chunks = split_transcript(transcript_text)
+    total = len(chunks)
+    print(f"   分段分析：{total} 段，并发 {min(CHUNK_WORKERS, total)}")
+
+    def analyze_chunk(index, chunk):
+        return _analyze_part(client, index, chunk, meta_hint, use_cache)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(CHUNK_WORKERS, total)) as pool:
+        parts = list(pool.map(analyze_chunk, range(total), chunks))
+    return _merge_parts(client, parts, meta_hint, use_cache)
+
+
+def _analyze_part(client, index: int, chunk: str, meta_hint: str, use_cache: bool = True) -> dict:
+    """
+    分析一段转录，id 加 c{index+1}- 前缀
+
+    prompt 里只写段序号、不写总段数：边转录边分析时还不知道总段数，两条路径的 prompt 和
+    缓存键要一致
+    """
+    user_message = f"""{meta_hint}## 转录片段（第 {index + 1} 段）
+
+{chunk}
+
+请只整理这一段，输出符合要求的 JSON 结构。"""
+    part = _call_qwen(client, SYSTEM_PROMPT_CHUNK, user_message,
+                      max_tokens=CHUNK_MAX_TOKENS, use_cache=use_cache)
+    print(f"   ✓ 第 {index + 1} 段完成")
+    return _prefix_ids(part, f"c{index + 1}-")
+
+
+def _merge_parts(client, parts: list, meta_hint: str, use_cache: bool = True) -> dict:
+    """本地合并各段列表字段 + 一次合并调用生成全局模块"""
+    episode_data, candidates = merge_chunks(parts)
+    outline = json.dumps(_outline(episode_data, candidates), ensure_ascii=False)
+    overview = _call_qwen(client, SYSTEM_PROMPT_MERGE,
+                          f"{meta_hint}## 各段整理结果（大纲）\n\n{outline}\n\n请生成整期的全局模块。",
+                          max_tokens=MERGE_MAX_TOKENS, use_cache=use_cache)
+    print("   ✓ 合并完成")
+    episode_data.update({k: overview[k] for k in MERGE_FIELDS if k in overview})
+    episode_data.setdefault("core_quotes", candidates[:10])
+    return episode_data
+
+
+def _analyze_single(client, user_message: str, use_cache: bool = True) -> dict:
+    """整段转录一次性分析：基础分析 + 扩展模块两个 prompt 并发"""
+    print("   并发执行：基础分析 + 扩展模块（详细时间轴/金句/对话/知识卡片）")
+    print("   预计耗时：30-120 秒...")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+        f1 = pool.submit(_call_qwen, client, SYSTEM_PROMPT, user_message, use_cache=use_cache)
+        f2 = pool.submit(_call_qwen, client, SYSTEM_PROMPT_EXTENDED, user_message, use_cache=use_cache)
+        episode_data = f1.result()
+        print("   ✓ 基础分析完成")
+        extended_data = f2.result()
+        print("   ✓ 扩展模块完成")
+    episode_data.update(extended_data)
+    return episode_data
+
+
+def analyze_transcript(transcript_path: str, output_path: str = None, metadata: dict = None,
+                       chunked: bool = None, use_cache: bool = True) -> dict:
     """
     使用 Claude 分析转录文本，生成结构化 JSON
 
@@ -276,6 +570,8 @@ def analyze_transcript(transcript_path: str, output_path: str = None, metadata:
         transcript_path: 转录文本文件路径（.txt）
         output_path: 输出 JSON 文件路径，None 则自动推断
         metadata: 可选的元数据 dict（podcast_name, cover_url 等）
+        chunked: 是否分段分析，None 则超过 CHUNK_THRESHOLD 字时自动分段
+        use_cache: False 时不读响应缓存，强制重新调用
 
     Returns:
         dict: 结构化的 episode 数据
@@ -294,10 +590,36 @@ def analyze_transcript(transcript_path: str, output_path: str = None, metadata:
     char_count = len(transcript_text)
     print(f"   字符数：{char_count:,}")
 
-    # 构建用户消息
-    meta_hint = ""
-    if metadata:
-        meta_hint = f"""
+    meta_hint = _meta_hint(metadata)
+    user_message = _user_message(meta_hint, transcript_text)
+
+    if chunked is None:
+        chunked = char_count > CHUNK_THRESHOLD
+
+    print(f"🤖 调用通义千问分析中（{QWEN_MODEL}）...")
+    client = OpenAI(api_key=api_key, base_url=QWEN_BASE_URL)
+
+    try:
+        if chunked:
+            episode_data = _analyze_chunked(client, transcript_text, meta_hint, use_cache)
+        else:
+            episode_data = _analyze_single(client, user_message, use_cache)
+    except Exception as e:
+        raise RuntimeError(f"通义千问 API 调用失败：{e}")
+
+    # 确定输出路径
+    if not output_path:
+        base = os.path.splitext(transcript_path)[0]
+        output_path = base.replace("transcript", "episode") + ".json"
+        if output_path == transcript_path:
+            output_path = os.path.splitext(transcript_path)[0] + "_episode.json"
+    return _finalize(episode_data, metadata, output_path)
+
+
+def _meta_hint(metadata: dict = None) -> str:
+    if not metadata:
+        return ""
+    return f"""
 ## 已知元数据（直接使用，无需从文本中推断）
 - 播客名称：{metadata.get('podcast_name') or '未知'}
 - 本期标题：{metadata.get('title') or '未知'}
@@ -307,30 +629,17 @@ def analyze_transcript(transcript_path: str, output_path: str = None, metadata:
 
 """
 
-    user_message = f"""{meta_hint}## 转录文本
+
+def _user_message(meta_hint: str, transcript_text: str) -> str:
+    return f"""{meta_hint}## 转录文本
 
 {transcript_text}
 
 请分析以上转录文本，输出符合要求的 JSON 结构。"""
 
-    print(f"🤖 调用通义千问分析中（{QWEN_MODEL}）...")
-    print(f"   并发执行：基础分析 + 扩展模块（详细时间轴/金句/对话/知识卡片）")
-    print(f"   预计耗时：30-120 秒...")
-
-    client = OpenAI(api_key=api_key, base_url=QWEN_BASE_URL)
-
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
-            f1 = pool.submit(_call_qwen, client, SYSTEM_PROMPT, user_message)
-            f2 = pool.submit(_call_qwen, client, SYSTEM_PROMPT_EXTENDED, user_message)
-            episode_data = f1.result()
-            print(f"   ✓ 基础分析完成")
-            extended_data = f2.result()
-            print(f"   ✓ 扩展模块完成")
-        episode_data.update(extended_data)
-    except Exception as e:
-        raise RuntimeError(f"通义千问 API 调用失败：{e}")
 
+def _finalize(episode_data: dict, metadata: dict, output_path: str) -> dict:
+    """注入元数据里的链接，写出 episode.json"""
     # 注入封面 URL（Claude 无法从文本中获取）
     if metadata:
         if "meta" not in episode_data:
@@ -344,19 +653,12 @@ def analyze_transcript(transcript_path: str, output_path: str = None, metadata:
                 "xiaoyuzhou": metadata["source_url"]
             }
 
-    # 确定输出路径
-    if not output_path:
-        base = os.path.splitext(transcript_path)[0]
-        output_path = base.replace("transcript", "episode") + ".json"
-        if output_path == transcript_path:
-            output_path = os.path.splitext(transcript_path)[0] + "_episode.json"
-
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(episode_data, f, ensure_ascii=False, indent=2)
 
     sections_count = len(episode_data.get("sections", []))
     quotes_count = len(episode_data.get("core_quotes", []))
-    print(f"✅ 内容分析完成")
+    print("✅ 内容分析完成")
     print(f"   章节数：{sections_count}")
     print(f"   精选金句：{quotes_count} 条")
     print(f"   输出文件：{output_path}")
@@ -364,6 +666,95 @@ def analyze_transcript(transcript_path: str, output_path: str = None, metadata:
     return episode_data
 
 
+class StreamingAnalysis:
+    """
+    边转录边分析：转录文本按段落陆续 feed 进来。累计超过 CHUNK_THRESHOLD 字后才确定
+    走分段分析，此后每攒够 CHUNK_CHARS 字就提交一段（最多 CHUNK_WORKERS 段并发），
+    finish() 时分析剩下的文本并合并。切段方式与 split_transcript 对整篇切分相同。
+
+    整期不超过 CHUNK_THRESHOLD 字时 finish() 退回整段分析。两种情况都和 analyze_transcript
+    对同一转录的分析方式一致，结果和响应缓存键也一致。
+
+    用法：
+        analysis = StreamingAnalysis(metadata, on_part=lambda index, part: ...)
+        transcribe_audio(..., on_text=analysis.feed)
+        episode_data = analysis.finish(episode_json_path)
+
+    Args:
+        on_part: on_part(index, part) 每段分析完成时调用（工作线程里），part 的 id 已加前缀
+    """
+
+    def __init__(self, metadata: dict = None, on_part=None, use_cache: bool = True):
+        api_key = os.getenv("DASHSCOPE_API_KEY")
+        if not api_key:
+            raise RuntimeError("❌ DASHSCOPE_API_KEY 环境变量未设置（通义千问 API Key）")
+        self.client = OpenAI(api_key=api_key, base_url=QWEN_BASE_URL)
+        self.metadata = metadata
+        self.meta_hint = _meta_hint(metadata)
+        self.on_part = on_part
+        self.use_cache = use_cache
+        self._text = []
+        self._chars = 0
+        self._buffer = ""
+        self._futures = []
+        self._lock = threading.Lock()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=CHUNK_WORKERS)
+
+    @property
+    def submitted(self) -> int:
+        return len(self._futures)
+
+    def feed(self, text: str):
+        """追加一批完整段落（[MM:SS - MM:SS] 说话人N 开头）"""
+        with self._lock:
+            self._text.append(text)
+            self._chars += len(text)
+            self._buffer += text
+            # 没超过 CHUNK_THRESHOLD 前还可能整段分析，先不提交
+            if not self._futures and self._chars <= CHUNK_THRESHOLD:
+                return
+            if len(self._buffer) < CHUNK_CHARS:
+                return
+            chunks = split_transcript(self._buffer)
+            self._buffer = chunks.pop() if len(chunks) > 1 else ""
+            for chunk in chunks:
+                self._submit(chunk)
+
+    def _submit(self, chunk: str):
+        index = len(self._futures)
+        print(f"   提交第 {index + 1} 段分析（{len(chunk):,} 字）")
+        self._futures.append(self._pool.submit(self._run, index, chunk))
+
+    def _run(self, index: int, chunk: str) -> dict:
+        part = _analyze_part(self.client, index, chunk, self.meta_hint, self.use_cache)
+        if self.on_part:
+            self.on_part(index, part)
+        return part
+
+    def finish(self, output_path: str) -> dict:
+        """转录结束后调用：分析剩余文本，等各段完成，合并并写出 episode.json"""
+        try:
+            with self._lock:
+                if self._futures and self._buffer.strip():
+                    self._submit(self._buffer)
+                self._buffer = ""
+            if self._futures:
+                parts = [f.result() for f in self._futures]
+                episode_data = _merge_parts(self.client, parts, self.meta_hint, self.use_cache)
+            else:
+                user_message = _user_message(self.meta_hint, "".join(self._text))
+                episode_data = _analyze_single(self.client, user_message, self.use_cache)
+        except Exception as e:
+            raise RuntimeError(f"通义千问 API 调用失败：{e}")
+        finally:
+            self._pool.shutdown(wait=False)
+        return _finalize(episode_data, self.metadata, output_path)
+
+    def cancel(self):
+        """流水线没走到 finish() 就结束时调用：丢弃还没开始的分析，关闭线程池（可重复调用）"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
 def _parse_json_output(raw: str) -> dict:
     """解析 Claude 的 JSON 输出，兼容带代码块的情况"""
     # 去除 ```json ... ``` 包裹
@@ -386,13 +777,15 @@ def _parse_json_output(raw: str) -> dict:
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("用法：python3 analyzer.py <转录文本路径> [输出JSON路径]")
+    use_cache = "--no-cache" not in sys.argv
+    args = [a for a in sys.argv[1:] if a != "--no-cache"]
+    if not args:
+        print("用法：python3 analyzer.py <转录文本路径> [输出JSON路径] [--no-cache]")
         print("示例：python3 analyzer.py ./output/abc123/transcript.txt")
         sys.exit(1)
 
-    transcript_path = sys.argv[1]
-    output_path = sys.argv[2] if len(sys.argv) > 2 else None
+    transcript_path = args[0]
+    output_path = args[1] if len(args) > 1 else None
 
     # 自动加载同目录下的 metadata.json（如果存在）
     metadata = None
@@ -402,5 +795,5 @@ if __name__ == "__main__":
             metadata = json.load(f)
         print(f"📋 已加载元数据：{meta_path}")
 
-    result = analyze_transcript(transcript_path, output_path, metadata=metadata)
+    result = analyze_transcript(transcript_path, output_path, metadata=metadata, use_cache=use_cache)
     print(f"\n分析结果摘要：{result.get('meta', {}).get('title', '无标题')}")
@@ -2,22 +2,26 @@
 API 路由 — 小程序端（JSON）
 """
 
-import json
-
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app
 
 from core import (
-    OUTPUT_DIR, tasks,
-    MAX_CONCURRENT_TASKS, check_rate_limit,
-    is_valid_episode_id, get_history, create_task, check_cache,
+    OUTPUT_DIR, task_payload, resolve_task,
+    is_queue_full, queue_position, check_rate_limit,
+    is_valid_episode_id, get_history, count_history, create_task, join_task, check_cache,
 )
+from precompressed import send_cached_bytes
 
 api = Blueprint("api", __name__, url_prefix="/api")
 
 
 @api.route("/history")
 def history():
-    return jsonify({"episodes": get_history()})
+    """历史列表；可选 ?offset=&limit= 分页，不传返回全部"""
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), 100)
+    return jsonify({"episodes": get_history(offset, limit), "total": count_history()})
 
 
 @api.route("/process", methods=["POST"])
@@ -26,10 +30,6 @@ def process():
     if not check_rate_limit(client_ip):
         return jsonify({"error": "请求过于频繁，请稍后再试"}), 429
 
-    active = sum(1 for t in tasks.values() if t["status"] == "started")
-    if active >= MAX_CONCURRENT_TASKS:
-        return jsonify({"error": "当前处理任务较多，请稍后再试"}), 503
-
     data = request.get_json(silent=True) or {}
     url = data.get("url", "").strip()
     if len(url) > 200 or not url.startswith("https://www.xiaoyuzhoufm.com/episode/"):
@@ -39,23 +39,25 @@ def process():
     if cached:
         return jsonify({"episode_id": cached, "cached": True})
 
+    # 同一集正在生成：加入已有任务，不占排队名额
+    task_id = join_task(url)
+    if task_id:
+        return jsonify({"task_id": task_id, "queue_position": queue_position(task_id), "joined": True})
+
+    if is_queue_full():
+        return jsonify({"error": "当前排队任务较多，请稍后再试"}), 503
+
     task_id = create_task(url)
-    return jsonify({"task_id": task_id})
+    return jsonify({"task_id": task_id, "queue_position": queue_position(task_id)})
 
 
 @api.route("/status/<task_id>")
 def status(task_id):
-    """轮询任务进度"""
-    task = tasks.get(task_id)
-    if not task:
+    """轮询任务进度（任务已转到同一集的另一个任务时，返回那个任务的进度）"""
+    payload = task_payload(resolve_task(task_id))
+    if payload is None:
         return jsonify({"done": True, "error": "Task not found"})
-    return jsonify({
-        "steps": task["steps"],
-        "episode_id": task["episode_id"],
-        "error": task["error"],
-        "metadata": task["metadata"],
-        "done": task["status"] in ("done", "error"),
-    })
+    return Response(payload, mimetype="application/json")
 
 
 @api.route("/episode/<episode_id>")
@@ -66,7 +68,10 @@ def episode(episode_id):
     json_path = (OUTPUT_DIR / episode_id / "episode.json").resolve()
     if not str(json_path).startswith(str(OUTPUT_DIR.resolve())) or not json_path.exists():
         return jsonify({"error": "未找到"}), 404
-    data = json.loads(json_path.read_text(encoding="utf-8"))
-    from generator import prepare_episode_data
-    data = prepare_episode_data(data)
-    return jsonify(data)
+    from generator import load_episode
+    st = json_path.stat()
+    return send_cached_bytes(
+        (str(json_path), st.st_mtime_ns, st.st_size),
+        lambda: current_app.json.dumps(load_episode(json_path)).encode("utf-8"),
+        "application/json",
+    )
@@ -6,13 +6,15 @@
 """
 
 import sys
+import time
 from pathlib import Path
-from flask import Flask
+from flask import Flask, Response, abort, g, request
 
 sys.path.insert(0, str(Path(__file__).parent.resolve()))
 
-from core import OUTPUT_DIR
-from web import web
+from core import OUTPUT_DIR, start_workers, metrics, http_duration, http_requests
+from metrics import CONTENT_TYPE
+from web import web, ADMIN_KEY
 from api import api
 
 app = Flask(__name__)
@@ -22,6 +24,40 @@ app.register_blueprint(web)   # Web 路由：/、/process、/progress、/stream
 app.register_blueprint(api)   # API 路由：/api/history、/api/process、/api/status、/api/episode
 
 
+# 任务队列 worker（含上次中断任务的续跑）：第一个请求到来时才启动，import app（测试、
+# gunicorn --preload 的 master 进程）不起线程；start_workers 只生效一次，之后的请求直接返回
+@app.before_request
+def ensure_workers():
+    start_workers()
+
+
+# 请求耗时 / 状态码，endpoint 作标签（未匹配路由记为 other，防止扫描路径撑爆标签）
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    if "request_started" in g and request.endpoint != "metrics":
+        endpoint = request.endpoint or "other"
+        http_duration.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+        http_requests.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+
+@app.route("/metrics", endpoint="metrics")
+def metrics_endpoint():
+    """
+    Prometheus 抓取端点
+
+    本机直连（不经 nginx，没有 X-Real-IP）直接放行；经 nginx 访问需带 ?key=管理员口令。
+    """
+    if "X-Real-IP" in request.headers and request.args.get("key") != ADMIN_KEY:
+        abort(404)
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+
 # 安全响应头
 @app.after_request
 def add_security_headers(response):
@@ -0,0 +1,220 @@
+"""
+批量预计算流水线 — 元数据 → 转录 → 分析 → 渲染 分阶段并发
+
+原来 batch_process 一集跑完四步再跑下一集，大部分时间在等 Deepgram 和通义千问。
+现在每个阶段一个有界队列 + 固定数量的工作线程，不同 episode 在不同阶段重叠执行：
+  - 每个阶段并发数单独限制（转录受 Deepgram 并发限制，渲染是本地 CPU）
+  - 队列有上限，上游快了会阻塞等待，不会一次把 100 个播客的 episode 全部拉进内存
+  - 计费阶段抛出 QuotaExhausted 时熔断：计费阶段及之前不再接新活，已进入后续阶段的
+    episode 继续跑完（排空），未处理的记为 deferred，下次运行接着跑
+  - 进度写入 Ledger（batch_progress.json），每个 episode 记录状态和最后完成的阶段
+"""
+
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+
+# 状态：pending → 正在某阶段（running）→ done / skipped / failed / deferred
+FINAL_STATUSES = ("done", "skipped")
+
+
+class QuotaExhausted(Exception):
+    """计费服务额度用完，触发熔断"""
+
+
+class SkipEpisode(Exception):
+    """episode 不需要处理（无音频/付费内容等），不算失败"""
+
+
+# ── 进度账本 ──────────────────────────────────────────
+
+class Ledger:
+    """
+    batch_progress.json — 每个 episode 一条记录，每次状态变化都落盘（tmp + rename）
+
+    {"version": 2, "total_cost_usd": 0.0,
+     "episodes": {episode_id: {"url", "podcast", "status", "stage", "attempts",
+                               "error", "cost_usd", "title", "updated_at"}}}
+    旧格式（processed / skipped / failed 三个列表）首次加载时自动转换。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return {"version": 2, "total_cost_usd": 0, "episodes": {}}
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        if data.get("version") == 2:
+            return data
+        episodes = {}
+        for eid in data.get("processed", []):
+            episodes[eid] = {"status": "done", "stage": "render"}
+        for eid in data.get("skipped", []):
+            episodes[eid] = {"status": "skipped"}
+        for f in data.get("failed", []):
+            if f["id"] not in episodes:
+                episodes[f["id"]] = {"status": "failed", "error": f.get("error", "")}
+        return {"version": 2, "total_cost_usd": data.get("total_cost_usd", 0), "episodes": episodes}
+
+    def _save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def get(self, episode_id):
+        with self._lock:
+            entry = self.data["episodes"].get(episode_id)
+            return dict(entry) if entry else None
+
+    def is_finished(self, episode_id):
+        entry = self.get(episode_id)
+        return bool(entry) and entry.get("status") in FINAL_STATUSES
+
+    def update(self, episode_id, **fields):
+        with self._lock:
+            entry = self.data["episodes"].setdefault(episode_id, {"attempts": 0})
+            entry.update(fields)
+            entry["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            cost = fields.get("cost_usd")
+            if cost and fields.get("status") == "done":
+                self.data["total_cost_usd"] = round(self.data.get("total_cost_usd", 0) + cost, 3)
+            self._save()
+
+    def start_attempt(self, episode_id, **fields):
+        with self._lock:
+            entry = self.data["episodes"].setdefault(episode_id, {"attempts": 0})
+            attempts = entry.get("attempts", 0) + 1
+        self.update(episode_id, status="pending", error="", attempts=attempts, **fields)
+
+    def counts(self):
+        with self._lock:
+            result = {}
+            for entry in self.data["episodes"].values():
+                status = entry.get("status", "pending")
+                result[status] = result.get(status, 0) + 1
+            return result
+
+    @property
+    def total_cost(self):
+        with self._lock:
+            return self.data.get("total_cost_usd", 0)
+
+
+# ── 流水线 ──────────────────────────────────────────
+
+class Stage:
+    """
+    Args:
+        name: 阶段名，记入 Ledger 的 stage 字段
+        func: func(item) → item，交给下一阶段；抛 SkipEpisode / QuotaExhausted / 其他异常
+        workers: 并发线程数
+        metered: 是否消耗计费额度；熔断后这个阶段及之前的阶段不再处理新 episode
+    """
+
+    def __init__(self, name, func, workers=1, metered=False):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.metered = metered
+
+
+class BatchEngine:
+    """
+    用法：
+        engine = BatchEngine(stages, ledger)
+        engine.start()
+        for item in items:            # item 是 dict，至少有 episode_id
+            if not engine.submit(item):
+                break                 # 已熔断
+        engine.join()
+
+    最后一个阶段返回的 item 里如有 cost_usd / title，一并记入 Ledger。
+    """
+
+    def __init__(self, stages, ledger, queue_size=8, log=print):
+        self.stages = stages
+        self.ledger = ledger
+        self.log = log
+        self.tripped = threading.Event()
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._threads = []
+        self._gated = 0     # 熔断后索引 < _gated 的阶段不再处理（计费阶段及之前）
+        for i, stage in enumerate(stages):
+            if stage.metered:
+                self._gated = i + 1
+
+    def start(self):
+        for i, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                t = threading.Thread(target=self._worker, args=(i,), daemon=True,
+                                     name=f"batch-{stage.name}-{n}")
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, item):
+        """放入第一阶段队列（队列满时阻塞）；已熔断返回 False"""
+        if self.tripped.is_set():
+            return False
+        self.ledger.start_attempt(item["episode_id"], url=item.get("url", ""),
+                                  podcast=item.get("podcast", ""))
+        self.queues[0].put(item)
+        return True
+
+    def join(self):
+        """等所有已提交的 episode 走完（或被熔断挂起），然后停止工作线程"""
+        for i, stage in enumerate(self.stages):
+            self.queues[i].join()
+            for _ in range(stage.workers):
+                self.queues[i].put(None)
+        for t in self._threads:
+            t.join()
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        q = self.queues[index]
+        while True:
+            item = q.get()
+            if item is None:
+                q.task_done()
+                return
+            try:
+                self._run(index, stage, item)
+            finally:
+                q.task_done()
+
+    def _run(self, index, stage, item):
+        eid = item["episode_id"]
+        if self.tripped.is_set() and index < self._gated:
+            self.ledger.update(eid, status="deferred", error="quota")
+            return
+        self.ledger.update(eid, status="running", running=stage.name)
+        t0 = time.time()
+        try:
+            item = stage.func(item)
+        except SkipEpisode as e:
+            self.ledger.update(eid, status="skipped", error=str(e), running="")
+            self.log(f"  ⚠️  [{eid[:8]}] 跳过: {e}")
+            return
+        except QuotaExhausted as e:
+            if not self.tripped.is_set():
+                self.tripped.set()
+                self.log(f"\n🚫 额度已用完（{e}），停止接收新 episode，已转录的继续跑完")
+            self.ledger.update(eid, status="deferred", error=f"quota: {e}"[:200], running="")
+            return
+        except Exception as e:
+            self.ledger.update(eid, status="failed", error=str(e)[:200], running="")
+            self.log(f"  ❌ [{eid[:8]}] {stage.name} 失败: {e}")
+            return
+
+        self.log(f"  ✔ [{eid[:8]}] {stage.name} {time.time() - t0:.1f}s")
+        if index + 1 < len(self.stages):
+            self.ledger.update(eid, status="pending", stage=stage.name, running="")
+            self.queues[index + 1].put(item)
+        else:
+            self.ledger.update(eid, status="done", stage=stage.name, running="",
+                               title=item.get("title", ""), cost_usd=item.get("cost_usd", 0))
@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 """
-批量预计算脚本 — 从 top_podcasts.json 读取播客列表，逐个处理最新 episode。
-用完 Deepgram 额度前尽量多跑。
+批量预计算脚本 — 从 top_podcasts.json 读取播客列表，处理每个播客的最新 episode。
+元数据 / 转录 / 分析 / 渲染四个阶段流水线并发（见 batch_engine.py），
+Deepgram 额度用完时熔断：已转录的跑完，其余记入 batch_progress.json 下次续跑。
 
 用法：
   python3 batch_process.py                    # 每个播客跑最新 3 集
   python3 batch_process.py --per-podcast 5    # 每个播客跑最新 5 集
   python3 batch_process.py --start 10         # 从第 10 名开始跑
   python3 batch_process.py --dry-run          # 只列出要跑的 episode，不实际处理
+  python3 batch_process.py --transcribe-workers 6 --analyze-workers 4
 """
 
 import json
@@ -24,10 +26,14 @@ sys.path.insert(0, str(Path(__file__).parent))
 import httpx
 from bs4 import BeautifulSoup
 
+from batch_engine import BatchEngine, Ledger, QuotaExhausted, SkipEpisode, Stage
+
 BASE_DIR = Path(__file__).parent.resolve()
 OUTPUT_DIR = BASE_DIR / "output"
 TOP_PODCASTS = BASE_DIR / "top_podcasts.json"
 PROGRESS_FILE = BASE_DIR / "batch_progress.json"
+FETCH_INTERVAL = 2      # 每个抓取线程两次请求之间的间隔（秒）
+PODCAST_INTERVAL = 3
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
@@ -89,86 +95,110 @@ def fetch_episode_list(podcast_url, limit=5):
     return episodes[:limit]
 
 
-def process_episode(episode_url):
-    """调用现有流水线处理单个 episode"""
-    from fetcher import fetch_metadata
-    from transcribe import transcribe_audio
-    from analyzer import analyze_transcript
-    from generator import render
+# ── 流水线各阶段 ──────────────────────────────────────────
 
-    # Step 1: 元数据
-    metadata = fetch_metadata(episode_url)
-    episode_id = metadata["episode_id"]
+def is_quota_error(error):
+    error = str(error).lower()
+    return "402" in error or "insufficient" in error or "quota" in error
 
+
+def stage_fetch(item):
+    """Step 1: 元数据"""
+    from fetcher import fetch_metadata
+
+    metadata = fetch_metadata(item["url"])
+    time.sleep(FETCH_INTERVAL)     # 请求间隔，避免被风控
     if not metadata.get("audio_url"):
-        print(f"  ⚠️  跳过（无音频/付费内容）: {metadata.get('title', '')[:40]}")
-        return {"status": "skipped", "reason": "no_audio", "episode_id": episode_id}
+        raise SkipEpisode(f"无音频/付费内容: {metadata.get('title', '')[:40]}")
 
-    output_dir = OUTPUT_DIR / episode_id
+    output_dir = OUTPUT_DIR / metadata["episode_id"]
     output_dir.mkdir(parents=True, exist_ok=True)
-
     (output_dir / "metadata.json").write_text(
         json.dumps(metadata, ensure_ascii=False, indent=2), encoding="utf-8"
     )
+    return dict(item, metadata=metadata, output_dir=output_dir, title=metadata.get("title", ""))
+
 
-    # Step 2: 转录
-    txt_path = output_dir / "transcript.txt"
+def stage_transcribe(item):
+    """Step 2: Deepgram 转录（已有转录文件时跳过，不耗额度）"""
+    from transcribe import transcribe_audio
+
+    txt_path = item["output_dir"] / "transcript.txt"
     if txt_path.exists() and txt_path.stat().st_size > 100:
-        print(f"  ⏭️  转录文件已存在，跳过")
-    else:
-        print(f"  🎙️  Deepgram 转录中...")
-        tr_result = transcribe_audio(
-            url=metadata["audio_url"],
-            language="zh",
-            output_prefix="transcript",
-            output_dir=str(output_dir),
-        )
-        if not tr_result["success"]:
-            error = tr_result["error"]
-            # 检测额度用完
-            if "402" in str(error) or "insufficient" in str(error).lower() or "quota" in str(error).lower():
-                print(f"\n🚫 Deepgram 额度已用完！")
-                return {"status": "quota_exhausted", "episode_id": episode_id}
-            raise RuntimeError(f"转录失败: {error}")
-
-    # Step 3: AI 分析
-    episode_json_path = output_dir / "episode.json"
-    if episode_json_path.exists() and episode_json_path.stat().st_size > 100:
-        print(f"  ⏭️  分析文件已存在，跳过")
-    else:
-        print(f"  🤖 AI 分析中...")
-        analyze_transcript(str(txt_path), str(episode_json_path), metadata)
-
-    # Step 4: 生成 HTML
-    viz_path = output_dir / "visualization.html"
-    print(f"  🎨 生成可视化...")
-    render(str(episode_json_path), str(viz_path))
-
-    duration = metadata.get("duration_sec", 0)
+        return item
+    tr_result = transcribe_audio(
+        url=item["metadata"]["audio_url"],
+        language="zh",
+        output_prefix="transcript",
+        output_dir=str(item["output_dir"]),
+    )
+    if not tr_result["success"]:
+        if is_quota_error(tr_result["error"]):
+            raise QuotaExhausted(str(tr_result["error"])[:100])
+        raise RuntimeError(f"转录失败: {tr_result['error']}")
+    return item
+
+
+def stage_analyze(item):
+    """Step 3: AI 分析"""
+    from analyzer import analyze_transcript
+
+    episode_json_path = item["output_dir"] / "episode.json"
+    if not (episode_json_path.exists() and episode_json_path.stat().st_size > 100):
+        analyze_transcript(str(item["output_dir"] / "transcript.txt"), str(episode_json_path),
+                           item["metadata"])
+    return item
+
+
+def stage_render(item):
+    """Step 4: 生成 HTML"""
+    from generator import render
+
+    render(str(item["output_dir"] / "episode.json"), str(item["output_dir"] / "visualization.html"))
+    duration = item["metadata"].get("duration_sec", 0)
     cost = round(duration / 60 * 0.0056, 3) if duration else 0
-    print(f"  ✅ 完成! 时长 {duration//60}分{duration%60}秒, 预估 Deepgram 成本 ${cost}")
+    return dict(item, duration_sec=duration, cost_usd=cost)
+
+
+def build_stages(fetch_workers=2, transcribe_workers=4, analyze_workers=3, render_workers=1):
+    return [
+        Stage("fetch", stage_fetch, fetch_workers),
+        Stage("transcribe", stage_transcribe, transcribe_workers, metered=True),
+        Stage("analyze", stage_analyze, analyze_workers),
+        Stage("render", stage_render, render_workers),
+    ]
 
+
+def process_episode(episode_url):
+    """单集顺序跑完四个阶段（不经过流水线）"""
+    eid = re.search(r"/episode/([a-f0-9]{20,30})", episode_url)
+    item = {"episode_id": eid.group(1) if eid else "", "url": episode_url}
+    try:
+        for stage in build_stages():
+            item = stage.func(item)
+    except SkipEpisode as e:
+        return {"status": "skipped", "reason": str(e), "episode_id": item["episode_id"]}
+    except QuotaExhausted:
+        return {"status": "quota_exhausted", "episode_id": item["episode_id"]}
     return {
         "status": "done",
-        "episode_id": episode_id,
-        "title": metadata.get("title", ""),
-        "duration_sec": duration,
-        "cost_usd": cost,
+        "episode_id": item["metadata"]["episode_id"],
+        "title": item["title"],
+        "duration_sec": item["duration_sec"],
+        "cost_usd": item["cost_usd"],
     }
 
 
-def load_progress():
-    """加载进度文件"""
-    if PROGRESS_FILE.exists():
-        return json.loads(PROGRESS_FILE.read_text(encoding="utf-8"))
-    return {"processed": [], "skipped": [], "failed": [], "total_cost_usd": 0}
-
-
-def save_progress(progress):
-    """保存进度"""
-    PROGRESS_FILE.write_text(
-        json.dumps(progress, ensure_ascii=False, indent=2), encoding="utf-8"
-    )
+def iter_episodes(podcasts, per_podcast):
+    """逐个播客抓 episode 列表（播客间隔 3 秒），产出待处理的 episode"""
+    for podcast in podcasts:
+        print(f"\n🎧 [{podcast['rank']}] {podcast['name']} ({podcast.get('subscribers', '')})")
+        episodes = fetch_episode_list(podcast["podcast_url"], limit=per_podcast)
+        if not episodes:
+            print(f"  ⚠️  未找到 episode，跳过")
+        for ep in episodes:
+            yield {"episode_id": ep["id"], "url": ep["url"], "podcast": podcast["name"]}
+        time.sleep(PODCAST_INTERVAL)
 
 
 def main():
@@ -177,6 +207,8 @@ def main():
     parser.add_argument("--start", type=int, default=1, help="从第几名播客开始 (默认 1)")
     parser.add_argument("--end", type=int, default=None, help="到第几名播客结束")
     parser.add_argument("--dry-run", action="store_true", help="只列出要跑的 episode，不实际处理")
+    parser.add_argument("--transcribe-workers", type=int, default=4, help="并发转录数 (默认 4)")
+    parser.add_argument("--analyze-workers", type=int, default=3, help="并发分析数 (默认 3)")
     args = parser.parse_args()
 
     # 加载播客列表
@@ -187,89 +219,48 @@ def main():
 
     print(f"{'='*60}")
     print(f"  批量预计算 — {len(podcasts)} 个播客, 每个最新 {args.per_podcast} 集")
+    print(f"  并发: 转录 {args.transcribe_workers} / 分析 {args.analyze_workers}")
     print(f"{'='*60}\n")
 
-    progress = load_progress()
-    processed_ids = set(progress["processed"])
-    total_cost = progress["total_cost_usd"]
-    total_done = 0
-    total_skipped = 0
+    ledger = Ledger(PROGRESS_FILE)
+    engine = BatchEngine(build_stages(transcribe_workers=args.transcribe_workers,
+                                      analyze_workers=args.analyze_workers), ledger)
+    if not args.dry_run:
+        engine.start()
 
-    for podcast in podcasts:
-        name = podcast["name"]
-        rank = podcast["rank"]
-        url = podcast["podcast_url"]
+    t0 = time.time()
+    submitted = 0
+    total_skipped = 0
+    for item in iter_episodes(podcasts, args.per_podcast):
+        eid = item["episode_id"]
 
-        print(f"\n{'─'*60}")
-        print(f"🎧 [{rank}] {name} ({podcast.get('subscribers', '')})")
-        print(f"   {url}")
+        # 跳过已处理的（失败 / 被熔断挂起的会重跑）
+        if ledger.is_finished(eid) or is_already_processed(eid):
+            print(f"  ⏭️  已处理: {eid[:12]}...")
+            total_skipped += 1
+            continue
 
-        # 获取 episode 列表
-        episodes = fetch_episode_list(url, limit=args.per_podcast)
-        if not episodes:
-            print(f"  ⚠️  未找到 episode，跳过")
+        if args.dry_run:
+            print(f"  📝 待处理: {item['url']}")
             continue
 
-        for ep in episodes:
-            eid = ep["id"]
-
-            # 跳过已处理的
-            if eid in processed_ids or is_already_processed(eid):
-                print(f"  ⏭️  已处理: {eid[:12]}...")
-                total_skipped += 1
-                continue
-
-            if args.dry_run:
-                print(f"  📝 待处理: {ep['url']}")
-                continue
-
-            # 处理
-            print(f"\n  ▶ 处理: {ep['url']}")
-            try:
-                result = process_episode(ep["url"])
-
-                if result["status"] == "quota_exhausted":
-                    print(f"\n{'='*60}")
-                    print(f"  Deepgram 额度已用完!")
-                    print(f"  本次共处理: {total_done} 集")
-                    print(f"  累计预估成本: ${total_cost:.3f}")
-                    print(f"{'='*60}")
-                    save_progress(progress)
-                    sys.exit(0)
-
-                if result["status"] == "done":
-                    total_done += 1
-                    cost = result.get("cost_usd", 0)
-                    total_cost += cost
-                    progress["processed"].append(eid)
-                    progress["total_cost_usd"] = round(total_cost, 3)
-                    processed_ids.add(eid)
-                elif result["status"] == "skipped":
-                    progress["skipped"].append(eid)
-                    total_skipped += 1
-
-            except Exception as e:
-                print(f"  ❌ 失败: {e}")
-                progress["failed"].append({"id": eid, "error": str(e)[:200]})
-
-            # 每集处理完保存进度
-            save_progress(progress)
-
-            # 请求间隔，避免被风控
-            time.sleep(2)
-
-        # 播客间隔
-        time.sleep(3)
+        if not engine.submit(item):
+            break
+        submitted += 1
+
+    if not args.dry_run:
+        engine.join()
 
     # 最终汇总
+    counts = ledger.counts()
+    total_cost = ledger.total_cost
     print(f"\n{'='*60}")
-    print(f"  批量处理完成!")
-    print(f"  处理成功: {total_done} 集")
-    print(f"  跳过: {total_skipped} 集")
-    print(f"  失败: {len(progress['failed'])} 集")
+    print(f"  批量处理{'中止（额度用完）' if engine.tripped.is_set() else '完成'}! 耗时 {time.time() - t0:.0f}s")
+    print(f"  本次提交: {submitted} 集, 已处理跳过: {total_skipped} 集")
+    print(f"  账本: 完成 {counts.get('done', 0)} / 跳过 {counts.get('skipped', 0)} / "
+          f"失败 {counts.get('failed', 0)} / 待续 {counts.get('deferred', 0)}")
     print(f"  累计 Deepgram 预估成本: ${total_cost:.3f} (¥{total_cost*7.1:.1f})")
     print(f"{'='*60}")
-    save_progress(progress)
 
 
 if __name__ == "__main__":
@@ -4,37 +4,118 @@ Web 路由和 API 路由共用此模块。
 """
 
 import json
+import os
 import re
 import time
 import uuid
 import threading
-from collections import defaultdict
 from pathlib import Path
 
+from episode_index import EpisodeIndex
+from jobs import JobQueue, PRIORITY_NORMAL
+from metrics import Registry
+from rate_limit import TokenBucketLimiter
+from task_registry import FINISHED_STATUSES, TaskRegistry
+from user_store import UserStore
+
 BASE_DIR = Path(__file__).parent.resolve()
 OUTPUT_DIR = BASE_DIR / "output"
 
 # ── 全局任务状态 ──────────────────────────────
-tasks = {}
+FINISHED_TASKS_MAX = 1000    # 内存里保留的已结束任务数（进度页 / status 查询用）
+
+
+def _drop_channel(task_id):
+    with _channels_lock:
+        _channels.pop(task_id, None)
+
+
+tasks = TaskRegistry(max_finished=FINISHED_TASKS_MAX, on_evict=_drop_channel)
 
-MAX_CONCURRENT_TASKS = 3
+MAX_CONCURRENT_TASKS = 3     # worker 线程数
+MAX_QUEUED_TASKS = 50        # 排队上限，超过才拒绝
+JOBS_DB_PATH = OUTPUT_DIR / ".jobs.db"
+STEP_NAMES = ["获取元数据", "音频转录", "AI 内容分析", "生成可视化"]
+STREAMING_PIPELINE = os.getenv("STREAMING_PIPELINE", "1") == "1"    # 后端支持时边转录边分析
 RATE_LIMIT_WINDOW = 60
-RATE_LIMIT_MAX = 5
-_rate_limit = defaultdict(list)
+RATE_LIMIT_MAX = 5           # 每个 IP 连续最多 5 次，之后每 12 秒恢复 1 次
+_rate_limit = TokenBucketLimiter(rate=RATE_LIMIT_MAX / RATE_LIMIT_WINDOW, burst=RATE_LIMIT_MAX)
 
 
 def check_rate_limit(ip):
     """IP 级别速率限制，返回 True=放行 False=拒绝"""
-    now = time.time()
-    _rate_limit[ip] = [t for t in _rate_limit[ip] if now - t < RATE_LIMIT_WINDOW]
-    if len(_rate_limit[ip]) >= RATE_LIMIT_MAX:
+    if not _rate_limit.allow(ip):
+        submissions.inc(outcome="rate_limited")
         from logger import log_event
         log_event("rate_limited", ip=ip)
         return False
-    _rate_limit[ip].append(now)
     return True
 
 
+# ── 监控指标（/metrics） ──────────────────────
+STEP_KEYS = ["metadata", "transcribe", "analyze", "render"]     # 与 STEP_NAMES 一一对应
+STEP_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 180, 300, 450, 600, 900, 1200, 1800, 2700, 3600)
+STEP_QUANTILES = (0.5, 0.95, 0.99)
+
+metrics = Registry()
+step_duration = metrics.histogram(
+    "podcast_step_duration_seconds", "流水线各步骤耗时（已有文件跳过的不计）", ["step"], STEP_BUCKETS)
+steps_skipped = metrics.counter(
+    "podcast_steps_skipped_total", "已有文件跳过 / 重启续跑的步骤数", ["step"])
+task_duration = metrics.histogram(
+    "podcast_task_duration_seconds", "任务开始执行到生成完成的总耗时", buckets=STEP_BUCKETS)
+queue_wait = metrics.histogram(
+    "podcast_queue_wait_seconds", "任务从提交到开始执行的排队时间",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+tasks_finished = metrics.counter(
+    "podcast_tasks_finished_total", "结束的任务数", ["status"])
+submissions = metrics.counter(
+    "podcast_submissions_total", "提交请求按结果分类：created / joined / cached / queue_full / rate_limited",
+    ["outcome"])
+sse_connections = metrics.gauge(
+    "podcast_sse_connections", "当前打开的进度推送（SSE）连接数")
+http_duration = metrics.histogram(
+    "podcast_http_request_duration_seconds", "HTTP 请求处理耗时（SSE 只算到开始推送）", ["endpoint"])
+http_requests = metrics.counter(
+    "podcast_http_requests_total", "HTTP 请求数", ["endpoint", "status"])
+
+
+def _llm_cache():
+    """分析模块按需加载，没加载过说明还没调用过 LLM"""
+    import sys
+    analyzer = sys.modules.get("analyzer")
+    return analyzer.llm_cache if analyzer else None
+
+
+def _llm_cache_hit_ratio():
+    cache = _llm_cache()
+    total = cache.hits + cache.misses if cache else 0
+    return cache.hits / total if total else 0
+
+
+def step_latency_quantiles():
+    """{(step, quantile): 秒}，各步骤 p50 / p95 / p99（由直方图分桶估算）"""
+    values = {}
+    for step in STEP_KEYS:
+        for q in STEP_QUANTILES:
+            v = step_duration.quantile(q, step=step)
+            if v is not None:
+                values[(step, str(q))] = round(v, 3)
+    return values
+
+
+metrics.gauge("podcast_queue_depth", "排队中的任务数", func=lambda: job_queue.queued_count())
+metrics.gauge("podcast_tasks_running", "执行中的任务数",
+              func=lambda: sum(1 for _, t in tasks.active_items() if t["status"] != "queued"))
+metrics.counter("podcast_llm_cache_hits_total", "LLM 结果缓存命中次数",
+                func=lambda: _llm_cache().hits if _llm_cache() else 0)
+metrics.counter("podcast_llm_cache_misses_total", "LLM 结果缓存未命中次数",
+                func=lambda: _llm_cache().misses if _llm_cache() else 0)
+metrics.gauge("podcast_llm_cache_hit_ratio", "LLM 结果缓存命中率（进程启动以来）", func=_llm_cache_hit_ratio)
+metrics.gauge("podcast_step_duration_quantile_seconds", "各步骤耗时分位数估算（p50 / p95 / p99）",
+              ["step", "quantile"], func=step_latency_quantiles)
+
+
 def sanitize_error(msg):
     """脱敏错误信息，隐藏内部路径"""
     msg = str(msg)
@@ -47,62 +128,32 @@ def is_valid_episode_id(episode_id):
     return bool(re.fullmatch(r"[a-f0-9]{20,30}", episode_id))
 
 
-USER_INDEX_PATH = OUTPUT_DIR / ".user_index.json"
-
-
-def _load_user_index():
-    if USER_INDEX_PATH.exists():
-        try:
-            return json.loads(USER_INDEX_PATH.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
-    return {}
-
-
-def _save_user_index(index):
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    USER_INDEX_PATH.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+USER_INDEX_PATH = OUTPUT_DIR / ".user_index.json"     # 旧格式，首次启动导入 users.db
+user_store = UserStore(OUTPUT_DIR / ".users.db", legacy_json=USER_INDEX_PATH)
 
 
 def record_user_episode(uid, episode_id):
     """记录用户生成的 episode"""
     if not uid:
         return
-    index = _load_user_index()
-    index.setdefault(uid, [])
-    if episode_id not in index[uid]:
-        index[uid].append(episode_id)
-    _save_user_index(index)
-
-
-def get_history():
-    """扫描 output 目录，返回全部历史 episode 列表"""
-    history = []
-    if OUTPUT_DIR.exists():
-        for d in sorted(OUTPUT_DIR.iterdir(), key=lambda x: x.stat().st_mtime, reverse=True):
-            if d.is_dir():
-                viz = d / "visualization.html"
-                meta = d / "metadata.json"
-                if viz.exists() and meta.exists():
-                    try:
-                        m = json.loads(meta.read_text(encoding="utf-8"))
-                        history.append({
-                            "episode_id": d.name,
-                            "title": m.get("title", "未知标题"),
-                            "podcast_name": m.get("podcast_name", ""),
-                            "cover_url": m.get("cover_url", ""),
-                            "created_at": int(d.stat().st_mtime),
-                        })
-                    except Exception:
-                        pass
-    return history
+    user_store.add(uid, episode_id)
+
+
+episode_index = EpisodeIndex(OUTPUT_DIR)
+
+
+def get_history(offset=0, limit=None):
+    """历史 episode 列表（按时间倒序），limit=None 返回 offset 之后全部"""
+    return episode_index.page(offset, limit)
+
+
+def count_history():
+    return episode_index.count()
 
 
 def get_user_history(uid):
     """返回指定用户生成的 episode 列表"""
-    index = _load_user_index()
-    user_episodes = set(index.get(uid, []))
-    return [h for h in get_history() if h["episode_id"] in user_episodes]
+    return episode_index.lookup(user_store.episodes(uid))
 
 
 # ── 精选样例 ──────────────────────────────────
@@ -118,48 +169,270 @@ SHOWCASE_TAGS = {
 
 def get_showcase():
     """返回带标签的精选样例列表"""
-    showcase = []
-    for item in get_history():
-        eid = item["episode_id"]
-        if eid in SHOWCASE_TAGS:
-            item["tags"] = SHOWCASE_TAGS[eid]
-            showcase.append(item)
+    showcase = episode_index.lookup(SHOWCASE_TAGS)
+    for item in showcase:
+        item["tags"] = SHOWCASE_TAGS[item["episode_id"]]
     return showcase
 
 
-def create_task(url, uid=""):
-    """创建新任务并启动后台流水线，返回 task_id"""
-    task_id = str(uuid.uuid4())[:8]
+# ── 进度通知 ──────────────────────────────────
+
+class TaskChannel:
+    """
+    单个任务的状态变更通知：版本号 + 条件变量
+
+    流水线每次改动任务状态就 publish() 一次，SSE 连接阻塞在 wait() 上，
+    没有变化时不占 CPU。同一版本的 payload 只序列化一次，所有观看者共用。
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.version = 0
+        self._cached = (-1, None)
+
+    def publish(self):
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def wait(self, seen, timeout):
+        """等到版本号不同于 seen 或超时，返回当前版本号"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+    def payload(self, build):
+        with self.cond:
+            version, cached = self._cached
+            current = self.version
+        if version == current:
+            return cached
+        data = build()
+        with self.cond:
+            self._cached = (current, data)
+        return data
+
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def task_channel(task_id):
+    """任务的通知通道；任务不存在返回 None"""
+    if task_id not in tasks:
+        return None
+    with _channels_lock:
+        if task_id not in _channels:
+            _channels[task_id] = TaskChannel()
+        return _channels[task_id]
+
+
+def _publish(task_id):
+    channel = task_channel(task_id)
+    if channel:
+        channel.publish()
+
+
+def task_payload(task_id):
+    """
+    任务进度的 JSON 字符串（SSE 和 /api/status 共用），按版本缓存。
+    不含 elapsed 等随时间变化的字段，由调用方按需追加。
+    """
+    def build():
+        task = tasks[task_id]
+        return json.dumps({
+            "status": task["status"],
+            "steps": task["steps"],
+            "episode_id": task["episode_id"],
+            "error": task["error"],
+            "metadata": task["metadata"],
+            "queue_position": queue_position(task_id),
+            "partial_sections": task["partial_sections"],
+            "forwarded_to": task.get("forwarded_to"),
+            "done": task["status"] in ("done", "error"),
+        }, ensure_ascii=False)
+
+    channel = task_channel(task_id)
+    return channel.payload(build) if channel else None
+
+
+# ── 任务队列 ──────────────────────────────────
+
+def _new_task(url, uid):
     now = time.time()
-    tasks[task_id] = {
-        "status": "started",
+    return {
+        "status": "queued",
         "url": url,
         "uid": uid,
-        "steps": [
-            {"name": "获取元数据", "status": "pending", "detail": ""},
-            {"name": "音频转录", "status": "pending", "detail": ""},
-            {"name": "AI 内容分析", "status": "pending", "detail": ""},
-            {"name": "生成可视化", "status": "pending", "detail": ""},
-        ],
+        "uids": [uid] if uid else [],     # 提交者 + 后来加入同一任务的用户
+        "steps": [{"name": name, "status": "pending", "detail": ""} for name in STEP_NAMES],
         "episode_id": None,
         "error": None,
         "metadata": None,
+        "partial_sections": [],     # 流式分析时已完成的章节，分析完成前先给前端看
+        "forwarded_to": None,       # 拿到元数据才发现与进行中的任务是同一集时，转到那个任务
+        "queued_at": now,
         "started_at": now,
         "step_started_at": now,
     }
 
-    thread = threading.Thread(target=_run_pipeline, args=(task_id, url), daemon=True)
-    thread.start()
 
+def _run_job(job):
+    """worker 线程入口：执行（或续跑）一个队列任务"""
+    task_id = job["task_id"]
+    if task_id not in tasks:
+        tasks[task_id] = _new_task(job["url"], job["uid"])
+    _run_pipeline(task_id, job["url"], resume_step=job["step"], episode_id=job["episode_id"])
+    if tasks[task_id]["status"] == "error":
+        raise RuntimeError(tasks[task_id]["error"])
+
+
+job_queue = JobQueue(JOBS_DB_PATH, handler=_run_job,
+                     workers=MAX_CONCURRENT_TASKS, max_queued=MAX_QUEUED_TASKS)
+_workers_lock = threading.Lock()
+_workers_started = False
+
+
+def start_workers():
+    """启动 worker 池；首次启动时把上次进程退出前没跑完的任务放回队列续跑"""
+    global _workers_started
+    if _workers_started:        # 每个请求都会调用，启动后不再抢锁
+        return
+    with _workers_lock:
+        if _workers_started:
+            return
+        _workers_started = True
+        for job in job_queue.recover():
+            if job["task_id"] not in tasks:
+                tasks[job["task_id"]] = _new_task(job["url"], job["uid"])
+            _claim_episode(job["episode_id"] or episode_id_from_url(job["url"]), job["task_id"])
+        job_queue.start()
+
+
+def is_queue_full():
+    if job_queue.is_full():
+        submissions.inc(outcome="queue_full")
+        return True
+    return False
+
+
+def queue_position(task_id):
+    """排队位置，1 = 下一个执行；已开始或不存在返回 0"""
+    task = tasks.get(task_id)
+    if task and task["status"] != "queued":
+        return 0
+    return job_queue.position(task_id)
+
+
+# 进行中的 episode → task_id：同一集正在生成时，后来的请求加入已有任务，
+# 共用进度流和结果，不重复转录 / 分析
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def episode_id_from_url(url):
+    episode_id = url.split("/episode/")[-1].split("?")[0].strip("/")
+    return episode_id if is_valid_episode_id(episode_id) else None
+
+
+def _claim_episode(episode_id, task_id):
+    """登记进行中的 episode；已被其他进行中的任务登记时返回那个 task_id"""
+    if not episode_id:
+        return task_id
+    with _inflight_lock:
+        current = _inflight.get(episode_id)
+        if current and current != task_id and current in tasks \
+                and tasks[current]["status"] not in FINISHED_STATUSES:
+            return current
+        _inflight[episode_id] = task_id
+        return task_id
+
+
+def _release_episode(task_id):
+    task = tasks.get(task_id)
+    if not task:
+        return
+    with _inflight_lock:
+        for episode_id in (task["episode_id"], episode_id_from_url(task["url"])):
+            if episode_id and _inflight.get(episode_id) == task_id:
+                del _inflight[episode_id]
+
+
+def resolve_task(task_id):
+    """沿 forwarded_to 找到实际执行的任务；进度页 / 状态查询按它返回"""
+    for _ in range(10):
+        task = tasks.get(task_id)
+        if not task or not task.get("forwarded_to") or task["forwarded_to"] not in tasks:
+            break
+        task_id = task["forwarded_to"]
+    return task_id
+
+
+def _forward_task(task_id, owner_id):
+    """本任务和 owner 是同一集：用户并到 owner 上，本任务结束，观看者转去看 owner 的进度"""
+    from logger import log_event
+
+    task = tasks[task_id]
+    with _inflight_lock:
+        owner = tasks.get(owner_id)
+        if owner:
+            for uid in task["uids"]:
+                if uid not in owner["uids"]:
+                    owner["uids"].append(uid)
+    task["forwarded_to"] = owner_id
+    task["status"] = "forwarded"
+    _publish(task_id)
+    submissions.inc(outcome="joined")
+    log_event("task_joined", task_id=owner_id, episode_id=task["episode_id"],
+              uid=task["uid"], forwarded_from=task_id)
+
+
+def join_task(url, uid=""):
+    """同一 episode 正在生成时加入该任务，返回 task_id；没有返回 None"""
+    episode_id = episode_id_from_url(url)
+    if not episode_id:
+        return None
+    with _inflight_lock:
+        task_id = _inflight.get(episode_id)
+        task = tasks.get(task_id) if task_id else None
+        if not task or task["status"] in ("error", "forwarded"):
+            return None
+        # 刚生成完、还没移出登记：流水线已经记过 uids，这个用户直接记上
+        finished = task["episode_id"] if task["status"] == "done" else None
+        if not finished and uid and uid not in task["uids"]:
+            task["uids"].append(uid)
+    if finished:
+        record_user_episode(uid, finished)
+    submissions.inc(outcome="joined")
+    from logger import log_event
+    log_event("task_joined", task_id=task_id, episode_id=episode_id, uid=uid)
+    return task_id
+
+
+def create_task(url, uid="", priority=PRIORITY_NORMAL):
+    """创建新任务并放入队列，返回 task_id；同一 episode 已在生成时返回已有任务"""
+    joined = join_task(url, uid)
+    if joined:
+        return joined
+    task_id = str(uuid.uuid4())[:8]
+    tasks[task_id] = _new_task(url, uid)
+    current = _claim_episode(episode_id_from_url(url), task_id)
+    if current != task_id:      # 并发提交同一集，另一个请求抢先登记
+        del tasks[task_id]
+        return join_task(url, uid) or current
+    job_queue.enqueue(task_id, url, uid, priority)
+    submissions.inc(outcome="created")
+    start_workers()
     return task_id
 
 
 def check_cache(url):
     """检查 URL 对应的 episode 是否已生成，返回 episode_id 或 None"""
-    episode_id = url.split("/episode/")[-1].split("?")[0].strip("/")
-    if is_valid_episode_id(episode_id):
+    episode_id = episode_id_from_url(url)
+    if episode_id:
         viz_path = OUTPUT_DIR / episode_id / "visualization.html"
         if viz_path.exists():
+            submissions.inc(outcome="cached")
             return episode_id
     return None
 
@@ -167,34 +440,84 @@ def check_cache(url):
 # ── 流水线 ────────────────────────────────────
 
 def _update_step(task_id, step_index, status, detail=""):
-    tasks[task_id]["steps"][step_index]["status"] = status
-    tasks[task_id]["steps"][step_index]["detail"] = detail
-    if status == "running":
+    step = tasks[task_id]["steps"][step_index]
+    if status == "running" and step["status"] != "running":    # 同一步内更新进度不重新计时
         tasks[task_id]["step_started_at"] = time.time()
+    step["status"] = status
+    step["detail"] = detail
+    _publish(task_id)
 
 
-def _run_pipeline(task_id, url):
-    """后台执行 4 步流水线"""
+_partial_lock = threading.Lock()
+
+
+def _add_partial_sections(task_id, part):
+    """流式分析每完成一段：章节标题先推给进度页"""
+    task = tasks[task_id]
+    with _partial_lock:
+        sections = task["partial_sections"] + [
+            {"title": s.get("title", ""), "start_sec": s.get("start_sec", 0)}
+            for s in part.get("sections") or [] if isinstance(s, dict) and not s.get("is_ad")]
+        task["partial_sections"] = sorted(sections, key=lambda s: s["start_sec"] or 0)
+        task["steps"][2]["detail"] = f"边转录边分析 · 已整理 {len(task['partial_sections'])} 个章节"
+    _publish(task_id)
+
+
+def _run_pipeline(task_id, url, resume_step=-1, episode_id=None):
+    """
+    后台执行 4 步流水线
+
+    resume_step >= 0 表示进程重启后续跑：元数据直接读上次保存的 metadata.json，
+    转录/分析照常按已有文件跳过。
+    """
     from logger import log_event
-    step_names = ["获取元数据", "音频转录", "AI 内容分析", "生成可视化"]
 
-    def _log_step_done(step_idx):
+    now = time.time()
+    tasks[task_id]["status"] = "started"
+    tasks[task_id]["started_at"] = now
+    _publish(task_id)
+    for other_id, other in tasks.active_items():
+        if other["status"] == "queued":
+            _publish(other_id)     # 排队位置前移
+    wait_sec = now - tasks[task_id].get("queued_at", now)
+    queue_wait.observe(wait_sec)
+    log_event("task_started", task_id=task_id, resume_step=resume_step, wait_sec=round(wait_sec, 1))
+
+    def _log_step_done(step_idx, skipped=False):
         elapsed = time.time() - tasks[task_id].get("step_started_at", time.time())
+        if skipped:
+            steps_skipped.inc(step=STEP_KEYS[step_idx])
+        else:
+            step_duration.observe(elapsed, step=STEP_KEYS[step_idx])
         log_event("step_done", task_id=task_id, step=step_idx,
-                  step_name=step_names[step_idx], duration_sec=round(elapsed, 1))
+                  step_name=STEP_NAMES[step_idx], duration_sec=round(elapsed, 1), skipped=skipped)
+        job_queue.mark_step(task_id, step_idx, tasks[task_id]["episode_id"])
 
+    analysis = None
     try:
         # Step 1: 获取元数据
-        _update_step(task_id, 0, "running", "正在访问小宇宙...")
-        from fetcher import fetch_metadata
-        metadata = fetch_metadata(url)
+        saved_meta = OUTPUT_DIR / episode_id / "metadata.json" if episode_id else None
+        if resume_step >= 0 and saved_meta and saved_meta.exists():
+            metadata = json.loads(saved_meta.read_text(encoding="utf-8"))
+            resumed = True
+        else:
+            _update_step(task_id, 0, "running", "正在访问小宇宙...")
+            from fetcher import fetch_metadata
+            metadata = fetch_metadata(url)
+            resumed = False
         episode_id = metadata["episode_id"]
         tasks[task_id]["episode_id"] = episode_id
+        # URL 里解析不出 id 时，按元数据登记；这一集已在别的任务里生成时转过去，本任务不再继续
+        owner = _claim_episode(episode_id, task_id)
+        if owner != task_id:
+            _forward_task(task_id, owner)
+            return
         tasks[task_id]["metadata"] = {
             "title": metadata.get("title", ""),
             "podcast_name": metadata.get("podcast_name", ""),
             "duration_sec": metadata.get("duration_sec", 0),
         }
+        _publish(task_id)
 
         if not metadata.get("audio_url"):
             raise RuntimeError("无法获取音频直链，可能为付费内容")
@@ -202,25 +525,39 @@ def _run_pipeline(task_id, url):
         output_dir = OUTPUT_DIR / episode_id
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        (output_dir / "metadata.json").write_text(
-            json.dumps(metadata, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
-        _update_step(task_id, 0, "done", metadata.get("title", "")[:40])
-        _log_step_done(0)
+        if resumed:
+            _update_step(task_id, 0, "done", "服务重启，从中断处继续")
+        else:
+            (output_dir / "metadata.json").write_text(
+                json.dumps(metadata, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
+            _update_step(task_id, 0, "done", metadata.get("title", "")[:40])
+        _log_step_done(0, skipped=resumed)
 
-        # Step 2: 转录
+        # Step 2: 转录（流式后端：转录出的段落边出边交给分析）
         txt_path = output_dir / "transcript.txt"
+        episode_json_path = output_dir / "episode.json"
         if txt_path.exists() and txt_path.stat().st_size > 100:
             _update_step(task_id, 1, "done", "已有转录文件，跳过")
-            _log_step_done(1)
+            _log_step_done(1, skipped=True)
         else:
-            _update_step(task_id, 1, "running", "Deepgram 转录中，请耐心等待...")
-            from transcribe import transcribe_audio
+            from transcribe import get_backend, transcribe_audio
+            backend = get_backend()
+            if (STREAMING_PIPELINE and backend.streaming
+                    and not (episode_json_path.exists() and episode_json_path.stat().st_size > 100)):
+                from analyzer import StreamingAnalysis
+                analysis = StreamingAnalysis(
+                    metadata, on_part=lambda index, part: _add_partial_sections(task_id, part))
+            _update_step(task_id, 1, "running", f"{backend.label} 转录中，请耐心等待...")
             tr_result = transcribe_audio(
                 url=metadata["audio_url"],
                 language="zh",
                 output_prefix="transcript",
                 output_dir=str(output_dir),
+                backend=backend,
+                progress=lambda done, total: _update_step(
+                    task_id, 1, "running", f"{backend.label} 转录中 · 第 {done}/{total} 段"),
+                on_text=analysis.feed if analysis else None,
             )
             if not tr_result["success"]:
                 raise RuntimeError(f"转录失败：{tr_result['error']}")
@@ -228,10 +565,14 @@ def _run_pipeline(task_id, url):
             _log_step_done(1)
 
         # Step 3: AI 分析
-        episode_json_path = output_dir / "episode.json"
-        if episode_json_path.exists() and episode_json_path.stat().st_size > 100:
-            _update_step(task_id, 2, "done", "已有分析文件，跳过")
+        if analysis:
+            _update_step(task_id, 2, "running", "等待剩余分段分析并合并...")
+            analysis.finish(str(episode_json_path))
+            _update_step(task_id, 2, "done", "分析完成")
             _log_step_done(2)
+        elif episode_json_path.exists() and episode_json_path.stat().st_size > 100:
+            _update_step(task_id, 2, "done", "已有分析文件，跳过")
+            _log_step_done(2, skipped=True)
         else:
             _update_step(task_id, 2, "running", "AI 正在分析内容...")
             from analyzer import analyze_transcript
@@ -246,10 +587,18 @@ def _run_pipeline(task_id, url):
         _update_step(task_id, 3, "done", "生成完成")
         _log_step_done(3)
 
-        tasks[task_id]["status"] = "done"
-        record_user_episode(tasks[task_id].get("uid", ""), episode_id)
+        # 和 join_task 共用锁：置为 done 之前加入的用户在 uids 里，之后加入的由 join_task 自己记
+        with _inflight_lock:
+            tasks[task_id]["status"] = "done"
+            uids = list(tasks[task_id]["uids"])
+        _publish(task_id)
+        episode_index.update(episode_id)
+        for uid in uids:
+            record_user_episode(uid, episode_id)
 
         total_sec = round(time.time() - tasks[task_id]["started_at"], 1)
+        task_duration.observe(total_sec)
+        tasks_finished.inc(status="done")
         log_event("task_done", task_id=task_id, episode_id=episode_id,
                   total_sec=total_sec, title=metadata.get("title", ""))
 
@@ -263,5 +612,12 @@ def _run_pipeline(task_id, url):
                 step["status"] = "error"
                 step["detail"] = safe_msg[:100]
                 failed_step = i
+        _publish(task_id)
+        tasks_finished.inc(status="error")
         log_event("task_error", task_id=task_id, step=failed_step,
                   error_msg=safe_msg)
+    finally:
+        if analysis:
+            analysis.cancel()       # 转录/分析中途失败时关掉分段分析线程池；finish() 之后再调无副作用
+        _release_episode(task_id)
+        tasks.finish(task_id)       # 移出进行中的任务表
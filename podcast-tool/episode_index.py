@@ -0,0 +1,159 @@
+"""
+已生成 episode 的内存索引 — 首页、/api/history、精选、个人记录共用
+
+原来每次请求都 iterdir() 整个 output/ 并逐个解析 metadata.json。这里维护一份
+按时间倒序的索引，持久化到 output/.history_index.json，重启后直接加载：
+  - 流水线完成时 update(episode_id) 增量加入
+  - 每次读取前 refresh() 检查 output/ 目录 mtime：有子目录增删（如 batch_process
+    在另一个进程里生成）才重新列目录，且只解析新出现的目录
+  - 目录已建但还没生成完（缺 visualization.html）的记为 pending，记下目录 mtime；
+    refresh 时只 stat 一次，目录里有新文件写入才重新检查，完成后补进索引
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+
+class EpisodeIndex:
+    def __init__(self, output_dir, path=None):
+        self.output_dir = Path(output_dir)
+        self.path = Path(path) if path else self.output_dir / ".history_index.json"
+        self._lock = threading.Lock()
+        self._items = {}         # episode_id → 条目
+        self._pending = {}       # 目录存在但还没生成完：episode_id → 上次检查时的目录 mtime
+        self._dir_mtime = None
+        self._ordered = None     # 按 created_at 倒序的缓存
+        self._loaded = False
+
+    # ── 加载 / 持久化 ──────────────────────────────
+
+    def _load(self):
+        self._loaded = True
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+            self._items = {item["episode_id"]: item for item in state["items"]}
+            self._pending = dict(state.get("pending", {}))
+            self._dir_mtime = state.get("dir_mtime")
+        except (OSError, ValueError, KeyError, TypeError):
+            self._items, self._pending, self._dir_mtime = {}, {}, None
+
+    def _save(self):
+        state = {"dir_mtime": self._dir_mtime, "pending": self._pending,
+                 "items": list(self._items.values())}
+        # 原地覆盖而不是临时文件 + rename：rename 会改 output/ 的 mtime，触发下一次
+        # refresh 重新列目录。写到一半崩溃只会让下次启动解析失败、重新扫描
+        try:
+            self.path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        except OSError:
+            pass
+
+    def _read_entry(self, d):
+        """单个目录 → 索引条目；还没生成完返回 None"""
+        viz = d / "visualization.html"
+        meta = d / "metadata.json"
+        if not (viz.exists() and meta.exists()):
+            return None
+        try:
+            m = json.loads(meta.read_text(encoding="utf-8"))
+            return {
+                "episode_id": d.name,
+                "title": m.get("title", "未知标题"),
+                "podcast_name": m.get("podcast_name", ""),
+                "cover_url": m.get("cover_url", ""),
+                "created_at": int(d.stat().st_mtime),
+            }
+        except Exception:
+            return None
+
+    # ── 增量更新 ──────────────────────────────────
+
+    def update(self, episode_id):
+        """流水线完成（或重新生成）后调用"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self._read_entry(self.output_dir / episode_id)
+            if entry:
+                self._items[episode_id] = entry
+                self._pending.pop(episode_id, None)
+            else:
+                self._items.pop(episode_id, None)
+                self._pending[episode_id] = None
+            self._ordered = None
+            self._save()
+
+    def refresh(self):
+        """output/ 有子目录增删时同步，pending 目录逐个检查是否已生成完"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            changed = False
+            try:
+                dir_mtime = self.output_dir.stat().st_mtime
+            except OSError:
+                dir_mtime = None
+
+            if dir_mtime != self._dir_mtime:
+                names = set()
+                if dir_mtime is not None:
+                    with os.scandir(self.output_dir) as it:     # d_type 判断目录，不逐个 stat
+                        names = {e.name for e in it if e.is_dir() and not e.name.startswith(".")}
+                for name in set(self._items) - names:
+                    del self._items[name]
+                for name in set(self._pending) - names:
+                    del self._pending[name]
+                for name in names - set(self._items) - set(self._pending):
+                    self._pending[name] = None
+                self._dir_mtime = dir_mtime
+                changed = True
+
+            for name, seen_mtime in list(self._pending.items()):
+                d = self.output_dir / name
+                try:
+                    mtime = d.stat().st_mtime
+                except OSError:
+                    continue
+                if mtime == seen_mtime:
+                    continue
+                entry = self._read_entry(d)
+                if entry:
+                    self._items[name] = entry
+                    del self._pending[name]
+                else:
+                    self._pending[name] = mtime
+                changed = True
+
+            if changed:
+                self._ordered = None
+                self._save()
+
+    # ── 查询 ──────────────────────────────────────
+
+    def _sorted(self):
+        if self._ordered is None:
+            self._ordered = sorted(self._items.values(),
+                                   key=lambda x: x["created_at"], reverse=True)
+        return self._ordered
+
+    def count(self):
+        self.refresh()
+        with self._lock:
+            return len(self._items)
+
+    def page(self, offset=0, limit=None):
+        """按时间倒序分页，条目为副本，调用方可以随意修改"""
+        self.refresh()
+        with self._lock:
+            items = self._sorted()
+            end = None if limit is None else offset + limit
+            return [dict(x) for x in items[offset:end]]
+
+    def lookup(self, episode_ids):
+        """指定 episode 的条目，按时间倒序"""
+        self.refresh()
+        with self._lock:
+            found = [self._items[e] for e in set(episode_ids) if e in self._items]
+        found.sort(key=lambda x: x["created_at"], reverse=True)
+        return [dict(x) for x in found]
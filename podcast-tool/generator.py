@@ -10,8 +10,15 @@ podcast-tool generator.py
 
 import json
 import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+
+from precompressed import write_variants
+
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+EPISODE_CACHE_SIZE = 64     # 预处理后的 episode 数据，按文件 mtime 失效
 
 # ===== 默认 Quiz 题目（如果 episode.json 没有 quiz 字段）=====
 DEFAULT_QUIZ = {
@@ -501,6 +508,50 @@ def prepare_episode_data(data: dict) -> dict:
     return data
 
 
+# ===== 模板环境 & 数据缓存 =====
+_env = None
+_env_lock = threading.Lock()
+_episode_cache = OrderedDict()
+_episode_cache_lock = threading.Lock()
+
+
+def get_environment() -> Environment:
+    """进程内共用一个 Jinja2 环境：模板只编译一次（改模板文件后自动重新加载），
+    编译结果同时写入磁盘字节码缓存，新进程（batch_process / gunicorn 重启）不用重新编译"""
+    global _env
+    with _env_lock:
+        if _env is None:
+            _env = Environment(
+                loader=FileSystemLoader(str(TEMPLATES_DIR)),
+                autoescape=True,  # 自动转义 HTML 特殊字符，防止 XSS
+                bytecode_cache=FileSystemBytecodeCache(),
+            )
+        return _env
+
+
+def load_episode(episode_json_path) -> dict:
+    """读取 episode.json 并预处理，按 (路径, mtime, 大小) 缓存最近 EPISODE_CACHE_SIZE 个。
+    返回的 dict 在缓存里共用，调用方只读不改。"""
+    path = Path(episode_json_path).resolve()
+    st = path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    with _episode_cache_lock:
+        if key in _episode_cache:
+            _episode_cache.move_to_end(key)
+            return _episode_cache[key]
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = prepare_episode_data(json.load(f))
+
+    with _episode_cache_lock:
+        for old in [k for k in _episode_cache if k[0] == key[0]]:
+            del _episode_cache[old]     # 同一文件的旧版本
+        _episode_cache[key] = data
+        while len(_episode_cache) > EPISODE_CACHE_SIZE:
+            _episode_cache.popitem(last=False)
+    return data
+
+
 def render(episode_json_path: str, output_path: str = None) -> str:
     """
     将 episode.json 渲染为可视化 HTML 文件。
@@ -513,29 +564,20 @@ def render(episode_json_path: str, output_path: str = None) -> str:
         输出文件的绝对路径
     """
     episode_path = Path(episode_json_path).resolve()
-
-    with open(episode_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    data = prepare_episode_data(data)
+    data = load_episode(episode_path)
 
     # 确定输出路径
     if output_path is None:
         output_path = episode_path.parent / f"{episode_path.stem}_visualization.html"
     output_path = Path(output_path)
 
-    # 初始化 Jinja2 环境
-    templates_dir = Path(__file__).parent / "templates"
-    env = Environment(
-        loader=FileSystemLoader(str(templates_dir)),
-        autoescape=True,  # 自动转义 HTML 特殊字符，防止 XSS
-    )
-
-    template = env.get_template("base.html.j2")
+    template = get_environment().get_template("base.html.j2")
     html = template.render(**data)
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(html, encoding="utf-8")
+    html_bytes = html.encode("utf-8")
+    output_path.write_bytes(html_bytes)
+    write_variants(output_path, html_bytes)   # .gz / .br，Web 端直接发送
     print(f"✅ 已生成: {output_path}")
     return str(output_path)
 
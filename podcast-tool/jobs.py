@@ -0,0 +1,193 @@
+"""
+持久化任务队列 — SQLite 存任务，固定数量的 worker 线程消费
+
+每个生成任务一行：排队 → 执行中 → 完成/失败。
+  - 优先级通道：priority 大的先执行，同一优先级内按提交顺序（FIFO）
+  - 排队位置：前面还有几个 queued 任务，/api/status 和进度页据此展示
+  - 断点续跑：每完成一步记录 step，进程重启后 started 状态的任务重新入队，
+    流水线从上次完成的步骤之后继续（已有的 metadata/转录/分析文件直接复用）
+  - 保留期：重启恢复时顺带删掉完成超过 RETENTION_DAYS 天的 done/error 行，库不无限增长
+
+线上是单进程（gunicorn -w 1 --threads 4），worker 线程在进程内；领取任务用
+UPDATE ... WHERE status = 'queued' 原子完成，同一个任务不会被两个 worker 执行。
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+PRIORITY_HIGH = 10      # 管理员 / 精选重跑
+PRIORITY_NORMAL = 0     # 用户提交
+PRIORITY_LOW = -10      # 批量预计算
+RETENTION_DAYS = 7      # 已结束任务在库里保留的天数
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    task_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    uid TEXT NOT NULL DEFAULT '',
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    step INTEGER NOT NULL DEFAULT -1,
+    episode_id TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+
+
+class JobQueue:
+    """SQLite 任务队列 + 固定 worker 池；handler(job) 执行单个任务"""
+
+    def __init__(self, path, handler=None, workers=3, max_queued=50):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        with self._db() as db:
+            db.executescript(_SCHEMA)
+        # 排队数常驻内存（单进程，入队 / 领取 / 重启恢复时增减），准入检查不查库
+        self._queued = self._db().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def _db(self):
+        """每个线程一个连接（sqlite3 连接不能跨线程共用）"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    # ── 提交 / 查询 ──────────────────────────────
+
+    def enqueue(self, task_id, url, uid="", priority=PRIORITY_NORMAL):
+        self._db().execute(
+            "INSERT INTO jobs (task_id, url, uid, priority, created_at) VALUES (?, ?, ?, ?, ?)",
+            (task_id, url, uid, priority, time.time()))
+        with self._cond:
+            self._queued += 1
+            self._cond.notify()
+
+    def get(self, task_id):
+        row = self._db().execute("SELECT * FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+        return dict(row) if row else None
+
+    def queued_count(self):
+        with self._cond:
+            return self._queued
+
+    def is_full(self):
+        return self.queued_count() >= self.max_queued
+
+    def position(self, task_id):
+        """排队位置：1 = 下一个执行；不在排队中返回 0"""
+        job = self.get(task_id)
+        if not job or job["status"] != "queued":
+            return 0
+        ahead = self._db().execute(
+            """SELECT COUNT(*) FROM jobs WHERE status = 'queued'
+               AND (priority > ? OR (priority = ? AND created_at < ?))""",
+            (job["priority"], job["priority"], job["created_at"])).fetchone()[0]
+        return ahead + 1
+
+    def unfinished(self):
+        """排队中 + 执行中的任务（按执行顺序）"""
+        rows = self._db().execute(
+            """SELECT * FROM jobs WHERE status IN ('queued', 'started')
+               ORDER BY priority DESC, created_at""").fetchall()
+        return [dict(r) for r in rows]
+
+    # ── 状态更新 ──────────────────────────────
+
+    def mark_step(self, task_id, step, episode_id=None):
+        """记录已完成的步骤，崩溃后从 step + 1 继续"""
+        self._db().execute(
+            "UPDATE jobs SET step = ?, episode_id = COALESCE(?, episode_id) WHERE task_id = ?",
+            (step, episode_id, task_id))
+
+    def finish(self, task_id, error=None):
+        self._db().execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE task_id = ?",
+            ("error" if error else "done", error, time.time(), task_id))
+
+    def claim(self):
+        """领取下一个任务，没有返回 None"""
+        db = self._db()
+        while True:
+            row = db.execute(
+                """SELECT task_id FROM jobs WHERE status = 'queued'
+                   ORDER BY priority DESC, created_at LIMIT 1""").fetchone()
+            if row is None:
+                return None
+            cur = db.execute(
+                "UPDATE jobs SET status = 'started', started_at = ? WHERE task_id = ? AND status = 'queued'",
+                (time.time(), row["task_id"]))
+            if cur.rowcount == 1:
+                with self._cond:
+                    self._queued -= 1
+                return self.get(row["task_id"])
+            # 被其他 worker 抢先领取，重新选
+
+    def prune(self, retention_days=RETENTION_DAYS):
+        """删除完成超过 retention_days 天的 done/error 任务，返回删除行数"""
+        cur = self._db().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'error') AND finished_at < ?",
+            (time.time() - retention_days * 86400,))
+        return cur.rowcount
+
+    def recover(self, retention_days=RETENTION_DAYS):
+        """进程启动时调用：清理过期的已结束任务，上次执行到一半的任务放回队列，返回需要续跑的任务"""
+        self.prune(retention_days)
+        cur = self._db().execute("UPDATE jobs SET status = 'queued' WHERE status = 'started'")
+        with self._cond:
+            self._queued += cur.rowcount
+        return self.unfinished()
+
+    # ── worker 池 ──────────────────────────────
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=5):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self._stopping = False
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+            job = self.claim()
+            if job is None:
+                with self._cond:
+                    # notify 可能恰好错过，定期醒来再查一次
+                    self._cond.wait(timeout=2)
+                continue
+            try:
+                self.handler(job)
+                error = None
+            except Exception as e:
+                error = str(e)[:200] or type(e).__name__
+            self.finish(job["task_id"], error)
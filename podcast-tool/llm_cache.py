@@ -0,0 +1,83 @@
+"""
+通义千问响应缓存 — 按内容寻址，落盘保存
+
+key = sha256(模型, system prompt 哈希, user message 哈希, max_tokens)：
+prompt 或转录有任何改动都会换 key，旧结果自然失效，不需要手动清理版本。
+只缓存解析成功的 JSON；总大小超过上限时按最近使用时间淘汰（命中时刷新 mtime）。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).parent / "output" / ".llm_cache"
+MAX_BYTES = 500 * 1024 * 1024
+
+
+def _sha(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model, system_prompt, user_message, max_tokens):
+        return _sha(json.dumps([model, _sha(system_prompt), _sha(user_message), max_tokens]))
+
+    def _file(self, key):
+        return self.path / key[:2] / f"{key}.json.gz"
+
+    def get(self, key):
+        f = self._file(key)
+        try:
+            with gzip.open(f, "rt", encoding="utf-8") as fp:
+                value = json.load(fp)
+            os.utime(f)     # 刷新最近使用时间
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        f = self._file(key)
+        try:
+            f.parent.mkdir(parents=True, exist_ok=True)
+            tmp = f.with_name(f"{f.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with gzip.open(tmp, "wt", encoding="utf-8") as fp:
+                json.dump(value, fp, ensure_ascii=False)
+            tmp.replace(f)
+        except OSError:
+            return      # 缓存写不进去不影响分析
+        self.evict()
+
+    def evict(self):
+        """总大小超过上限时，从最久未使用的开始删"""
+        with self._lock:
+            entries = []
+            for f in self.path.glob("*/*.json.gz"):
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, f))
+            total = sum(size for _, size, _ in entries)
+            for _, size, f in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    f.unlink()
+                    total -= size
+                except OSError:
+                    pass
@@ -0,0 +1,300 @@
+"""
+本地转录后端 — faster-whisper CPU 分段并行解码
+
+思路（见 PRECOMPUTE_STRATEGY.md 2.x）：
+  1. 下载音频，解码成 16kHz 单声道 float32
+  2. 按静音切段：每段不超过 LOCAL_CHUNK_SEC，切点取窗口后半部分最长一段静音的中点，
+     尽量不把一句话切断
+  3. 各段交给常驻进程池解码，每完成一段回调 progress(done, total)。进程池模块级
+     共用、用 spawn 启动（Flask/任务 worker 是多线程进程，fork 有死锁风险），
+     每个进程启动时加载一次模型，之后所有节目复用；CPU 线程数按进程数均分
+  4. 各段时间戳加上段起点，拼回 Deepgram 格式（paragraphs / sentences / speaker），
+     transcribe.save_txt 和下游不需要区分来源
+  5. 流式：前面的段都解码完时，把已定稿的段落（最后一段可能还会接上后面的句子，
+     先不交出）按时间顺序交给 on_paragraphs，下游可以边转录边分析
+
+faster-whisper 是可选依赖，未安装时只有真正使用本后端才报错。
+没有说话人识别，所有段落记为说话人0。
+"""
+
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+try:
+    from faster_whisper import WhisperModel, decode_audio
+except ImportError:
+    WhisperModel = None
+    decode_audio = None
+
+SAMPLE_RATE = 16000
+LOCAL_CHUNK_SEC = float(os.getenv("LOCAL_CHUNK_SEC", "600"))     # 每段最长 10 分钟
+LOCAL_WORKERS = int(os.getenv("LOCAL_TRANSCRIBE_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "large-v3")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+FRAME_SEC = 0.03                # 静音检测的帧长
+PARAGRAPH_GAP_SEC = 1.5         # 两句之间停顿超过这个值另起一段
+PARAGRAPH_MAX_CHARS = 300
+
+
+# ── 切段 ──────────────────────────────────────────
+
+def split_on_silence(samples, sample_rate=SAMPLE_RATE, max_chunk_sec=LOCAL_CHUNK_SEC):
+    """
+    按静音切段
+
+    Returns:
+        [(start_sample, end_sample), ...]，首尾相接覆盖全部音频
+    """
+    total = len(samples)
+    max_len = int(max_chunk_sec * sample_rate)
+    if total <= max_len:
+        return [(0, total)]
+
+    frame = max(1, int(FRAME_SEC * sample_rate))
+    n_frames = total // frame
+    energy = np.sqrt(np.mean(
+        np.square(samples[:n_frames * frame].reshape(n_frames, frame), dtype=np.float64), axis=1))
+
+    bounds = []
+    start = 0
+    while total - start > max_len:
+        # 在 [start + max_len/2, start + max_len] 内找最安静的一段连续帧，从中间切
+        lo = (start + max_len // 2) // frame
+        hi = min((start + max_len) // frame, n_frames)
+        cut = start + max_len
+        if hi > lo:
+            window = energy[lo:hi]
+            quiet = window <= window.min() + 0.1 * (window.max() - window.min())
+            best, run_start = (0, 0), None
+            for i, q in enumerate(np.append(quiet, False)):
+                if q and run_start is None:
+                    run_start = i
+                elif not q and run_start is not None:
+                    best = max(best, (i - run_start, run_start))
+                    run_start = None
+            cut = (lo + best[1] + best[0] // 2) * frame
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, total))
+    return bounds
+
+
+# ── 解码 ──────────────────────────────────────────
+
+_model = None
+_cpu_threads = max(1, (os.cpu_count() or 1) // LOCAL_WORKERS)
+_pools = {}                     # (进程数, 是否预加载模型) → ProcessPoolExecutor
+_pools_lock = threading.Lock()
+
+
+def _get_model():
+    """每个工作进程加载一次模型"""
+    global _model
+    if _model is None:
+        if WhisperModel is None:
+            raise RuntimeError("本地转录需要 faster-whisper：pip install faster-whisper")
+        _model = WhisperModel(WHISPER_MODEL, device="cpu", compute_type=WHISPER_COMPUTE_TYPE,
+                              cpu_threads=_cpu_threads)
+    return _model
+
+
+def _init_worker(cpu_threads, preload):
+    """工作进程启动时执行一次：按进程数分 CPU 线程，用 Whisper 解码时先把模型加载好"""
+    global _cpu_threads
+    _cpu_threads = cpu_threads
+    if preload:
+        _get_model()
+
+
+def get_pool(workers, preload=True):
+    """取（或创建）常驻解码进程池"""
+    key = (workers, preload)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(max(1, (os.cpu_count() or 1) // workers), preload))
+            _pools[key] = pool
+        return pool
+
+
+def shutdown_pools():
+    """关闭所有解码进程池（释放各进程里的模型）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
+
+
+def whisper_decode(samples, language):
+    """解码一段音频，返回 [{"start", "end", "text", "confidence"}]，时间相对段起点"""
+    segments, _ = _get_model().transcribe(samples, language=language, vad_filter=True)
+    return [{"start": seg.start, "end": seg.end, "text": seg.text.strip(),
+             "confidence": float(np.exp(seg.avg_logprob))}
+            for seg in segments if seg.text.strip()]
+
+
+def _decode_chunk(decoder, samples, language, offset):
+    return [dict(seg, start=seg["start"] + offset, end=seg["end"] + offset)
+            for seg in decoder(samples, language)]
+
+
+# ── 拼接 ──────────────────────────────────────────
+
+def build_paragraphs(segments):
+    """按时间排好的句子合成段落：停顿短且段落不太长时接在上一段后面"""
+    paragraphs = []
+    for seg in segments:
+        sentence = {"text": seg["text"], "start": seg["start"], "end": seg["end"]}
+        last = paragraphs[-1] if paragraphs else None
+        if (last and seg["start"] - last["end"] < PARAGRAPH_GAP_SEC
+                and sum(len(s["text"]) for s in last["sentences"]) < PARAGRAPH_MAX_CHARS):
+            last["sentences"].append(sentence)
+            last["end"] = seg["end"]
+        else:
+            paragraphs.append({"speaker": 0, "start": seg["start"], "end": seg["end"],
+                               "sentences": [sentence]})
+    return paragraphs
+
+
+def stitch(segments, duration, language="zh"):
+    """把按时间排好的句子拼成 Deepgram 格式的结果"""
+    paragraphs = build_paragraphs(segments)
+    confidence = (sum(s["confidence"] for s in segments) / len(segments)) if segments else 0
+    return {
+        "metadata": {"duration": duration, "language": language,
+                     "engine": "faster-whisper", "model": WHISPER_MODEL},
+        "results": {"channels": [{"alternatives": [{
+            "transcript": "".join(s["text"] for s in segments),
+            "confidence": confidence,
+            "paragraphs": {"paragraphs": paragraphs},
+        }]}]},
+    }
+
+
+# ── 后端 ──────────────────────────────────────────
+
+class LocalWhisperBackend:
+    """
+    Args:
+        workers: 解码进程数；1 时在当前进程内顺序解码
+        max_chunk_sec: 每段最长秒数
+        decoder: decoder(samples, language) → 句子列表，须是可导入的模块级函数（要传给 spawn 子进程）
+    """
+
+    name = "local"
+    label = "本地 Whisper"
+    streaming = True
+
+    def __init__(self, workers=LOCAL_WORKERS, max_chunk_sec=LOCAL_CHUNK_SEC, decoder=whisper_decode):
+        self.workers = workers
+        self.max_chunk_sec = max_chunk_sec
+        self.decoder = decoder
+
+    def transcribe(self, url, language="zh", progress=None, on_paragraphs=None):
+        if decode_audio is None:
+            raise RuntimeError("本地转录需要 faster-whisper：pip install faster-whisper")
+        with tempfile.TemporaryDirectory() as tmp:
+            audio_path = download_audio(url, Path(tmp))
+            samples = decode_audio(str(audio_path), sampling_rate=SAMPLE_RATE)
+        return self.transcribe_samples(samples, language, progress, on_paragraphs)
+
+    def transcribe_samples(self, samples, language="zh", progress=None, on_paragraphs=None):
+        bounds = split_on_silence(samples, SAMPLE_RATE, self.max_chunk_sec)
+        total = len(bounds)
+        jobs = [(self.decoder, samples[s:e], language, s / SAMPLE_RATE) for s, e in bounds]
+        results = [None] * total
+        emitted = {"chunks": 0, "paragraphs": 0}
+        if progress:
+            progress(0, total)
+
+        def chunk_done(i, segments, done):
+            results[i] = segments
+            if progress:
+                progress(done, total)
+            if not on_paragraphs:
+                return
+            ready = emitted["chunks"]
+            while ready < total and results[ready] is not None:
+                ready += 1
+            if ready == emitted["chunks"]:
+                return
+            emitted["chunks"] = ready
+            paragraphs = build_paragraphs([seg for chunk in results[:ready] for seg in chunk])
+            keep = 0 if ready == total else 1       # 最后一段可能还要接上下一段的句子
+            new = paragraphs[emitted["paragraphs"]:len(paragraphs) - keep]
+            if new:
+                emitted["paragraphs"] += len(new)
+                on_paragraphs(new)
+
+        if self.workers <= 1 or total == 1:
+            for i, job in enumerate(jobs):
+                chunk_done(i, _decode_chunk(*job), i + 1)
+        else:
+            preload = self.decoder is whisper_decode
+            pool = get_pool(self.workers, preload)
+            try:
+                futures = {pool.submit(_decode_chunk, *job): i for i, job in enumerate(jobs)}
+                for done, future in enumerate(as_completed(futures), 1):
+                    chunk_done(futures[future], future.result(), done)
+            except BrokenProcessPool:
+                # 工作进程崩溃（或模型加载失败）后进程池不可再用，下次调用重建
+                with _pools_lock:
+                    if _pools.get((self.workers, preload)) is pool:
+                        del _pools[(self.workers, preload)]
+                raise
+
+        segments = [seg for chunk in results for seg in chunk]
+        return stitch(segments, len(samples) / SAMPLE_RATE, language)
+
+
+def download_audio(audio_url, output_dir):
+    """下载播客音频到本地"""
+    audio_path = Path(output_dir) / "audio"
+    with httpx.stream("GET", audio_url, follow_redirects=True, timeout=300) as r:
+        r.raise_for_status()
+        with open(audio_path, "wb") as f:
+            for chunk in r.iter_bytes(chunk_size=65536):
+                f.write(chunk)
+    return audio_path
+
+
+def benchmark(audio_path, chunk_counts=(1, 2, 4, 8), workers=LOCAL_WORKERS, language="zh"):
+    """
+    不同分段数下的实时率（RTF = 解码耗时 / 音频时长，越小越快）
+
+    Returns:
+        [{"chunks", "workers", "elapsed_sec", "rtf"}, ...]
+    """
+    if decode_audio is None:
+        raise RuntimeError("本地转录需要 faster-whisper：pip install faster-whisper")
+    samples = decode_audio(str(audio_path), sampling_rate=SAMPLE_RATE)
+    duration = len(samples) / SAMPLE_RATE
+    print(f"音频时长 {duration:.0f}s，{workers} 个解码进程")
+    print(f"{'分段数':>6} {'实际段数':>8} {'耗时(s)':>9} {'RTF':>7}")
+    rows = []
+    for n in chunk_counts:
+        backend = LocalWhisperBackend(workers=min(workers, n), max_chunk_sec=duration / n + 1)
+        actual = []
+        t0 = time.time()
+        backend.transcribe_samples(samples, language, progress=lambda done, total: actual.append(total))
+        elapsed = time.time() - t0
+        shutdown_pools()        # 不同进程数的池不留着，各自的模型很占内存
+        rows.append({"chunks": actual[-1], "workers": backend.workers,
+                     "elapsed_sec": round(elapsed, 1), "rtf": round(elapsed / duration, 3)})
+        print(f"{n:>6} {actual[-1]:>8} {elapsed:>9.1f} {elapsed / duration:>7.3f}")
+    print(json.dumps(rows, ensure_ascii=False))
+    return rows
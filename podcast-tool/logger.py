@@ -1,27 +1,206 @@
 """
-轻量事件日志 — 每天一个 JSONL 文件
-日志存储在 logs/ 目录下，文件名格式 YYYY-MM-DD.jsonl
+轻量事件日志 — 每天一个 JSONL 文件，后台线程批量写入
+日志存储在 logs/ 目录下（环境变量 LOG_DIR 可改，回测指向临时目录），文件名格式 YYYY-MM-DD.jsonl
+
+原来每条事件都在请求线程里 open → write → close 一次。现在：
+  - log_event 只把序列化好的一行放进内存环形缓冲区（deque），立即返回
+  - 后台线程攒够 LOG_FLUSH_LINES 行或每隔 LOG_FLUSH_SEC 秒写一次，文件句柄常开
+  - 缓冲区满时丢最旧的行（日志不能拖住主流程），下次写入时补一条 log_dropped 记录丢了多少
+  - 单个文件超过 LOG_MAX_BYTES 时改名为 YYYY-MM-DD.N.jsonl，另起新文件
+  - LOG_GZIP=1 时，换天后把前一天的文件压缩成 .jsonl.gz
+  - 进程退出（atexit）前写完缓冲区
+读取某一天的全部文件（含分片和压缩）用 day_files()。
 """
 
+import atexit
+import gzip
 import json
+import os
+import re
+import shutil
+import threading
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
-LOG_DIR = Path(__file__).parent / "logs"
-LOG_DIR.mkdir(exist_ok=True)
+LOG_DIR = Path(os.getenv("LOG_DIR") or Path(__file__).parent / "logs")
+
+LOG_BUFFER_LINES = int(os.getenv("LOG_BUFFER_LINES", "10000"))     # 环形缓冲区容量
+LOG_FLUSH_LINES = int(os.getenv("LOG_FLUSH_LINES", "200"))         # 攒够这么多行立即写
+LOG_FLUSH_SEC = float(os.getenv("LOG_FLUSH_SEC", "1"))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+LOG_GZIP = os.getenv("LOG_GZIP", "0") == "1"
+
+_FILE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.jsonl(\.gz)?$")
+
+
+def day_files(date_str, log_dir=LOG_DIR):
+    """某一天的日志文件，按写入顺序：分片 1, 2, ... 在前，当前文件最后"""
+    parts = []
+    for path in Path(log_dir).glob(f"{date_str}*.jsonl*"):
+        m = _FILE_RE.fullmatch(path.name)
+        if m and m.group(1) == date_str:
+            parts.append((int(m.group(2)) if m.group(2) else float("inf"), path))
+    return [path for _, path in sorted(parts)]
+
+
+def open_log(path):
+    """按扩展名打开 .jsonl / .jsonl.gz"""
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+class EventLogger:
+    def __init__(self, log_dir=LOG_DIR, buffer_lines=LOG_BUFFER_LINES, flush_lines=LOG_FLUSH_LINES,
+                 flush_sec=LOG_FLUSH_SEC, max_bytes=LOG_MAX_BYTES, compress=LOG_GZIP, clock=datetime.now,
+                 background=True):
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_lines = flush_lines
+        self.flush_sec = flush_sec
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.clock = clock
+        self.background = background      # False：不起后台线程，只在 flush() 时写
+        self.dropped = 0
+        self.writes = 0               # 实际 write 调用次数（批次数）
+        self._buffer = deque(maxlen=buffer_lines)     # (日期, 一行 JSON)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._file = None
+        self._file_date = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def log(self, event_type, **kwargs):
+        now = self.clock()
+        entry = {"ts": now.isoformat(timespec="seconds"), "event": event_type, **kwargs}
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._cond:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append((now.strftime("%Y-%m-%d"), line))
+            if len(self._buffer) >= self.flush_lines:
+                self._cond.notify()
+        if self._closed:        # 退出流程中（atexit 之后）直接写
+            self.flush()
+        else:
+            self._ensure_writer()
+
+    def _ensure_writer(self):
+        # fork 出的子进程里后台线程不存在，按 pid 判断是否需要重新启动
+        if self._pid == os.getpid() or not self.background:
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._file = None
+            self._thread = threading.Thread(target=self._run, name="event-logger", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.flush_lines and not self._closed:
+                    self._cond.wait(self.flush_sec)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """把缓冲区写到磁盘（后台线程定期调用；测试和退出时也可直接调用）"""
+        with self._write_lock:
+            with self._cond:
+                batch = list(self._buffer)
+                self._buffer.clear()
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                date = batch[0][0] if batch else self.clock().strftime("%Y-%m-%d")
+                batch.insert(0, (date, json.dumps({
+                    "ts": self.clock().isoformat(timespec="seconds"),
+                    "event": "log_dropped", "count": dropped}) + "\n"))
+            try:
+                self._write(batch)
+            except Exception:
+                self._file = None     # 下次重新打开（目录被删、磁盘满恢复后可继续写）
+
+    def _write(self, batch):
+        i = 0
+        while i < len(batch):
+            date = batch[i][0]
+            j = i
+            while j < len(batch) and batch[j][0] == date:
+                j += 1
+            f = self._open(date)
+            f.write("".join(line for _, line in batch[i:j]))
+            f.flush()
+            self.writes += 1
+            if f.tell() >= self.max_bytes:
+                self._rotate()
+            i = j
+
+    def _open(self, date):
+        if self._file is not None and self._file_date == date:
+            return self._file
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.compress:
+            self._compress_before(date)
+        self._file = open(self.log_dir / f"{date}.jsonl", "a", encoding="utf-8")
+        self._file_date = date
+        return self._file
+
+    def _rotate(self):
+        """当前文件改名为下一个分片号，下次写入时重新打开"""
+        self._file.close()
+        self._file = None
+        current = self.log_dir / f"{self._file_date}.jsonl"
+        numbered = [int(m.group(2)) for p in day_files(self._file_date, self.log_dir)
+                    if (m := _FILE_RE.fullmatch(p.name)) and m.group(2)]
+        current.rename(self.log_dir / f"{self._file_date}.{max(numbered, default=0) + 1}.jsonl")
+
+    def _compress_before(self, date):
+        """压缩 date 之前各天未压缩的文件"""
+        for path in self.log_dir.glob("*.jsonl"):
+            m = _FILE_RE.fullmatch(path.name)
+            if not m or m.group(1) >= date:
+                continue
+            gz_path = path.with_name(path.name + ".gz")
+            with open(path, "rb") as src, gzip.open(gz_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            path.unlink()
+
+    def close(self):
+        """写完缓冲区并停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_logger = EventLogger()
+atexit.register(_logger.close)
 
 
 def log_event(event_type, **kwargs):
-    """追加一条事件到当天的 JSONL 文件"""
-    now = datetime.now()
-    entry = {
-        "ts": now.isoformat(timespec="seconds"),
-        "event": event_type,
-        **kwargs,
-    }
-    log_file = LOG_DIR / f"{now.strftime('%Y-%m-%d')}.jsonl"
+    """追加一条事件到当天的 JSONL 文件（异步，先进缓冲区）"""
     try:
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        _logger.log(event_type, **kwargs)
     except Exception:
         pass  # 日志不能影响主流程
+
+
+def flush():
+    _logger.flush()
@@ -0,0 +1,229 @@
+"""
+进程内监控指标 — 计数器 / 仪表 / 固定分桶直方图，按 Prometheus 文本格式导出
+
+日志（logs/*.jsonl）适合事后统计，看不到"现在"排队多深、哪一步慢；
+这里的指标只存在内存里，由 /metrics 接口随时拉取：
+  - Counter：只增不减（任务数、命中数）
+  - Gauge：可增可减（排队数、SSE 连接数），也可以传 func 在导出时现算
+  - Histogram：固定分桶计数，不存原始值，内存恒定；quantile() 在桶内线性插值估算分位数，
+    与 Prometheus 的 histogram_quantile 算法一致
+
+单进程部署（gunicorn -w 1），不需要跨进程聚合。所有指标都带锁，可在任意线程更新。
+"""
+
+import bisect
+import math
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _fmt(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _label_str(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f"{k}=\"{_escape(v)}\"" for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=(), func=None):
+        super().__init__(name, help_text, labels)
+        self.func = func        # 导出时调用，值由别处维护（如 LLM 缓存自己的命中计数）
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        if self.func:
+            return self.func()
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self.func:
+            return [f"{self.name} {_fmt(self.func())}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {_fmt(v)}" for key, v in items]
+
+
+class Gauge(_Metric):
+    """
+    func 返回一个数，或 {标签值元组: 数}（带标签时），导出时现算
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), func=None):
+        super().__init__(name, help_text, labels)
+        self.func = func
+        self._values = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        if self.func:
+            values = self.func()
+            return values.get(self._key(labels), 0) if isinstance(values, dict) else values
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self.func:
+            values = self.func()
+            items = sorted(values.items()) if isinstance(values, dict) else [((), values)]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {_fmt(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}       # 标签值 → [各桶计数（非累计）, sum, count]
+
+    def observe(self, value, **labels):
+        if math.isnan(value):       # 不落任何桶，也别把 sum 变成 NaN
+            return
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def quantile(self, q, **labels):
+        """分位数估算：找到累计数达到 q*count 的桶，在桶上下界之间线性插值；没有数据返回 None"""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if not series or not series[2]:
+                return None
+            counts, total = list(series[0]), series[2]
+        rank = q * total
+        cumulative = 0
+        for i, n in enumerate(counts):
+            if n and cumulative + n >= rank:
+                upper = self.buckets[i]
+                if upper == math.inf:          # 落在最后一个桶，只知道比最大边界大
+                    return self.buckets[-2]
+                lower = self.buckets[i - 1] if i > 0 else 0
+                return lower + (upper - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.buckets[-2]
+
+    def label_values(self):
+        with self._lock:
+            return sorted(self._series)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for upper, c in zip(self.buckets, counts):
+                cumulative += c
+                le = _label_str(self.labelnames, key, [("le", _fmt(upper))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _label_str(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_fmt(total)}")
+            lines.append(f"{self.name}_count{labels} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标重复注册：{metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=(), func=None):
+        return self._add(Counter(name, help_text, labels, func))
+
+    def gauge(self, name, help_text, labels=(), func=None):
+        return self._add(Gauge(name, help_text, labels, func))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,179 @@
+"""
+预压缩 + ETag — /view 页面和 /api/episode 共用
+
+visualization.html 是内联 CSS/JS 的单文件页面，体积大、反复被打开：
+  - 渲染时同时写出 .gz（和 .br，装了 brotli 才有）变体，请求时按 Accept-Encoding 直接发送，
+    不在请求线程里压缩；老页面第一次被访问时先发原文，变体在后台线程补生成
+  - 响应带强 ETag（内容 sha256），浏览器/小程序带 If-None-Match 重复访问时返回 304，
+    不传正文；不同编码的变体用不同 ETag（<hash>-gzip / <hash>-br）
+  - /api/episode 的 JSON 没有对应文件，序列化和压缩结果按 key（文件 mtime）缓存在内存里
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+CACHE_SIZE = 64
+
+_lock = threading.Lock()
+_file_hashes = OrderedDict()    # (路径, mtime_ns, 大小) → sha256 前 16 位
+_bodies = OrderedDict()         # key → {"etag": ..., None: 原文, "gzip": ..., "br": ...}
+_generating = set()             # 正在后台补生成变体的路径
+
+
+def available_encodings():
+    """按优先级排列的可用编码"""
+    return ["br", "gzip"] if brotli else ["gzip"]
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def write_variants(path, data=None):
+    """写出 path 的各编码预压缩文件（path.gz / path.br）"""
+    path = Path(path)
+    if data is None:
+        data = path.read_bytes()
+    for encoding in available_encodings():
+        target = path.with_name(path.name + SUFFIXES[encoding])
+        # 临时文件名每次不同：并发写同一页面时各写各的，最后一次 replace 生效
+        with tempfile.NamedTemporaryFile(dir=target.parent, prefix=target.name + ".",
+                                         suffix=".tmp", delete=False) as fp:
+            tmp = Path(fp.name)
+            fp.write(compress(data, encoding))
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            raise
+
+
+def _generate_in_background(path):
+    """后台补生成变体；同一路径同时只起一个线程"""
+    key = str(path)
+    with _lock:
+        if key in _generating:
+            return
+        _generating.add(key)
+
+    def run():
+        try:
+            write_variants(path)
+        except OSError as e:
+            print(f"[precompressed] 生成压缩变体失败 {path}: {e}")
+        finally:
+            with _lock:
+                _generating.discard(key)
+
+    threading.Thread(target=run, name="precompress", daemon=True).start()
+
+
+def choose_encoding(accept_encoding, available=None):
+    """按 Accept-Encoding 选编码：q=0 视为拒绝，同样可接受时按 available 的顺序（br 优先）"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in available or available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def _remember(cache, key, value):
+    cache[key] = value
+    while len(cache) > CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def _file_hash(path, st):
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    with _lock:
+        if key in _file_hashes:
+            _file_hashes.move_to_end(key)
+            return _file_hashes[key]
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+    with _lock:
+        _remember(_file_hashes, key, digest)
+    return digest
+
+
+def _finish(resp, encoding):
+    if encoding and resp.status_code in (200, 206):
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"     # 每次都带 ETag 校验，内容不变返回 304
+    return resp
+
+
+def send_precompressed(path, mimetype):
+    """发送文件：按 Accept-Encoding 选预压缩变体，带强 ETag，支持 If-None-Match → 304"""
+    path = Path(path)
+    st = path.stat()
+    digest = _file_hash(path, st)
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    serve = path
+    if encoding:
+        serve = path.with_name(path.name + SUFFIXES[encoding])
+        try:
+            fresh = serve.stat().st_mtime_ns >= st.st_mtime_ns
+        except OSError:
+            fresh = False
+        if not fresh:
+            # 预压缩上线前生成的老页面：这次先发原文，后台补上变体，不在请求线程里压缩
+            _generate_in_background(path)
+            encoding, serve = None, path
+    etag = f"{digest}-{encoding}" if encoding else digest
+    resp = send_file(serve, mimetype=mimetype, etag=etag, conditional=True)
+    return _finish(resp, encoding)
+
+
+def send_cached_bytes(key, build, mimetype):
+    """
+    发送内存里生成的内容：key 不变时复用上次的序列化和压缩结果
+
+    Args:
+        key: 内容版本标识，如 (文件路径, mtime_ns, 大小)
+        build: 无参函数，返回原文 bytes
+    """
+    with _lock:
+        entry = _bodies.get(key)
+        if entry is not None:
+            _bodies.move_to_end(key)
+    if entry is None:
+        data = build()
+        entry = {"etag": hashlib.sha256(data).hexdigest()[:16], None: data}
+        with _lock:
+            _remember(_bodies, key, entry)
+
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding not in entry:
+        entry[encoding] = compress(entry[None], encoding)
+    resp = Response(entry[encoding], mimetype=mimetype)
+    resp.set_etag(f"{entry['etag']}-{encoding}" if encoding else entry["etag"])
+    resp = resp.make_conditional(request)
+    return _finish(resp, encoding)
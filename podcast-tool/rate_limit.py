@@ -0,0 +1,50 @@
+"""
+IP 限流 — 令牌桶，O(1) 检查，空闲的桶按 TTL 自动清理
+
+每个 IP 一个桶：容量 burst，每秒补充 rate 个令牌，请求消耗 1 个。
+桶按最近访问时间排在 OrderedDict 里，每次检查顺手从最旧的一端清掉空闲超过 ttl 的桶
+（空闲 ttl 秒后令牌已经补满，删掉和保留等价），只访问过一次的 IP 不会一直占内存；
+max_keys 兜底，短时间内大量不同 IP 时淘汰最久未访问的。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate, burst, ttl=None, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.ttl = ttl if ttl is not None else burst / rate     # 补满所需时间
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()     # key → (令牌数, 上次更新时间)
+        self._lock = threading.Lock()
+
+    def allow(self, key, now=None):
+        """消耗一个令牌，返回 True=放行 False=拒绝"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._prune(now)
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)      # 移到最新一端
+            return allowed
+
+    def _prune(self, now):
+        while self._buckets:
+            key, (_, last) = next(iter(self._buckets.items()))
+            if now - last < self.ttl and len(self._buckets) < self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buckets)
@@ -11,24 +11,22 @@ import json
 import sys
 from collections import Counter, defaultdict
 from datetime import datetime
-from pathlib import Path
 
-LOG_DIR = Path(__file__).parent / "logs"
+from logger import LOG_DIR, day_files, open_log
 
 
-def load_events(date_str):
-    log_file = LOG_DIR / f"{date_str}.jsonl"
-    if not log_file.exists():
-        return []
+def load_events(date_str, log_dir=LOG_DIR):
+    """读取某一天的全部事件（含按大小切分的分片和压缩过的文件）"""
     events = []
-    with open(log_file, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                try:
-                    events.append(json.loads(line))
-                except json.JSONDecodeError:
-                    pass
+    for log_file in day_files(date_str, log_dir):
+        with open_log(log_file) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass
     return events
 
 
@@ -78,7 +76,7 @@ def generate_report(date_str):
     # ── 步骤耗时统计 ──
     step_durations = defaultdict(list)
     for e in events:
-        if e["event"] == "step_done":
+        if e["event"] == "step_done" and not e.get("skipped"):     # 已有文件跳过的不计
             step_durations[e.get("step_name", "")].append(e.get("duration_sec", 0))
 
     # ── 异常 ──
@@ -103,12 +101,14 @@ def generate_report(date_str):
             print(f"  {i}. {title} — 耗时 {fmt_duration(sec)} ✅")
 
     if step_durations:
-        print(f"\n⏱️ 步骤平均耗时")
+        print(f"\n⏱️ 步骤耗时（平均 / p50 / p95 / p99）")
         for name in ["获取元数据", "音频转录", "AI 内容分析", "生成可视化"]:
             durations = step_durations.get(name, [])
             if durations:
                 avg = sum(durations) / len(durations)
-                print(f"  {name}: {fmt_duration(avg)}")
+                print(f"  {name}: {fmt_duration(avg)} / "
+                      + " / ".join(fmt_duration(percentile(durations, q)) for q in (50, 95, 99))
+                      + f"  ({len(durations)} 次)")
 
     print(f"\n⚠️ 异常")
     print(f"  限流触发: {len(rate_limited)} 次")
@@ -118,6 +118,13 @@ def generate_report(date_str):
             print(f"    - [{err.get('ts', '')}] step={err.get('step', '?')} {err.get('error_msg', '')[:80]}")
 
 
+def percentile(values, q):
+    """最近秩法分位数，q 取 0-100"""
+    ordered = sorted(values)
+    rank = max(1, -(-q * len(ordered) // 100))
+    return ordered[int(rank) - 1]
+
+
 def fmt_duration(sec):
     sec = int(sec)
     if sec < 60:
@@ -0,0 +1,87 @@
+"""
+进程内任务表 — 进行中的任务和已结束的任务分开存
+
+原来全局 tasks 是普通 dict，结束的任务永远不删。现在：
+  - 排队中 / 执行中的任务放在 active 里，数量受排队上限约束，遍历它代价固定
+  - 任务结束时调用 finish() 移入 finished LRU，最多保留 max_finished 个，
+    超出时淘汰最久没被查看的（进度页 / status 接口查询会刷新），并回调 on_evict
+    清理关联状态（如 SSE 通知通道）
+对外仍是 dict 接口（tasks[id]、tasks.get、in、del），已有代码不需要改。
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+FINISHED_STATUSES = ("done", "error", "forwarded")
+
+
+class TaskRegistry(MutableMapping):
+    def __init__(self, max_finished=1000, on_evict=None):
+        self.max_finished = max_finished
+        self.on_evict = on_evict
+        self._active = {}
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, task_id):
+        with self._lock:
+            if task_id in self._active:
+                return self._active[task_id]
+            task = self._finished[task_id]
+            self._finished.move_to_end(task_id)
+            return task
+
+    def __setitem__(self, task_id, task):
+        with self._lock:
+            self._finished.pop(task_id, None)
+            self._active.pop(task_id, None)
+            if task.get("status") in FINISHED_STATUSES:
+                self._finished[task_id] = task
+            else:
+                self._active[task_id] = task
+        self._evict()
+
+    def __delitem__(self, task_id):
+        with self._lock:
+            if self._active.pop(task_id, None) is None:
+                del self._finished[task_id]
+
+    def __contains__(self, task_id):
+        with self._lock:
+            return task_id in self._active or task_id in self._finished
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._active) + list(self._finished))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._active) + len(self._finished)
+
+    def finish(self, task_id):
+        """任务结束（done / error / forwarded）：移出 active，进入 finished LRU"""
+        with self._lock:
+            task = self._active.pop(task_id, None)
+            if task is None:
+                return
+            self._finished[task_id] = task
+        self._evict()
+
+    def active_items(self):
+        """进行中的任务快照 [(task_id, task)]"""
+        with self._lock:
+            return list(self._active.items())
+
+    def active_count(self):
+        with self._lock:
+            return len(self._active)
+
+    def _evict(self):
+        evicted = []
+        with self._lock:
+            while len(self._finished) > self.max_finished:
+                evicted.append(self._finished.popitem(last=False)[0])
+        if self.on_evict:
+            for task_id in evicted:
+                self.on_evict(task_id)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+分析器回测 — 不调用通义千问，用假 client 验证长转录分段分析（切分 / 并发 / 合并）
+、响应缓存（命中 / 绕过 / 按大小淘汰）和边转录边分析
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+sys.path.insert(0, ".")
+os.environ["LOG_DIR"] = tempfile.mkdtemp()    # 事件日志写到临时目录，不落进 logs/
+
+import analyzer
+from llm_cache import LLMCache
+
+passed = 0
+failed = 0
+
+
+def test(name, condition, detail=""):
+    global passed, failed
+    if condition:
+        print(f"  ✅ {name}")
+        passed += 1
+    else:
+        print(f"  ❌ {name} — {detail}")
+        failed += 1
+
+
+class FakeQwen:
+    """按 system prompt 返回固定结构；每次调用耗时 delay 秒，记录并发峰值"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, max_tokens, messages):
+        system, user = messages[0]["content"], messages[1]["content"]
+        with self._lock:
+            self.calls.append((system, user, max_tokens))
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        if system == analyzer.SYSTEM_PROMPT_MERGE:
+            outline = json.loads(user.split("## 各段整理结果（大纲）\n\n")[1].split("\n\n请生成")[0])
+            data = {"meta": {"title": "合并后的标题"},
+                    "core_quotes": outline["quote_candidates"][:2],
+                    "content_overview": {"one_sentence_summary": "概括",
+                                         "content_blocks": [{"id": "block-1",
+                                                             "section_ids": [s["id"] for s in outline["sections"]]}]}}
+        else:
+            first = user.split("] 说话人")[0].split("[")[-1].split(" - ")[0]
+            minute = int(first.split(":")[0])
+            data = {
+                "participants": [{"id": "host", "name": "主持人", "role": "host"}],
+                "sections": [{"id": "s1", "title": f"{minute} 分钟", "start_sec": minute * 60}],
+                "detailed_timeline": [{"id": "tl-1", "start_sec": minute * 60, "headline": f"{minute}"}],
+                "quote_candidates": [f"金句{minute}"],
+                "arguments": [{"id": "arg-1", "claim": "观点", "source_section_id": "s1"}],
+                "key_concepts": [{"id": "concept-1", "term": "共同概念", "related_concepts": ["concept-1"]}],
+                "knowledge_cards": [{"id": "kc-1", "claim": "卡片", "related_card_ids": ["kc-1"],
+                                     "source_section_id": "s1"}],
+                "recommendations": [],
+            }
+        return SimpleNamespace(choices=[SimpleNamespace(
+            message=SimpleNamespace(content=json.dumps(data, ensure_ascii=False)))])
+
+
+def make_transcript(minutes, chars_per_para=400):
+    lines = ["播客转录：测试\n\n"]
+    for m in range(minutes):
+        lines.append(f"[{m:02d}:00 - {m:02d}:59] 说话人{m % 2}\n{'字' * chars_per_para}\n\n")
+    return "".join(lines)
+
+
+# ──────────────────────────────────────────────
+print("\n=== 1. 按段落标记切分 ===")
+# ──────────────────────────────────────────────
+text = make_transcript(60)
+chunks = analyzer.split_transcript(text, max_chars=5000)
+test("拼回去与原文一致", "".join(chunks) == text)
+test("每段不超过上限", all(len(c) <= 5000 for c in chunks), f"lens={[len(c) for c in chunks]}")
+test("每段从段落标记开始（第一段含标题）",
+     all(c.startswith("[") for c in chunks[1:]) and chunks[0].startswith("播客转录"))
+huge = "[00:00 - 10:00] 说话人0\n" + "字" * 9000 + "\n\n[10:00 - 10:30] 说话人1\n短\n\n"
+test("超长段落独占一段", [len(c) for c in analyzer.split_transcript(huge, 5000)][1] < 100)
+test("没有段落标记时整段返回", analyzer.split_transcript("纯文本", 10) == ["纯文本"])
+
+
+# ──────────────────────────────────────────────
+print("\n=== 2. 分段并发分析 + 合并 ===")
+# ──────────────────────────────────────────────
+tmp = Path(tempfile.mkdtemp())
+analyzer.llm_cache = LLMCache(tmp / "llm_cache")
+transcript = tmp / "transcript.txt"
+transcript.write_text(make_transcript(120), encoding="utf-8")
+fake = FakeQwen(delay=0.3)
+analyzer.OpenAI = lambda **kwargs: fake
+analyzer.os.environ.setdefault("DASHSCOPE_API_KEY", "test")
+
+t0 = time.time()
+data = analyzer.analyze_transcript(str(transcript), str(tmp / "episode.json"), chunked=True)
+elapsed = time.time() - t0
+chunk_calls = [c for c in fake.calls if c[0] == analyzer.SYSTEM_PROMPT_CHUNK]
+merge_calls = [c for c in fake.calls if c[0] == analyzer.SYSTEM_PROMPT_MERGE]
+n = len(analyzer.split_transcript(transcript.read_text(encoding="utf-8")))
+
+test("每段一次调用 + 一次合并", len(chunk_calls) == n and len(merge_calls) == 1, f"calls={len(fake.calls)}")
+test("并发不超过 CHUNK_WORKERS", fake.peak <= analyzer.CHUNK_WORKERS, f"peak={fake.peak}")
+expected = (-(-n // analyzer.CHUNK_WORKERS) + 1) * 0.3
+test("耗时按轮次而不是段数增长", elapsed < expected + 0.5, f"elapsed={elapsed:.1f}s n={n}")
+test("合并调用不带转录原文", all("字字字" not in c[1] for c in merge_calls))
+test("章节按时间排序", [s["start_sec"] for s in data["sections"]] == sorted(s["start_sec"] for s in data["sections"]))
+ids = [s["id"] for s in data["sections"]]
+test("各段 id 加前缀不冲突", len(set(ids)) == n and ids[0] == "c1-s1", f"ids={ids[:3]}")
+test("段内引用同步改名", data["knowledge_cards"][1]["source_section_id"] == "c2-s1"
+     and data["knowledge_cards"][1]["related_card_ids"] == ["c2-kc-1"])
+test("同名概念去重", len(data["key_concepts"]) == 1)
+test("参与者去重", len(data["participants"]) == 1)
+test("全局模块来自合并调用", data["meta"]["title"] == "合并后的标题"
+     and data["content_overview"]["content_blocks"][0]["section_ids"] == ids)
+test("结果写入文件", json.loads((tmp / "episode.json").read_text(encoding="utf-8"))["sections"] == data["sections"])
+
+
+# ──────────────────────────────────────────────
+print("\n=== 3. 短转录仍走整段分析 ===")
+# ──────────────────────────────────────────────
+fake.calls.clear()
+fake.delay = 0
+short = tmp / "short.txt"
+short.write_text(make_transcript(3), encoding="utf-8")
+try:
+    analyzer.analyze_transcript(str(short), str(tmp / "short.json"), use_cache=False)
+except RuntimeError:
+    pass    # 假 client 不返回完整分析结构，只看调用了哪些 prompt
+systems = sorted(c[0][:20] for c in fake.calls)
+test("整段模式调用两个 prompt", sorted(c[0] for c in fake.calls) ==
+     sorted([analyzer.SYSTEM_PROMPT, analyzer.SYSTEM_PROMPT_EXTENDED]), f"calls={systems}")
+
+
+# ──────────────────────────────────────────────
+print("\n=== 4. 响应缓存 ===")
+# ──────────────────────────────────────────────
+fake.calls.clear()
+fake.delay = 0.3
+t0 = time.time()
+again = analyzer.analyze_transcript(str(transcript), str(tmp / "episode2.json"), chunked=True)
+test("同一转录重跑全部命中缓存", fake.calls == [] and time.time() - t0 < 0.3, f"calls={len(fake.calls)}")
+test("命中结果与首次一致", again["sections"] == data["sections"])
+test("命中计数", analyzer.llm_cache.hits >= n + 1, f"hits={analyzer.llm_cache.hits}")
+
+analyzer.analyze_transcript(str(transcript), str(tmp / "episode3.json"), chunked=True, use_cache=False)
+test("use_cache=False 绕过缓存", len(fake.calls) == n + 1, f"calls={len(fake.calls)}")
+
+fake.calls.clear()
+fake.delay = 0
+transcript.write_text(make_transcript(121), encoding="utf-8")
+analyzer.analyze_transcript(str(transcript), str(tmp / "episode4.json"), chunked=True)
+test("转录变化后只重算变化的段 + 合并", 1 <= len(fake.calls) <= 3, f"calls={len(fake.calls)}")
+
+k1 = LLMCache.key("qwen-plus", "sys", "user", 100)
+test("key 区分 max_tokens 和 prompt", k1 != LLMCache.key("qwen-plus", "sys", "user", 200)
+     and k1 != LLMCache.key("qwen-plus", "sys2", "user", 100))
+
+small = LLMCache(tmp / "small_cache", max_bytes=6000)
+for i in range(10):
+    small.put(f"{i:064x}", {"payload": os.urandom(1500).hex()})     # 随机内容，压缩后仍约 1.7KB
+    time.sleep(0.01)
+left = [i for i in range(10) if small.get(f"{i:064x}") is not None]
+test("超过大小上限按最久未用淘汰", left and max(left) == 9 and len(left) < 10, f"left={left}")
+
+
+# ──────────────────────────────────────────────
+print("\n=== 5. 边转录边分析 ===")
+# ──────────────────────────────────────────────
+fake.calls.clear()
+fake.delay = 0.2
+parts_seen = []
+stream = analyzer.StreamingAnalysis(on_part=lambda index, part: parts_seen.append((index, time.time())),
+                                    use_cache=False)
+paragraphs = make_transcript(120).split("\n\n")[1:-1]
+t0 = time.time()
+first_part_at = None
+for i, para in enumerate(paragraphs):
+    stream.feed(para + "\n\n")
+    time.sleep(0.01)    # 模拟转录陆续产出
+    if parts_seen and first_part_at is None:
+        first_part_at = i
+fed_at = time.time()
+data = stream.finish(str(tmp / "streamed.json"))
+test("转录还没结束就有分段结果", first_part_at is not None and first_part_at < len(paragraphs) - 10,
+     f"first_part_at={first_part_at}/{len(paragraphs)}")
+test("每段结果都回调", len(parts_seen) == stream.submitted and stream.submitted > 1,
+     f"parts={len(parts_seen)} submitted={stream.submitted}")
+test("转录结束后只剩尾段 + 合并", time.time() - fed_at < 3 * fake.delay + 0.5, f"tail={time.time() - fed_at:.2f}s")
+test("合并结果按时间排序", [s["start_sec"] for s in data["sections"]] == sorted(s["start_sec"] for s in data["sections"])
+     and len(data["sections"]) == stream.submitted)
+test("结果写入文件", (tmp / "streamed.json").exists())
+
+fake.calls.clear()
+fake.delay = 0
+short_stream = analyzer.StreamingAnalysis(use_cache=False)
+short_stream.feed(make_transcript(3))
+try:
+    short_stream.finish(str(tmp / "short_streamed.json"))
+except RuntimeError:
+    pass
+test("不足一段时退回整段分析", sorted(c[0] for c in fake.calls) ==
+     sorted([analyzer.SYSTEM_PROMPT, analyzer.SYSTEM_PROMPT_EXTENDED]))
+
+fake.calls.clear()
+medium = make_transcript(120)
+medium = medium[:medium.index("[", analyzer.CHUNK_THRESHOLD - 5000)]
+medium_stream = analyzer.StreamingAnalysis(use_cache=False)
+for para in medium.split("\n\n"):
+    medium_stream.feed(para + "\n\n")
+try:
+    medium_stream.finish(str(tmp / "medium_streamed.json"))
+except RuntimeError:
+    pass
+test("超过一段但不到分段阈值时也整段分析",
+     analyzer.CHUNK_CHARS < len(medium) <= analyzer.CHUNK_THRESHOLD and medium_stream.submitted == 0
+     and sorted(c[0] for c in fake.calls) == sorted([analyzer.SYSTEM_PROMPT, analyzer.SYSTEM_PROMPT_EXTENDED]),
+     f"chars={len(medium)} submitted={medium_stream.submitted}")
+
+
+# 同一转录：边转录边分析和整篇分段分析发出的请求（prompt、缓存键）一致
+full = make_transcript(120)
+fake.calls.clear()
+(tmp / "same.txt").write_text(full, encoding="utf-8")
+analyzer.analyze_transcript(str(tmp / "same.txt"), str(tmp / "same_batch.json"), chunked=True, use_cache=False)
+batch_calls = sorted(fake.calls)
+fake.calls.clear()
+same_stream = analyzer.StreamingAnalysis(use_cache=False)
+for para in full.split("\n\n")[:-1]:
+    same_stream.feed(para + "\n\n")
+same_stream.finish(str(tmp / "same_streamed.json"))
+stream_calls = sorted(fake.calls)
+test("流式与整篇分段的请求一致", stream_calls == batch_calls and len(batch_calls) > 2,
+     f"batch={len(batch_calls)} stream={len(stream_calls)}")
+test("流式与整篇分段的缓存键一致",
+     {LLMCache.key(analyzer.QWEN_MODEL, *c) for c in stream_calls}
+     == {LLMCache.key(analyzer.QWEN_MODEL, *c) for c in batch_calls})
+# ──────────────────────────────────────────────
+print(f"\n{'='*50}")
+print(f"分析器回测结果：✅ {passed} 通过 / ❌ {failed} 失败")
+print(f"{'='*50}")
+sys.exit(1 if failed > 0 else 0)
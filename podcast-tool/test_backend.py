@@ -7,7 +7,10 @@
 import sys
 import json
 import time
+import os
+import tempfile
 sys.path.insert(0, ".")
+os.environ["LOG_DIR"] = tempfile.mkdtemp()    # 事件日志写到临时目录，不落进 logs/
 
 from app import app, tasks, OUTPUT_DIR
 
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+批量预计算流水线回测 — 用假阶段函数验证阶段重叠、每阶段并发上限、
+额度熔断后排空、进度账本续跑和旧格式转换
+"""
+
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+sys.path.insert(0, ".")
+
+from batch_engine import BatchEngine, Ledger, QuotaExhausted, SkipEpisode, Stage
+
+passed = 0
+failed = 0
+
+
+def test(name, condition, detail=""):
+    global passed, failed
+    if condition:
+        print(f"  ✅ {name}")
+        passed += 1
+    else:
+        print(f"  ❌ {name} — {detail}")
+        failed += 1
+
+
+class FakeStage:
+    """每次调用耗时 delay 秒，记录并发峰值；按 episode_id 注入跳过 / 额度 / 失败"""
+
+    def __init__(self, delay, skip=(), quota=(), fail=()):
+        self.delay = delay
+        self.skip, self.quota, self.fail = set(skip), set(quota), set(fail)
+        self.seen = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, item):
+        with self._lock:
+            self.seen.append(item["episode_id"])
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        eid = item["episode_id"]
+        if eid in self.skip:
+            raise SkipEpisode("无音频")
+        if eid in self.quota:
+            raise QuotaExhausted("402 insufficient credits")
+        if eid in self.fail:
+            raise RuntimeError("boom")
+        return dict(item, cost_usd=0.1, title=f"标题 {eid}")
+
+
+def run(stages, items, ledger):
+    engine = BatchEngine(stages, ledger, queue_size=2, log=lambda *a: None)
+    engine.start()
+    submitted = []
+    for item in items:
+        if not engine.submit(item):
+            break
+        submitted.append(item["episode_id"])
+    engine.join()
+    return engine, submitted
+
+
+tmp = Path(tempfile.mkdtemp())
+
+
+# ──────────────────────────────────────────────
+print("\n=== 1. 阶段重叠 + 每阶段并发上限 ===")
+# ──────────────────────────────────────────────
+fetch, transcribe, analyze, render = FakeStage(0.05), FakeStage(0.2), FakeStage(0.2), FakeStage(0.02)
+stages = [Stage("fetch", fetch, 2), Stage("transcribe", transcribe, 4, metered=True),
+          Stage("analyze", analyze, 3), Stage("render", render, 1)]
+ledger = Ledger(tmp / "progress.json")
+items = [{"episode_id": f"ep{i:02d}", "url": f"u{i}", "podcast": "测试"} for i in range(12)]
+t0 = time.time()
+run(stages, items, ledger)
+elapsed = time.time() - t0
+sequential = 12 * (0.05 + 0.2 + 0.2 + 0.02)
+
+test("全部完成", ledger.counts() == {"done": 12}, f"counts={ledger.counts()}")
+test("比逐集顺序跑快 3 倍以上", elapsed < sequential / 3, f"elapsed={elapsed:.2f}s sequential={sequential:.2f}s")
+test("每阶段并发不超过上限", fetch.peak <= 2 and transcribe.peak <= 4 and analyze.peak <= 3
+     and render.peak == 1, f"peaks={fetch.peak},{transcribe.peak},{analyze.peak},{render.peak}")
+test("转录确实并发", transcribe.peak > 1)
+entry = ledger.get("ep03")
+test("账本记录最后阶段、标题、次数", entry["stage"] == "render" and entry["title"] == "标题 ep03"
+     and entry["attempts"] == 1, f"entry={entry}")
+test("累计成本", abs(ledger.total_cost - 1.2) < 1e-6, f"cost={ledger.total_cost}")
+on_disk = json.loads((tmp / "progress.json").read_text(encoding="utf-8"))
+test("落盘", on_disk["episodes"]["ep11"]["status"] == "done")
+
+
+# ──────────────────────────────────────────────
+print("\n=== 2. 跳过 / 失败不影响其他 episode ===")
+# ──────────────────────────────────────────────
+ledger = Ledger(tmp / "progress2.json")
+stages = [Stage("fetch", FakeStage(0.01, skip={"ep01"}), 2),
+          Stage("transcribe", FakeStage(0.01), 2, metered=True),
+          Stage("analyze", FakeStage(0.01, fail={"ep02"}), 2),
+          Stage("render", FakeStage(0.01), 1)]
+run(stages, items[:5], ledger)
+test("跳过 / 失败 / 完成分别记录", ledger.counts() == {"done": 3, "skipped": 1, "failed": 1},
+     f"counts={ledger.counts()}")
+test("失败记录阶段和原因", ledger.get("ep02")["error"] == "boom" and ledger.get("ep02")["stage"] == "transcribe")
+
+
+# ──────────────────────────────────────────────
+print("\n=== 3. 额度熔断：已转录的跑完，其余挂起 ===")
+# ──────────────────────────────────────────────
+ledger = Ledger(tmp / "progress3.json")
+many = [{"episode_id": f"ep{i:02d}", "url": f"u{i}", "podcast": "测试"} for i in range(30)]
+transcribe = FakeStage(0.05, quota={f"ep{i:02d}" for i in range(4, 30)})
+analyze = FakeStage(0.1)
+stages = [Stage("fetch", FakeStage(0.01), 2), Stage("transcribe", transcribe, 1, metered=True),
+          Stage("analyze", analyze, 1), Stage("render", FakeStage(0.01), 1)]
+engine, submitted = run(stages, many, ledger)
+counts = ledger.counts()
+test("熔断", engine.tripped.is_set())
+test("熔断前转录完的全部跑完", [f"ep{i:02d}" for i in range(4)] == sorted(analyze.seen)
+     and counts.get("done") == 4, f"counts={counts} analyzed={analyze.seen}")
+test("熔断后只调用一次计费阶段", transcribe.seen.count("ep05") == 0 and len(transcribe.seen) == 5,
+     f"seen={transcribe.seen}")
+test("其余挂起为 deferred", counts.get("deferred") == len(submitted) - 4, f"counts={counts}")
+test("熔断后停止提交", len(submitted) < 30, f"submitted={len(submitted)}")
+
+
+# ──────────────────────────────────────────────
+print("\n=== 4. 续跑：完成的不再提交，挂起的重跑 ===")
+# ──────────────────────────────────────────────
+resumed = Ledger(tmp / "progress3.json")
+todo = [it for it in many if not resumed.is_finished(it["episode_id"])]
+test("重启后只剩未完成的", [it["episode_id"] for it in todo] == [f"ep{i:02d}" for i in range(4, 30)],
+     f"todo={[it['episode_id'] for it in todo]}")
+run([Stage("fetch", FakeStage(0), 2), Stage("transcribe", FakeStage(0), 2, metered=True),
+     Stage("analyze", FakeStage(0), 2), Stage("render", FakeStage(0), 1)], todo, resumed)
+test("续跑完成", resumed.counts() == {"done": 30}, f"counts={resumed.counts()}")
+test("重试次数累加", resumed.get("ep05")["attempts"] == 2)
+
+legacy = tmp / "legacy.json"
+legacy.write_text(json.dumps({"processed": ["a", "b"], "skipped": ["c"],
+                              "failed": [{"id": "d", "error": "x"}], "total_cost_usd": 0.5}),
+                  encoding="utf-8")
+old = Ledger(legacy)
+test("旧格式转换", old.is_finished("a") and old.is_finished("c") and not old.is_finished("d")
+     and old.total_cost == 0.5)
+
+
+# ──────────────────────────────────────────────
+print(f"\n{'='*50}")
+print(f"批量流水线回测结果：✅ {passed} 通过 / ❌ {failed} 失败")
+print(f"{'='*50}")
+sys.exit(1 if failed > 0 else 0)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+任务队列回测 — 不访问网络，用假 handler 验证排队 / 优先级 / worker 数 / 重启续跑，
+进度通知（SSE 阻塞等待 + 共享 payload），令牌桶限流、任务表的内存上限和同一集并发提交的去重
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+sys.path.insert(0, ".")
+os.environ["LOG_DIR"] = tempfile.mkdtemp()    # 事件日志写到临时目录，不落进 logs/
+
+from jobs import JobQueue, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, RETENTION_DAYS
+
+passed = 0
+failed = 0
+
+
+def test(name, condition, detail=""):
+    global passed, failed
+    if condition:
+        print(f"  ✅ {name}")
+        passed += 1
+    else:
+        print(f"  ❌ {name} — {detail}")
+        failed += 1
+
+
+tmp = Path(tempfile.mkdtemp())
+
+
+# ──────────────────────────────────────────────
+print("\n=== 1. 优先级通道 + FIFO + 排队位置 ===")
+# ──────────────────────────────────────────────
+q = JobQueue(tmp / "order.db")
+q.enqueue("n1", "u1")
+time.sleep(0.01)
+q.enqueue("low", "u2", priority=PRIORITY_LOW)
+time.sleep(0.01)
+q.enqueue("n2", "u3")
+time.sleep(0.01)
+q.enqueue("hi", "u4", priority=PRIORITY_HIGH)
+
+test("高优先级排第 1", q.position("hi") == 1, f"pos={q.position('hi')}")
+test("同优先级先到先排", q.position("n1") == 2 and q.position("n2") == 3)
+test("低优先级排最后", q.position("low") == 4, f"pos={q.position('low')}")
+order = [q.claim()["task_id"] for _ in range(4)]
+test("领取顺序 hi→n1→n2→low", order == ["hi", "n1", "n2", "low"], f"order={order}")
+test("队列空时领取返回 None", q.claim() is None)
+test("已开始的任务位置为 0", q.position("hi") == 0)
+
+
+# ──────────────────────────────────────────────
+print("\n=== 2. 固定 worker 数，突发请求排队而不是失败 ===")
+# ──────────────────────────────────────────────
+running = 0
+peak = 0
+lock = threading.Lock()
+done = []
+
+
+def slow_handler(job):
+    global running, peak
+    with lock:
+        running += 1
+        peak = max(peak, running)
+    time.sleep(0.2)
+    with lock:
+        running -= 1
+        done.append(job["task_id"])
+    if job["url"] == "bad":
+        raise RuntimeError("转录失败")
+
+
+q = JobQueue(tmp / "pool.db", handler=slow_handler, workers=3)
+for i in range(8):
+    q.enqueue(f"t{i}", "bad" if i == 5 else f"u{i}", priority=PRIORITY_NORMAL)
+test("8 个任务全部入队", q.queued_count() == 8)
+q.start()
+deadline = time.time() + 10
+while len(done) < 8 and time.time() < deadline:
+    time.sleep(0.05)
+q.stop()
+test("全部执行完", len(done) == 8, f"done={len(done)}")
+test("同时执行不超过 3 个", peak == 3, f"peak={peak}")
+test("成功任务状态 done", q.get("t0")["status"] == "done")
+test("失败任务记录错误", q.get("t5")["status"] == "error" and "转录失败" in q.get("t5")["error"])
+
+
+# ──────────────────────────────────────────────
+print("\n=== 3. 排队上限 ===")
+# ──────────────────────────────────────────────
+q = JobQueue(tmp / "full.db", max_queued=2)
+q.enqueue("a", "u")
+test("未满", not q.is_full())
+q.enqueue("b", "u")
+test("达到上限", q.is_full())
+q.claim()
+test("领取后排队数减少（内存计数）", q.queued_count() == 1 and not q.is_full())
+test("重开时从库里恢复排队数", JobQueue(tmp / "full.db", max_queued=2).queued_count() == 1)
+
+
+# ──────────────────────────────────────────────
+print("\n=== 4. 进程重启：执行中的任务从上次完成的步骤续跑 ===")
+# ──────────────────────────────────────────────
+q = JobQueue(tmp / "resume.db")
+q.enqueue("crash", "u1")
+q.enqueue("waiting", "u2")
+job = q.claim()
+q.mark_step(job["task_id"], 1, episode_id="abc123")
+del q  # 模拟进程崩溃：任务停在 started
+
+resumed = []
+q = JobQueue(tmp / "resume.db", handler=lambda j: resumed.append((j["task_id"], j["step"], j["episode_id"])))
+pending = q.recover()
+test("重启后两个任务待执行", [j["task_id"] for j in pending] == ["crash", "waiting"],
+     f"pending={[j['task_id'] for j in pending]}")
+q.start()
+deadline = time.time() + 5
+while len(resumed) < 2 and time.time() < deadline:
+    time.sleep(0.05)
+q.stop()
+test("续跑任务带上已完成步骤", ("crash", 1, "abc123") in resumed, f"resumed={resumed}")
+test("排队任务从头开始", ("waiting", -1, None) in resumed, f"resumed={resumed}")
+test("续跑完成后状态 done", q.get("crash")["status"] == "done")
+
+# 保留期：重启恢复时删掉完成超过 RETENTION_DAYS 天的 done/error，未结束的和近期的保留
+q = JobQueue(tmp / "retention.db")
+for tid in ("old_done", "old_error", "recent", "old_queued"):
+    q.enqueue(tid, "u")
+for tid in ("old_done", "old_error", "recent"):
+    q.claim()
+q.finish("old_done")
+q.finish("old_error", "boom")
+q.finish("recent")
+q._db().execute("UPDATE jobs SET finished_at = ?, created_at = ? WHERE task_id LIKE 'old_%'",
+                (time.time() - (RETENTION_DAYS + 1) * 86400,) * 2)
+pending = q.recover()
+test("过期的 done/error 被清理", q.get("old_done") is None and q.get("old_error") is None)
+test("近期完成的保留", q.get("recent")["status"] == "done")
+test("排队中的不受保留期影响", [j["task_id"] for j in pending] == ["old_queued"])
+
+
+# ──────────────────────────────────────────────
+print("\n=== 5. 进度通知：无变化时阻塞，多个观看者共用一次序列化 ===")
+# ──────────────────────────────────────────────
+from core import TaskChannel
+
+ch = TaskChannel()
+t0 = time.time()
+v = ch.wait(-1, timeout=1)
+test("首次等待立即返回", time.time() - t0 < 0.1 and v == 0)
+t0 = time.time()
+test("无变化时等到超时（心跳）", ch.wait(v, timeout=0.3) == v and time.time() - t0 >= 0.3)
+
+woken = []
+
+
+def viewer():
+    woken.append(ch.wait(v, timeout=5))
+
+
+viewers = [threading.Thread(target=viewer) for _ in range(20)]
+for t in viewers:
+    t.start()
+time.sleep(0.1)
+t0 = time.time()
+ch.publish()
+for t in viewers:
+    t.join()
+test("publish 唤醒全部观看者", woken == [1] * 20 and time.time() - t0 < 1, f"woken={woken[:5]}")
+
+builds = []
+for _ in range(20):
+    ch.payload(lambda: builds.append(1) or '{"v": 1}')
+test("同一版本只序列化一次", len(builds) == 1, f"builds={len(builds)}")
+ch.publish()
+test("版本变化后重新序列化", ch.payload(lambda: '{"v": 2}') == '{"v": 2}')
+
+
+# ──────────────────────────────────────────────
+print("\n=== 6. 令牌桶限流 + 空闲 IP 清理 ===")
+# ──────────────────────────────────────────────
+from rate_limit import TokenBucketLimiter
+
+lim = TokenBucketLimiter(rate=5 / 60, burst=5)
+results = [lim.allow("1.1.1.1", now=100) for _ in range(6)]
+test("连续 5 次放行，第 6 次拒绝", results == [True] * 5 + [False], f"results={results}")
+test("12 秒后恢复 1 次", lim.allow("1.1.1.1", now=112.1) and not lim.allow("1.1.1.1", now=112.2))
+test("不同 IP 互不影响", lim.allow("2.2.2.2", now=112.2))
+for i in range(1000):
+    lim.allow(f"10.0.{i // 256}.{i % 256}", now=200)
+test("空闲超过 TTL 的桶被清理", len(lim) <= 1001 and lim.allow("x", now=300) and len(lim) == 1, f"len={len(lim)}")
+small = TokenBucketLimiter(rate=1, burst=1, max_keys=10)
+for i in range(100):
+    small.allow(f"ip{i}", now=0)
+test("IP 数有上限", len(small) <= 10, f"len={len(small)}")
+
+
+# ──────────────────────────────────────────────
+print("\n=== 7. 任务表：进行中单独存放，已结束的限量保留 ===")
+# ──────────────────────────────────────────────
+from task_registry import TaskRegistry
+
+evicted = []
+reg = TaskRegistry(max_finished=3, on_evict=evicted.append)
+for i in range(6):
+    reg[f"t{i}"] = {"status": "queued"}
+test("新任务进入 active", reg.active_count() == 6 and len(reg) == 6)
+for i in range(5):
+    reg[f"t{i}"]["status"] = "done"
+    reg.finish(f"t{i}")
+test("结束后移出 active", reg.active_count() == 1 and [k for k, _ in reg.active_items()] == ["t5"])
+test("已结束的只保留最近 3 个", len(reg) == 4 and evicted == ["t0", "t1"], f"evicted={evicted}")
+reg.get("t2")
+reg["t6"] = {"status": "queued"}
+reg["t6"]["status"] = "error"
+reg.finish("t6")
+test("查询刷新 LRU，淘汰最久未查看的", "t2" in reg and "t3" not in reg, f"evicted={evicted}")
+test("dict 接口", reg.get("nope") is None and reg["t5"]["status"] == "queued" and "t5" in reg)
+del reg["t5"]
+test("删除", "t5" not in reg and reg.active_count() == 0)
+
+
+# ──────────────────────────────────────────────
+print("\n=== 8. 同一集并发提交：加入已有任务 ===")
+# ──────────────────────────────────────────────
+import core
+
+core.job_queue = JobQueue(tmp / "dedup.db")
+core._workers_started = True        # 不启动 worker，只验证登记
+url = "https://www.xiaoyuzhoufm.com/episode/" + "a" * 24
+t1 = core.create_task(url, uid="u1")
+t2 = core.create_task(url + "?s=share", uid="u2")
+test("同一集返回同一个任务", t1 == t2)
+test("只入队一次", core.job_queue.queued_count() == 1)
+test("加入的用户记在任务上", core.tasks[t1]["uids"] == ["u1", "u2"])
+test("join_task 不创建新任务", core.join_task(url) == t1
+     and core.join_task(url.replace("a" * 24, "b" * 24)) is None)
+
+other = url.replace("a" * 24, "c" * 24)
+ids = []
+threads = [threading.Thread(target=lambda: ids.append(core.create_task(other))) for _ in range(10)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+test("10 个并发请求只建一个任务", len(set(ids)) == 1 and core.job_queue.queued_count() == 2,
+     f"ids={set(ids)} queued={core.job_queue.queued_count()}")
+
+# 流水线刚置为 done、还没移出登记时加入：直接记到该用户的历史
+from user_store import UserStore
+core.user_store = UserStore(tmp / "users.db")
+core.tasks[t1]["status"] = "done"
+core.tasks[t1]["episode_id"] = "a" * 24
+test("完成瞬间加入仍返回该任务", core.join_task(url, uid="late") == t1)
+test("完成后加入的用户记上历史", core.user_store.episodes("late") == ["a" * 24]
+     and "late" not in core.tasks[t1]["uids"], core.user_store.episodes("late"))
+core._release_episode(t1)
+core.tasks.finish(t1)
+t3 = core.create_task(url)
+test("任务结束后再提交是新任务", t3 != t1)
+
+# URL 里解析不出 id（短链），拿到元数据才发现和进行中的 t3 是同一集：转到 t3，不再往下跑
+import fetcher
+original_fetch = fetcher.fetch_metadata
+fetcher.fetch_metadata = lambda u: {"episode_id": "a" * 24, "title": "同一集", "audio_url": "x"}
+short = core.create_task("https://xyzfm.link/s/abc", uid="u9")
+core._run_pipeline(short, "https://xyzfm.link/s/abc")
+fetcher.fetch_metadata = original_fetch
+test("同一集转到进行中的任务", core.tasks[short]["status"] == "forwarded"
+     and core.tasks[short]["forwarded_to"] == t3, core.tasks[short]["status"])
+test("转过去的用户并到原任务", "u9" in core.tasks[t3]["uids"], core.tasks[t3]["uids"])
+test("进度查询跟到原任务", core.resolve_task(short) == t3
+     and json.loads(core.task_payload(short))["forwarded_to"] == t3)
+test("转走的任务不占登记", core.join_task(url) == t3)
+
+
+# ──────────────────────────────────────────────
+print(f"\n{'='*50}")
+print(f"任务队列回测结果：✅ {passed} 通过 / ❌ {failed} 失败")
+print(f"{'='*50}")
+sys.exit(1 if failed > 0 else 0)
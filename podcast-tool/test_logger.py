@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+事件日志回测 — 验证缓冲批量写入、按行数 / 间隔刷盘、缓冲区满丢最旧、
+按日期和大小切文件、压缩前一天、退出前写完，以及 report.py 读取分片和压缩文件
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+sys.path.insert(0, ".")
+os.environ["LOG_DIR"] = tempfile.mkdtemp()    # 事件日志写到临时目录，不落进 logs/
+
+from logger import EventLogger, day_files, open_log
+from report import load_events
+
+passed = 0
+failed = 0
+
+
+def test(name, condition, detail=""):
+    global passed, failed
+    if condition:
+        print(f"  ✅ {name}")
+        passed += 1
+    else:
+        print(f"  ❌ {name} — {detail}")
+        failed += 1
+
+
+def read_day(log_dir, date_str):
+    lines = []
+    for path in day_files(date_str, log_dir):
+        with open_log(path) as f:
+            lines.extend(json.loads(line) for line in f if line.strip())
+    return lines
+
+
+class FakeClock:
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+# ──────────────────────────────────────────────
+print("\n=== 1. 批量写入：请求线程只进缓冲区 ===")
+# ──────────────────────────────────────────────
+tmp = Path(tempfile.mkdtemp())
+today = datetime.now().strftime("%Y-%m-%d")
+log = EventLogger(tmp / "a", flush_lines=100, flush_sec=0.2)
+t0 = time.perf_counter()
+for i in range(1000):
+    log.log("page_view", i=i)
+elapsed = time.perf_counter() - t0
+time.sleep(0.5)
+events = read_day(tmp / "a", today)
+test("全部写入且顺序不变", [e["i"] for e in events] == list(range(1000)), f"n={len(events)}")
+test("按批写入，远少于事件数", 0 < log.writes <= 20, f"writes={log.writes}")
+test("记录耗时很短", elapsed < 0.5, f"elapsed={elapsed:.3f}s")
+
+log.log("task_done", total_sec=1.5)
+time.sleep(0.05)
+test("不足一批时先留在缓冲区", len(read_day(tmp / "a", today)) == 1000)
+time.sleep(0.4)
+test("到间隔后写入", read_day(tmp / "a", today)[-1]["event"] == "task_done")
+
+threads = [threading.Thread(target=lambda n=n: [log.log("t", n=n, k=k) for k in range(200)])
+           for n in range(8)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+log.close()
+events = [e for e in read_day(tmp / "a", today) if e["event"] == "t"]
+test("多线程并发写不丢行", len(events) == 1600, f"n={len(events)}")
+test("同一线程内顺序不变", all([e["k"] for e in events if e["n"] == n] == list(range(200)) for n in range(8)))
+
+
+# ──────────────────────────────────────────────
+print("\n=== 2. 缓冲区满：丢最旧的并记录 ===")
+# ──────────────────────────────────────────────
+log = EventLogger(tmp / "b", buffer_lines=10, background=False)
+for i in range(25):
+    log.log("e", i=i)
+log.flush()
+events = read_day(tmp / "b", today)
+test("记录丢弃条数", events[0]["event"] == "log_dropped" and events[0]["count"] == 15, f"first={events[0]}")
+test("保留最新的", [e["i"] for e in events[1:]] == list(range(15, 25)))
+
+
+# ──────────────────────────────────────────────
+print("\n=== 3. 按大小切分片 ===")
+# ──────────────────────────────────────────────
+log = EventLogger(tmp / "c", max_bytes=2000, background=False)
+for i in range(205):            # 最后 5 条不够切分片，留在当前文件
+    log.log("e", i=i, pad="x" * 40)
+    if i % 10 == 9:
+        log.flush()
+log.close()
+files = day_files(today, tmp / "c")
+test("切成多个分片", len(files) > 3 and files[-1].name == f"{today}.jsonl", [p.name for p in files])
+test("分片不超过上限太多", all(p.stat().st_size < 2000 + 10 * 100 for p in files))
+test("按分片顺序读回完整", [e["i"] for e in read_day(tmp / "c", today)] == list(range(205)))
+
+
+# ──────────────────────────────────────────────
+print("\n=== 4. 换天 + 压缩前一天 ===")
+# ──────────────────────────────────────────────
+clock = FakeClock(datetime(2026, 3, 1, 23, 59, 58))
+log = EventLogger(tmp / "d", compress=True, clock=clock, background=False)
+log.log("e", i=0)
+log.log("e", i=1)
+clock.now += timedelta(seconds=5)
+log.log("e", i=2)
+log.flush()
+log.close()
+names = sorted(p.name for p in (tmp / "d").iterdir())
+test("跨天分文件，前一天压缩", names == ["2026-03-01.jsonl.gz", "2026-03-02.jsonl"], names)
+test("压缩文件可读", [e["i"] for e in read_day(tmp / "d", "2026-03-01")] == [0, 1])
+test("新一天的文件", [e["i"] for e in read_day(tmp / "d", "2026-03-02")] == [2])
+
+
+# ──────────────────────────────────────────────
+print("\n=== 5. report.py 读取分片和压缩 ===")
+# ──────────────────────────────────────────────
+test("日报读分片", [e["i"] for e in load_events(today, tmp / "c")] == list(range(205)))
+test("日报读压缩文件", len(load_events("2026-03-01", tmp / "d")) == 2)
+test("没有日志的日期", load_events("2020-01-01", tmp / "d") == [])
+
+
+# ──────────────────────────────────────────────
+print(f"\n{'='*50}")
+print(f"事件日志回测结果：✅ {passed} 通过 / ❌ {failed} 失败")
+print(f"{'='*50}")
+sys.exit(1 if failed > 0 else 0)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+监控指标回测 — 验证计数器 / 仪表 / 直方图、分位数估算、Prometheus 文本格式，
+以及流水线（假的元数据 / 转录 / 分析 / 渲染模块）和 /metrics 接口的埋点
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+sys.path.insert(0, ".")
+os.environ["LOG_DIR"] = tempfile.mkdtemp()    # 事件日志写到临时目录，不落进 logs/
+
+from metrics import Registry
+
+passed = 0
+failed = 0
+
+
+def test(name, condition, detail=""):
+    global passed, failed
+    if condition:
+        print(f"  ✅ {name}")
+        passed += 1
+    else:
+        print(f"  ❌ {name} — {detail}")
+        failed += 1
+
+
+# ──────────────────────────────────────────────
+print("\n=== 1. 计数器 / 仪表 ===")
+# ──────────────────────────────────────────────
+reg = Registry()
+hits = reg.counter("t_hits_total", "命中", ["kind"])
+hits.inc(kind="a")
+hits.inc(2, kind="a")
+hits.inc(kind="b")
+test("按标签分别计数", hits.value(kind="a") == 3 and hits.value(kind="b") == 1)
+try:
+    hits.inc(-1, kind="a")
+    test("计数器不能减", False)
+except ValueError:
+    test("计数器不能减", True)
+try:
+    hits.inc(other="x")
+    test("标签不匹配报错", False)
+except ValueError:
+    test("标签不匹配报错", True)
+
+conns = reg.gauge("t_conns", "连接数")
+conns.inc()
+conns.inc()
+conns.dec()
+depth = reg.gauge("t_depth", "现算", func=lambda: 7)
+test("仪表可增可减", conns.value() == 1)
+test("func 导出时现算", depth.value() == 7)
+try:
+    reg.counter("t_hits_total", "重复")
+    test("重复注册报错", False)
+except ValueError:
+    test("重复注册报错", True)
+
+
+# ──────────────────────────────────────────────
+print("\n=== 2. 直方图分位数估算 ===")
+# ──────────────────────────────────────────────
+h = reg.histogram("t_latency_seconds", "耗时", ["step"], buckets=range(10, 101, 10))
+for v in range(1, 101):         # 1..100 均匀分布
+    h.observe(v, step="x")
+test("计数", h.count(step="x") == 100)
+p50, p95, p99 = (h.quantile(q, step="x") for q in (0.5, 0.95, 0.99))
+test("p50 ≈ 50", abs(p50 - 50) < 1, f"p50={p50}")
+test("p95 ≈ 95", abs(p95 - 95) < 1, f"p95={p95}")
+test("p99 ≈ 99", abs(p99 - 99) < 1, f"p99={p99}")
+h.observe(500, step="slow")
+test("超出最大桶时取最大边界", h.quantile(0.5, step="slow") == 100)
+test("没有数据返回 None", h.quantile(0.5, step="none") is None)
+h.observe(float("nan"), step="nan")
+test("NaN 不计入", h.count(step="nan") == 0)
+h.observe(10, step="edge")
+test("等于上界落在该桶", h.quantile(1, step="edge") == 10)
+
+
+# ──────────────────────────────────────────────
+print("\n=== 3. Prometheus 文本格式 ===")
+# ──────────────────────────────────────────────
+reg.counter("t_weird_total", "转义", ["v"]).inc(v='a"b\\c\nd')
+text = reg.render()
+lines = text.splitlines()
+test("HELP / TYPE 行", "# HELP t_hits_total 命中" in lines and "# TYPE t_latency_seconds histogram" in lines)
+test("带标签的样本", 't_hits_total{kind="a"} 3' in lines)
+test("分桶累计计数", 't_latency_seconds_bucket{step="x",le="50"} 50' in lines
+     and 't_latency_seconds_bucket{step="x",le="+Inf"} 100' in lines)
+test("_sum / _count", 't_latency_seconds_sum{step="x"} 5050' in lines
+     and 't_latency_seconds_count{step="x"} 100' in lines)
+test("标签值转义", 't_weird_total{v="a\\"b\\\\c\\nd"} 1' in lines, [l for l in lines if "weird" in l])
+test("以换行结尾", text.endswith("\n"))
+
+
+# ──────────────────────────────────────────────
+print("\n=== 4. 流水线埋点 ===")
+# ──────────────────────────────────────────────
+import core
+from jobs import JobQueue
+
+tmp = Path(tempfile.mkdtemp())
+core.OUTPUT_DIR = tmp
+core.job_queue = JobQueue(tmp / "jobs.db")
+core._workers_started = True
+
+EPISODE = "e" * 24
+
+
+def fake_module(name, **funcs):
+    sys.modules[name] = types.SimpleNamespace(**funcs)
+
+
+def fake_transcribe(url, language, output_prefix, output_dir, backend=None, progress=None, on_text=None):
+    time.sleep(0.3)
+    Path(output_dir, "transcript.txt").write_text("字" * 200, encoding="utf-8")
+    return {"success": True, "duration": "1:00"}
+
+
+def fake_analyze(txt_path, output_path, metadata):
+    time.sleep(0.1)
+    Path(output_path).write_text(json.dumps({"sections": []}) + " " * 100, encoding="utf-8")
+
+
+fake_module("fetcher", fetch_metadata=lambda url: {"episode_id": EPISODE, "title": "测试",
+                                                   "audio_url": "https://example.invalid/a.mp3"})
+fake_module("transcribe", transcribe_audio=fake_transcribe,
+            get_backend=lambda: types.SimpleNamespace(label="假后端", streaming=False))
+fake_module("analyzer", analyze_transcript=fake_analyze,
+            llm_cache=types.SimpleNamespace(hits=3, misses=1))
+fake_module("generator", render=lambda src, dst: Path(dst).write_text("<html>", encoding="utf-8"))
+
+url = f"https://www.xiaoyuzhoufm.com/episode/{EPISODE}"
+task_id = core.create_task(url)
+core._run_pipeline(task_id, url)
+test("任务完成", core.tasks[task_id]["status"] == "done", core.tasks[task_id]["error"])
+test("每步记一次耗时", all(core.step_duration.count(step=s) == 1 for s in core.STEP_KEYS))
+p50 = core.step_duration.quantile(0.5, step="transcribe")
+test("转录耗时落在 0-1 秒桶", 0 < p50 <= 1, f"p50={p50}")
+
+task_id = core.create_task(url)         # 文件都在：转录 / 分析跳过，不计入耗时分布
+core._run_pipeline(task_id, url)
+test("跳过的步骤单独计数", core.steps_skipped.value(step="transcribe") == 1
+     and core.step_duration.count(step="transcribe") == 1)
+test("任务结果计数", core.tasks_finished.value(status="done") == 2)
+test("提交结果计数", core.submissions.value(outcome="created") == 2)
+
+sys.modules["fetcher"].fetch_metadata = lambda url: (_ for _ in ()).throw(RuntimeError("403"))
+task_id = core.create_task(url)
+core._run_pipeline(task_id, url)
+test("失败计数", core.tasks_finished.value(status="error") == 1)
+
+
+# 流式后端转录中途抛异常：边转录边分析的线程池也要关掉
+class FakeStreamingAnalysis:
+    instances = []
+
+    def __init__(self, metadata, on_part=None):
+        self.cancelled = False
+        FakeStreamingAnalysis.instances.append(self)
+
+    def feed(self, text):
+        pass
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def crashing_transcribe(url, language, output_prefix, output_dir, backend=None, progress=None, on_text=None):
+    raise RuntimeError("连接中断")
+
+
+STREAM_EPISODE = "f" * 24
+sys.modules["fetcher"].fetch_metadata = lambda url: {"episode_id": STREAM_EPISODE, "title": "流式",
+                                                     "audio_url": "https://example.invalid/b.mp3"}
+sys.modules["transcribe"].transcribe_audio = crashing_transcribe
+sys.modules["transcribe"].get_backend = lambda: types.SimpleNamespace(label="流式后端", streaming=True)
+sys.modules["analyzer"].StreamingAnalysis = FakeStreamingAnalysis
+stream_url = f"https://www.xiaoyuzhoufm.com/episode/{STREAM_EPISODE}"
+task_id = core.create_task(stream_url)
+core._run_pipeline(task_id, stream_url)
+test("转录抛异常时取消流式分析", core.tasks[task_id]["status"] == "error"
+     and len(FakeStreamingAnalysis.instances) == 1 and FakeStreamingAnalysis.instances[0].cancelled,
+     core.tasks[task_id]["error"])
+
+quantiles = core.step_latency_quantiles()
+test("各步 p50 / p95 / p99", set(quantiles) == {(s, q) for s in core.STEP_KEYS for q in ("0.5", "0.95", "0.99")},
+     f"keys={sorted(quantiles)}")
+
+
+# ──────────────────────────────────────────────
+print("\n=== 5. /metrics 接口 ===")
+# ──────────────────────────────────────────────
+core.job_queue = JobQueue(tmp / "app.db", handler=lambda job: None)
+core._workers_started = False
+from app import app
+test("import app 不启动 worker", not core._workers_started and not core.job_queue._threads)
+
+client = app.test_client()
+client.get("/api/history")
+test("第一个请求启动 worker", core._workers_started
+     and len(core.job_queue._threads) == core.job_queue.workers)
+resp = client.get("/metrics")
+body = resp.get_data(as_text=True)
+test("本机直连可访问", resp.status_code == 200 and resp.content_type.startswith("text/plain; version=0.0.4"))
+test("步骤分位数", 'podcast_step_duration_quantile_seconds{step="transcribe",quantile="0.95"}' in body)
+test("排队深度", f"podcast_queue_depth {core.job_queue.queued_count()}" in body,
+     [l for l in body.splitlines() if "queue_depth" in l])
+test("LLM 缓存命中率", "podcast_llm_cache_hit_ratio 0.75" in body and "podcast_llm_cache_hits_total 3" in body)
+test("请求耗时按路由", 'podcast_http_requests_total{endpoint="api.history",status="200"} 1' in body)
+test("/metrics 自身不计", 'endpoint="metrics' not in client.get("/metrics").get_data(as_text=True))
+test("经 nginx 访问需要口令", client.get("/metrics", headers={"X-Real-IP": "1.2.3.4"}).status_code == 404)
+test("带口令可访问", client.get("/metrics?key=lkus2026", headers={"X-Real-IP": "1.2.3.4"}).status_code == 200)
+
+sse = core.sse_connections
+stream = client.get(f"/stream/{task_id}", buffered=False)
+chunk = next(stream.response)
+test("SSE 连接打开时计数", sse.value() == 1, f"value={sse.value()}")
+stream.close()
+test("SSE 连接关闭后归零", sse.value() == 0, f"value={sse.value()}")
+
+
+# ──────────────────────────────────────────────
+print(f"\n{'='*50}")
+print(f"监控指标回测结果：✅ {passed} 通过 / ❌ {failed} 失败")
+print(f"{'='*50}")
+sys.exit(1 if failed > 0 else 0)
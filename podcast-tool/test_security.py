@@ -6,7 +6,10 @@
 import sys
 import json
 import time
+import os
+import tempfile
 sys.path.insert(0, ".")
+os.environ["LOG_DIR"] = tempfile.mkdtemp()    # 事件日志写到临时目录，不落进 logs/
 
 from app import app, tasks, _rate_limit
 
@@ -93,20 +96,20 @@ test("速率限制生效", blocked, "7次请求都没被限流")
 
 
 # ──────────────────────────────────────────────
-print("\n=== 4. 并发限制 ===")
+print("\n=== 4. 排队上限 ===")
 # ──────────────────────────────────────────────
 _rate_limit.clear()
 
-# 手动填充 3 个 started 任务
-for i in range(3):
-    tasks[f"fake-{i}"] = {"status": "started", "url": "", "steps": [], "episode_id": None, "error": None, "metadata": None}
+# 超过 worker 数的任务排队，排队数达到上限才拒绝
+import core
+saved_max = core.job_queue.max_queued
+core.job_queue.max_queued = 0
 
 resp = client.post("/process", data={"url": valid_url})
-test("并发满时拒绝新任务", b"\xe4\xbb\xbb\xe5\x8a\xa1\xe8\xbe\x83\xe5\xa4\x9a" in resp.data)  # 任务较多
+test("排队满时拒绝新任务", b"\xe4\xbb\xbb\xe5\x8a\xa1\xe8\xbe\x83\xe5\xa4\x9a" in resp.data)  # 任务较多
 
 # 清理
-for i in range(3):
-    del tasks[f"fake-{i}"]
+core.job_queue.max_queued = saved_max
 
 
 # ──────────────────────────────────────────────
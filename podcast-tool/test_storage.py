@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+本地索引与缓存回测 — 在临时目录里模拟 output/，验证历史索引的增量更新和持久化、
+用户记录表的并发写入和旧 JSON 迁移、episode 数据缓存按 mtime 失效、
+预压缩变体和 ETag 协商
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+sys.path.insert(0, ".")
+os.environ["LOG_DIR"] = tempfile.mkdtemp()    # 事件日志写到临时目录，不落进 logs/
+
+from episode_index import EpisodeIndex
+from user_store import UserStore
+
+passed = 0
+failed = 0
+
+
+def test(name, condition, detail=""):
+    global passed, failed
+    if condition:
+        print(f"  ✅ {name}")
+        passed += 1
+    else:
+        print(f"  ❌ {name} — {detail}")
+        failed += 1
+
+
+def make_episode(output_dir, episode_id, title, mtime, complete=True):
+    d = output_dir / episode_id
+    d.mkdir(parents=True, exist_ok=True)
+    (d / "metadata.json").write_text(json.dumps({"title": title, "podcast_name": "测试播客"}),
+                                     encoding="utf-8")
+    if complete:
+        (d / "visualization.html").write_text("<html></html>", encoding="utf-8")
+    os.utime(d, (mtime, mtime))
+    return d
+
+
+tmp = Path(tempfile.mkdtemp())
+
+
+# ──────────────────────────────────────────────
+print("\n=== 1. 历史索引：首次扫描 + 分页 ===")
+# ──────────────────────────────────────────────
+out = tmp / "output"
+now = time.time()
+for i in range(5):
+    make_episode(out, f"ep{i}", f"第 {i} 期", now - 100 * (5 - i))
+make_episode(out, "running", "生成中", now, complete=False)
+
+index = EpisodeIndex(out)
+ids = [h["episode_id"] for h in index.page()]
+test("只收录生成完的 episode，按时间倒序", ids == ["ep4", "ep3", "ep2", "ep1", "ep0"], f"ids={ids}")
+test("分页", [h["episode_id"] for h in index.page(1, 2)] == ["ep3", "ep2"])
+test("总数", index.count() == 5)
+test("按 id 查询", [h["episode_id"] for h in index.lookup(["ep0", "ep3", "nope"])] == ["ep3", "ep0"])
+page = index.page(0, 1)
+page[0]["tags"] = ["x"]
+test("返回副本，不污染索引", "tags" not in index.page(0, 1)[0])
+
+
+# ──────────────────────────────────────────────
+print("\n=== 2. 历史索引：增量更新 ===")
+# ──────────────────────────────────────────────
+(out / "running" / "visualization.html").write_text("<html></html>", encoding="utf-8")
+test("生成中的目录完成后自动补进索引", index.page(0, 1)[0]["episode_id"] == "running")
+
+make_episode(out, "ep_new", "新一期", now + 10)
+index.update("ep_new")
+test("流水线完成后 update 加入", index.page(0, 1)[0]["episode_id"] == "ep_new")
+
+for f in (out / "ep0").iterdir():
+    f.unlink()
+(out / "ep0").rmdir()
+test("目录删除后移出索引", "ep0" not in [h["episode_id"] for h in index.page()])
+
+# 其他进程（batch_process）新建目录
+make_episode(out, "ep_batch", "批量生成", now - 1000)
+test("外部新建目录被发现", "ep_batch" in [h["episode_id"] for h in index.page()])
+
+
+# ──────────────────────────────────────────────
+print("\n=== 3. 历史索引：持久化，重启不重新解析 ===")
+# ──────────────────────────────────────────────
+reloaded = EpisodeIndex(out)
+reads = []
+original = reloaded._read_entry
+reloaded._read_entry = lambda d: reads.append(d.name) or original(d)
+test("重启后内容一致", [h["episode_id"] for h in reloaded.page()] == [h["episode_id"] for h in index.page()])
+test("重启后不再解析 metadata.json", reads == [], f"reads={reads}")
+reads.clear()
+reloaded.page()
+reloaded.page()
+test("无变化时不读目录", reads == [], f"reads={reads}")
+
+
+# 管理员首页：分页显示，徽标是总数，带上一页 / 下一页链接
+import core
+import web
+core.episode_index = index
+core._workers_started = True
+web.ADMIN_HISTORY_PAGE = 2
+from app import app
+admin = app.test_client()
+total_eps = index.count()
+body = admin.get(f"/?admin={web.ADMIN_KEY}&page=2").get_data(as_text=True)
+test("徽标显示总数", f'<span class="history-count">{total_eps}</span>' in body)
+test("上一页 / 下一页链接", "page=1" in body and "page=3" in body and f"2 / {-(-total_eps // 2)}" in body)
+last = admin.get(f"/?admin={web.ADMIN_KEY}&page=99").get_data(as_text=True)
+test("页码超出时停在最后一页", "下一页" not in last and "上一页" in last)
+
+# ──────────────────────────────────────────────
+print("\n=== 4. 用户记录：旧 JSON 迁移 ===")
+# ──────────────────────────────────────────────
+legacy = tmp / ".user_index.json"
+legacy.write_text(json.dumps({"u1": ["ep2", "ep1"], "u2": ["ep3"]}), encoding="utf-8")
+store = UserStore(tmp / "users.db", legacy_json=legacy)
+test("导入后保留原顺序", store.episodes("u1") == ["ep2", "ep1"], f"got={store.episodes('u1')}")
+test("旧文件改名保留", not legacy.exists() and (tmp / ".user_index.json.migrated").exists())
+store.add("u1", "ep2")
+test("重复记录去重", store.episodes("u1") == ["ep2", "ep1"])
+test("未知用户为空", store.episodes("nobody") == [])
+
+
+# ──────────────────────────────────────────────
+print("\n=== 5. 用户记录：多线程并发写入不丢 ===")
+# ──────────────────────────────────────────────
+store = UserStore(tmp / "users_mt.db")
+
+
+def writer(n):
+    for i in range(50):
+        store.add(f"user{n % 4}", f"ep{n}_{i}")
+
+
+threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+total = sum(len(store.episodes(f"user{k}")) for k in range(4))
+test("8 线程 × 50 条全部写入", total == 400, f"total={total}")
+
+
+# ──────────────────────────────────────────────
+print("\n=== 6. episode 数据缓存：重复读取不重新解析，文件变化后失效 ===")
+# ──────────────────────────────────────────────
+import generator
+
+ep_json = tmp / "episode.json"
+shutil.copy("examples/test_minimal.json", ep_json)
+calls = []
+original_prepare = generator.prepare_episode_data
+generator.prepare_episode_data = lambda d: calls.append(1) or original_prepare(d)
+
+first = generator.load_episode(ep_json)
+second = generator.load_episode(ep_json)
+test("第二次读取命中缓存", first is second and len(calls) == 1, f"calls={len(calls)}")
+
+data = json.loads(ep_json.read_text(encoding="utf-8"))
+data["meta"]["title"] = "改过的标题"
+ep_json.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+os.utime(ep_json, (time.time() + 5, time.time() + 5))
+third = generator.load_episode(ep_json)
+test("文件修改后重新解析", third["meta"]["title"] == "改过的标题" and len(calls) == 2)
+test("同一文件只保留最新版本", sum(1 for k in generator._episode_cache if k[0] == str(ep_json.resolve())) == 1)
+generator.prepare_episode_data = original_prepare
+
+test("模板环境进程内共用", generator.get_environment() is generator.get_environment())
+out_html = generator.render(str(ep_json), str(tmp / "viz.html"))
+test("渲染成功", "改过的标题" in Path(out_html).read_text(encoding="utf-8"))
+
+
+# ──────────────────────────────────────────────
+print("\n=== 7. 预压缩 + ETag ===")
+# ──────────────────────────────────────────────
+from flask import Flask
+from precompressed import choose_encoding, send_cached_bytes, send_precompressed
+
+test("渲染时写出 .gz", (tmp / "viz.html.gz").exists())
+test("编码协商：优先 br，gzip 兜底", choose_encoding("gzip, br", ["br", "gzip"]) == "br"
+     and choose_encoding("gzip, br;q=0", ["br", "gzip"]) == "gzip")
+test("编码协商：不接受压缩", choose_encoding("", ["gzip"]) is None
+     and choose_encoding("identity", ["gzip"]) is None)
+
+mini = Flask(__name__)
+builds = []
+
+
+@mini.route("/view")
+def mini_view():
+    return send_precompressed(tmp / "viz.html", "text/html")
+
+
+@mini.route("/episode")
+def mini_episode():
+    return send_cached_bytes(("episode", 1), lambda: builds.append(1) or b'{"k": "v"}' * 200,
+                             "application/json")
+
+
+c = mini.test_client()
+raw = (tmp / "viz.html").read_bytes()
+r = c.get("/view", headers={"Accept-Encoding": "gzip, deflate"})
+test("gzip 变体", r.headers.get("Content-Encoding") == "gzip" and gzip.decompress(r.data) == raw)
+test("压缩后明显变小", len(r.data) < len(raw) * 0.5, f"{len(r.data)} / {len(raw)}")
+etag = r.headers.get("ETag")
+r2 = c.get("/view", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+test("If-None-Match 命中返回 304 无正文", r2.status_code == 304 and not r2.data, f"status={r2.status_code}")
+r3 = c.get("/view")
+test("不接受压缩时发原文", r3.data == raw and "Content-Encoding" not in r3.headers)
+test("原文与压缩变体 ETag 不同", r3.headers.get("ETag") != etag)
+test("Vary: Accept-Encoding", r3.headers.get("Vary") == "Accept-Encoding")
+
+(tmp / "viz.html.gz").unlink()
+r4 = c.get("/view", headers={"Accept-Encoding": "gzip"})
+test("缺少变体时先发原文", r4.data == raw and "Content-Encoding" not in r4.headers)
+for _ in range(50):
+    if (tmp / "viz.html.gz").exists():
+        break
+    time.sleep(0.05)
+test("缺少变体时后台补生成", (tmp / "viz.html.gz").exists()
+     and gzip.decompress((tmp / "viz.html.gz").read_bytes()) == raw)
+
+from precompressed import write_variants
+errors = []
+
+
+def write_concurrently():
+    try:
+        write_variants(tmp / "viz.html")
+    except OSError as e:
+        errors.append(e)
+
+
+writers = [threading.Thread(target=write_concurrently) for _ in range(8)]
+for t in writers:
+    t.start()
+for t in writers:
+    t.join()
+test("并发写同一页面的变体不冲突", not errors and not list(tmp.glob("viz.html.gz.*.tmp")), errors)
+
+r = c.get("/episode", headers={"Accept-Encoding": "gzip"})
+r2 = c.get("/episode", headers={"Accept-Encoding": "gzip", "If-None-Match": r.headers["ETag"]})
+test("JSON 压缩 + 304", gzip.decompress(r.data) == b'{"k": "v"}' * 200 and r2.status_code == 304)
+test("JSON 只序列化一次", len(builds) == 1, f"builds={len(builds)}")
+
+
+# ──────────────────────────────────────────────
+print(f"\n{'='*50}")
+print(f"本地索引与缓存回测结果：✅ {passed} 通过 / ❌ {failed} 失败")
+print(f"{'='*50}")
+sys.exit(1 if failed > 0 else 0)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+转录后端回测 — 不装 faster-whisper、不调 Deepgram，用合成音频 + 假解码器验证
+静音切段、多进程分段解码、时间戳拼接、流式交出段落和 save_txt 输出格式
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+sys.path.insert(0, ".")
+
+import numpy as np
+
+import local_transcribe
+from local_transcribe import SAMPLE_RATE, LocalWhisperBackend, split_on_silence, stitch
+from transcribe import DeepgramBackend, get_backend, save_txt
+
+passed = 0
+failed = 0
+
+
+def test(name, condition, detail=""):
+    global passed, failed
+    if condition:
+        print(f"  ✅ {name}")
+        passed += 1
+    else:
+        print(f"  ❌ {name} — {detail}")
+        failed += 1
+
+
+def fake_decoder(samples, language):
+    """每个非静音区间算一句，文本是起止秒数；模拟每段 0.2 秒解码耗时"""
+    time.sleep(0.2)
+    frame = SAMPLE_RATE // 10
+    loud = [np.abs(samples[i:i + frame]).max() > 0.1 for i in range(0, len(samples), frame)]
+    sentences, start = [], None
+    for i, on in enumerate(loud + [False]):
+        if on and start is None:
+            start = i / 10
+        elif not on and start is not None:
+            sentences.append({"start": start, "end": i / 10, "text": f"句{start:.0f}。", "confidence": 0.9})
+            start = None
+    return sentences
+
+
+def make_audio(seconds, speech=4, pause=1):
+    """speech 秒有声 + pause 秒静音交替"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = (t % (speech + pause)) < speech
+    return (0.5 * np.sin(2 * np.pi * 220 * t) * voiced).astype(np.float32)
+
+
+def pid_decoder(samples, language):
+    """每段一句，文本是解码进程的 pid"""
+    return [{"start": 0, "end": 0.1, "text": str(os.getpid()), "confidence": 1}]
+
+
+def main():
+    # ──────────────────────────────────────────────
+    print("\n=== 1. 按静音切段 ===")
+    # ──────────────────────────────────────────────
+    audio = make_audio(120)
+    bounds = split_on_silence(audio, SAMPLE_RATE, max_chunk_sec=20)
+    test("首尾相接覆盖全部音频", bounds[0][0] == 0 and bounds[-1][1] == len(audio)
+         and all(a[1] == b[0] for a, b in zip(bounds, bounds[1:])))
+    test("每段不超过上限", all(e - s <= 20 * SAMPLE_RATE for s, e in bounds))
+    test("切点落在静音里", all(np.abs(audio[s - 160:s + 160]).max() < 0.01 for s, _ in bounds[1:]),
+         f"cuts={[s / SAMPLE_RATE for s, _ in bounds[1:]]}")
+    test("短音频不切", split_on_silence(audio[:SAMPLE_RATE * 5], SAMPLE_RATE, 20) == [(0, SAMPLE_RATE * 5)])
+
+    # ──────────────────────────────────────────────
+    print("\n=== 2. 多进程分段解码 + 拼接 ===")
+    # ──────────────────────────────────────────────
+    progress = []
+    backend = LocalWhisperBackend(workers=4, max_chunk_sec=20, decoder=fake_decoder)
+    backend.transcribe_samples(audio[:SAMPLE_RATE * 30], "zh")     # 预热：spawn 进程只在第一次启动
+    t0 = time.time()
+    result = backend.transcribe_samples(audio, "zh", progress=lambda done, total: progress.append((done, total)))
+    elapsed = time.time() - t0
+    n = len(bounds)
+    alt = result["results"]["channels"][0]["alternatives"][0]
+    paragraphs = alt["paragraphs"]["paragraphs"]
+    starts = [s["start"] for p in paragraphs for s in p["sentences"]]
+
+    test("每段完成都有进度", progress[0] == (0, n) and progress[-1] == (n, n) and len(progress) == n + 1,
+         f"progress={progress}")
+    test("进程池并行", elapsed < n * 0.2, f"elapsed={elapsed:.2f}s chunks={n}")
+    test("时间戳加上段起点，全局有序", starts == sorted(starts) and starts[-1] > 100, f"last={starts[-1]}")
+    test("句子不丢不重", len(starts) == len(set(starts)) == 24, f"n={len(starts)}")
+    test("时长", abs(result["metadata"]["duration"] - 120) < 0.01)
+    test("标记引擎", result["metadata"]["engine"] == "faster-whisper")
+
+    sequential = LocalWhisperBackend(workers=1, max_chunk_sec=20, decoder=fake_decoder).transcribe_samples(audio, "zh")
+    test("单进程结果一致", sequential == result)
+
+    batches = []
+    spaced = make_audio(120, speech=4, pause=2)      # 停顿 2 秒，每句单独成段
+    streamed = backend.transcribe_samples(spaced, "zh", on_paragraphs=lambda paras: batches.append((time.time(), paras)))
+    flat = [p for _, paras in batches for p in paras]
+    test("流式交出的段落与最终结果一致", flat == streamed["results"]["channels"][0]["alternatives"][0]["paragraphs"]["paragraphs"])
+    test("解码过程中陆续交出", len(batches) > 1, f"batches={len(batches)}")
+
+    pids = set()
+    for _ in range(2):
+        out = LocalWhisperBackend(workers=2, max_chunk_sec=20, decoder=pid_decoder).transcribe_samples(audio, "zh")
+        paras = out["results"]["channels"][0]["alternatives"][0]["paragraphs"]["paragraphs"]
+        pids |= {s["text"] for para in paras for s in para["sentences"]}
+    test("进程池跨调用复用，不重复起进程", 0 < len(pids) <= 2 and str(os.getpid()) not in pids, f"pids={pids}")
+    test("同一进程数共用一个池", local_transcribe.get_pool(2, False) is local_transcribe.get_pool(2, False))
+
+    # ──────────────────────────────────────────────
+    print("\n=== 3. 段落划分 + save_txt 兼容 ===")
+    # ──────────────────────────────────────────────
+    close = [{"start": 0, "end": 2, "text": "一。", "confidence": 1}, {"start": 2.5, "end": 4, "text": "二。", "confidence": 0.5},
+             {"start": 10, "end": 12, "text": "三。", "confidence": 0.6}]
+    data = stitch(close, 12)
+    paras = data["results"]["channels"][0]["alternatives"][0]["paragraphs"]["paragraphs"]
+    test("停顿短的句子合成一段，长停顿另起", [len(p["sentences"]) for p in paras] == [2, 1])
+
+    tmp = Path(tempfile.mkdtemp())
+    stats = save_txt(data, tmp / "t.txt")
+    text = (tmp / "t.txt").read_text(encoding="utf-8")
+    test("save_txt 输出段落标记", text.startswith("[00:00 - 00:04] 说话人0\n一。二。\n\n[00:10 - 00:12] 说话人0"), repr(text[:60]))
+    test("统计", stats["para_count"] == 2 and stats["char_count"] == 6 and abs(stats["confidence"] - 0.7) < 1e-9)
+
+    # ──────────────────────────────────────────────
+    print("\n=== 4. 后端选择 ===")
+    # ──────────────────────────────────────────────
+    test("默认 Deepgram", isinstance(get_backend("deepgram"), DeepgramBackend))
+    test("local 后端", isinstance(get_backend("local"), LocalWhisperBackend))
+    try:
+        get_backend("nope")
+        test("未知后端报错", False)
+    except ValueError:
+        test("未知后端报错", True)
+    if local_transcribe.WhisperModel is None:
+        try:
+            LocalWhisperBackend().transcribe("http://example.invalid/a.mp3")
+            test("未装 faster-whisper 时明确报错", False)
+        except RuntimeError as e:
+            test("未装 faster-whisper 时明确报错", "faster-whisper" in str(e))
+
+    # ──────────────────────────────────────────────
+    print(f"\n{'='*50}")
+    print(f"转录后端回测结果：✅ {passed} 通过 / ❌ {failed} 失败")
+    print(f"{'='*50}")
+    sys.exit(1 if failed > 0 else 0)
+
+
+if __name__ == "__main__":
+    # 解码进程用 spawn 启动，会以 __mp_main__ 重新导入本文件，回测只在主进程里跑
+    main()
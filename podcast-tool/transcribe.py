@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Deepgram 音频转录脚本 (兼容 SDK v5.x)
+音频转录脚本 — Deepgram (兼容 SDK v5.x) 或本地 faster-whisper（local_transcribe.py）
 用于 Claude Code Skill
 """
 
@@ -46,30 +46,29 @@ def pick_model(language):
     return "nova-2"
 
 
-def transcribe_audio(url, language="zh", output_prefix="transcript", output_dir="."):
-    """
-    使用 Deepgram 转录音频（兼容 SDK v5.x）
+# ── 转录后端 ──────────────────────────────────────────
+# 每个后端实现 transcribe(url, language, progress) → Deepgram 格式的 dict
+# （results.channels[0].alternatives[0] 下有 transcript / confidence / paragraphs），
+# save_txt 和下游 analyzer 不区分来源。按环境变量 TRANSCRIBE_BACKEND 选择，默认 deepgram。
+# streaming = True 的后端还接受 on_paragraphs 回调，按时间顺序边解码边交出已定稿的段落。
 
-    Args:
-        url: 音频文件 URL
-        language: 语言代码 (zh=中文, en=英语, 等)
-        output_prefix: 输出文件名前缀
-        output_dir: 输出目录
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "deepgram")
 
-    Returns:
-        dict: 转录结果摘要
-    """
-    api_key = os.getenv("DEEPGRAM_API_KEY")
-    if not api_key:
-        return {"success": False, "error": "DEEPGRAM_API_KEY 环境变量未设置"}
 
-    model = pick_model(language)
-    print(f"开始转录...")
-    print(f"  URL: {url}")
-    print(f"  语言: {language} | 模型: {model}")
-    print(f"  处理中，请等待...\n")
+class DeepgramBackend:
+    """Deepgram 云端转录：直接传音频 URL，带说话人识别，按分钟计费"""
 
-    try:
+    name = "deepgram"
+    label = "Deepgram"
+    streaming = False       # 预录音频接口整段返回
+
+    def transcribe(self, url, language="zh", progress=None):
+        api_key = os.getenv("DEEPGRAM_API_KEY")
+        if not api_key:
+            raise RuntimeError("DEEPGRAM_API_KEY 环境变量未设置")
+
+        model = pick_model(language)
+        print(f"  语言: {language} | 模型: {model}")
         client = DeepgramClient(api_key=api_key)
 
         def _call_deepgram(use_model):
@@ -98,11 +97,55 @@ def transcribe_audio(url, language="zh", output_prefix="transcript", output_dir=
 
         # 转为 dict（兼容不同版本）
         if hasattr(response, "dict"):
-            result = response.dict()
-        elif hasattr(response, "to_dict"):
-            result = response.to_dict()
+            return response.dict()
+        if hasattr(response, "to_dict"):
+            return response.to_dict()
+        return json.loads(json.dumps(response, default=str))
+
+
+def get_backend(name=None):
+    """按名字取后端实例：deepgram / local"""
+    name = name or TRANSCRIBE_BACKEND
+    if name == "deepgram":
+        return DeepgramBackend()
+    if name == "local":
+        from local_transcribe import LocalWhisperBackend
+        return LocalWhisperBackend()
+    raise ValueError(f"未知的转录后端: {name}")
+
+
+def transcribe_audio(url, language="zh", output_prefix="transcript", output_dir=".",
+                     backend=None, progress=None, on_text=None):
+    """
+    转录音频并保存 txt / json
+
+    Args:
+        url: 音频文件 URL
+        language: 语言代码 (zh=中文, en=英语, 等)
+        output_prefix: 输出文件名前缀
+        output_dir: 输出目录
+        backend: 后端名或实例，None 时按 TRANSCRIBE_BACKEND
+        progress: progress(done, total) 回调，分段解码的后端每完成一段调用一次
+        on_text: on_text(text) 回调，流式后端每定稿几个段落调用一次，text 与 txt 文件
+                 对应部分一致；非流式后端不调用
+
+    Returns:
+        dict: 转录结果摘要
+    """
+    print(f"开始转录...")
+    print(f"  URL: {url}")
+    print(f"  处理中，请等待...\n")
+
+    try:
+        if backend is None or isinstance(backend, str):
+            backend = get_backend(backend)
+        streamed = bool(on_text) and getattr(backend, "streaming", False)
+        if streamed:
+            result = backend.transcribe(
+                url, language=language, progress=progress,
+                on_paragraphs=lambda paras: on_text("".join(format_paragraph(p) for p in paras)))
         else:
-            result = json.loads(json.dumps(response, default=str))
+            result = backend.transcribe(url, language=language, progress=progress)
 
         # 保存文件
         txt_path = os.path.join(output_dir, f"{output_prefix}.txt")
@@ -124,6 +167,8 @@ def transcribe_audio(url, language="zh", output_prefix="transcript", output_dir=
 
         return {
             "success": True,
+            "backend": backend.name,
+            "streamed": streamed,
             "txt_file": txt_path,
             "json_file": json_path,
             "duration": duration_str,
@@ -143,6 +188,15 @@ def save_json(result, path):
         json.dump(result, f, ensure_ascii=False, indent=2, cls=DateTimeEncoder)
 
 
+def format_paragraph(para):
+    """一个段落的 txt 文本：时间戳 + 说话人 + 正文"""
+    speaker = para.get("speaker", "?")
+    start = format_timestamp(para.get("start", 0))
+    end = format_timestamp(para.get("end", 0))
+    text = "".join(s.get("text", "") for s in para.get("sentences", []))
+    return f"[{start} - {end}] 说话人{speaker}\n{text}\n\n"
+
+
 def save_txt(result, path):
     """保存易读的 TXT 文件，返回统计信息"""
     channels = result.get("results", {}).get("channels", [])
@@ -162,15 +216,7 @@ def save_txt(result, path):
         # 分段版本（带时间戳 + 说话人）
         if paragraphs_list:
             for para in paragraphs_list:
-                speaker = para.get("speaker", "?")
-                start = format_timestamp(para.get("start", 0))
-                end = format_timestamp(para.get("end", 0))
-
-                sentences = para.get("sentences", [])
-                text = "".join(s.get("text", "") for s in sentences)
-
-                f.write(f"[{start} - {end}] 说话人{speaker}\n")
-                f.write(f"{text}\n\n")
+                f.write(format_paragraph(para))
         else:
             f.write(transcript + "\n")
 
@@ -182,14 +228,25 @@ def save_txt(result, path):
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Deepgram 音频转录")
-    parser.add_argument("url", help="音频文件 URL")
+    parser = argparse.ArgumentParser(description="音频转录（Deepgram / 本地 faster-whisper）")
+    parser.add_argument("url", help="音频文件 URL（--benchmark 时为本地音频路径）")
     parser.add_argument("--language", "-l", default="zh", help="语言代码 (默认: zh)")
     parser.add_argument("--output-prefix", "-p", default="transcript", help="输出文件名前缀 (默认: transcript)")
     parser.add_argument("--output-dir", "-o", default=".", help="输出目录 (默认: 当前目录)")
+    parser.add_argument("--backend", "-b", default=None,
+                        help=f"转录后端 deepgram / local (默认: {TRANSCRIBE_BACKEND})")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="本地后端基准测试：不同分段数下的实时率")
+    parser.add_argument("--chunks", default="1,2,4,8", help="基准测试的分段数 (默认: 1,2,4,8)")
 
     args = parser.parse_args()
-    result = transcribe_audio(args.url, args.language, args.output_prefix, args.output_dir)
+    if args.benchmark:
+        from local_transcribe import benchmark
+        benchmark(args.url, [int(n) for n in args.chunks.split(",")], language=args.language)
+        sys.exit(0)
+
+    result = transcribe_audio(args.url, args.language, args.output_prefix, args.output_dir,
+                              backend=args.backend)
 
     if result["success"]:
         sys.exit(0)
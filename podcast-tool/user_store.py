@@ -0,0 +1,71 @@
+"""
+用户 → episode 记录 — SQLite 单表，替代整文件读写的 .user_index.json
+
+每条记录 (uid, episode_id, created_at)，主键去重；插入是单条 INSERT OR IGNORE，
+按 uid 查询走主键索引。旧的 .user_index.json 在首次打开时导入一次，之后改名
+为 .user_index.json.migrated 保留备查。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_episodes (
+    uid TEXT NOT NULL,
+    episode_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (uid, episode_id)
+);
+"""
+
+
+class UserStore:
+    def __init__(self, path, legacy_json=None):
+        self.path = Path(path)
+        self.legacy_json = Path(legacy_json) if legacy_json else None
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _db(self):
+        """每个线程一个连接；首次使用时建表并导入旧 JSON"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+            with self._init_lock:
+                if not self._ready:
+                    db.executescript(_SCHEMA)
+                    self._migrate(db)
+                    self._ready = True
+        return db
+
+    def _migrate(self, db):
+        if not self.legacy_json or not self.legacy_json.exists():
+            return
+        try:
+            legacy = json.loads(self.legacy_json.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        now = time.time()
+        rows = [(uid, eid, now + i * 1e-6)        # 保留原列表顺序
+                for uid, eids in legacy.items() for i, eid in enumerate(eids)]
+        with db:
+            db.execute("BEGIN")
+            db.executemany("INSERT OR IGNORE INTO user_episodes VALUES (?, ?, ?)", rows)
+        self.legacy_json.rename(self.legacy_json.with_name(self.legacy_json.name + ".migrated"))
+
+    def add(self, uid, episode_id):
+        self._db().execute("INSERT OR IGNORE INTO user_episodes VALUES (?, ?, ?)",
+                           (uid, episode_id, time.time()))
+
+    def episodes(self, uid):
+        """用户生成过的 episode_id，先生成的在前"""
+        rows = self._db().execute(
+            "SELECT episode_id FROM user_episodes WHERE uid = ? ORDER BY created_at", (uid,))
+        return [r[0] for r in rows]
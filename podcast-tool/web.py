@@ -6,19 +6,23 @@ import json
 import time
 import uuid
 
-from flask import Blueprint, request, render_template, redirect, url_for, Response, send_file, make_response
+from flask import Blueprint, request, render_template, redirect, url_for, Response, make_response
 
 from core import (
-    OUTPUT_DIR, tasks,
-    MAX_CONCURRENT_TASKS, check_rate_limit, sanitize_error,
-    is_valid_episode_id, get_history, get_user_history, record_user_episode,
-    create_task, check_cache, get_showcase,
+    OUTPUT_DIR, tasks, task_channel, task_payload, resolve_task,
+    is_queue_full, check_rate_limit, sanitize_error,
+    is_valid_episode_id, get_history, count_history, get_user_history, record_user_episode,
+    create_task, join_task, check_cache, get_showcase, sse_connections,
 )
+from jobs import PRIORITY_HIGH, PRIORITY_NORMAL
 from logger import log_event
+from precompressed import send_precompressed
 
 web = Blueprint("web", __name__)
 
 ADMIN_KEY = "lkus2026"
+ADMIN_HISTORY_PAGE = 100
+SSE_HEARTBEAT_SEC = 15    # 没有进度变化时的保活间隔（nginx 默认 60s 读超时）
 
 
 def _get_or_set_uid(resp=None):
@@ -35,14 +39,21 @@ def _get_or_set_uid(resp=None):
 def index():
     uid = request.cookies.get("uid")
     is_admin = request.args.get("admin") == ADMIN_KEY
+    page, pages = 1, 1
     if is_admin:
-        history = get_history()
+        total = count_history()
+        pages = max(-(-total // ADMIN_HISTORY_PAGE), 1)
+        page = min(max(request.args.get("page", 1, type=int), 1), pages)
+        history = get_history((page - 1) * ADMIN_HISTORY_PAGE, ADMIN_HISTORY_PAGE)
     elif uid:
         history = get_user_history(uid)
+        total = len(history)
     else:
-        history = []
+        history, total = [], 0
     showcase = get_showcase()
-    resp = make_response(render_template("index.html", history=history, showcase=showcase))
+    resp = make_response(render_template("index.html", history=history, history_total=total,
+                                         page=page, pages=pages, showcase=showcase,
+                                         admin_key=ADMIN_KEY if is_admin else ""))
     if not uid:
         uid = uuid.uuid4().hex[:8]
         resp.set_cookie("uid", uid, max_age=365 * 86400, httponly=True, samesite="Lax")
@@ -57,10 +68,6 @@ def process():
     if not check_rate_limit(client_ip):
         return render_template("index.html", error="请求过于频繁，请稍后再试", history=[])
 
-    active = sum(1 for t in tasks.values() if t["status"] == "started")
-    if active >= MAX_CONCURRENT_TASKS:
-        return render_template("index.html", error="当前处理任务较多，请稍后再试", history=[])
-
     url = request.form.get("url", "").strip()
     if len(url) > 200 or not url.startswith("https://www.xiaoyuzhoufm.com/episode/"):
         return render_template("index.html", error="请输入有效的小宇宙单集链接", history=[])
@@ -73,7 +80,16 @@ def process():
         log_event("task_created", url=url, uid=uid, ip=client_ip, cached=True)
         return redirect(url_for("web.view", episode_id=cached))
 
-    task_id = create_task(url, uid=uid)
+    # 同一集正在生成：加入已有任务，不占排队名额
+    task_id = join_task(url, uid)
+    if task_id:
+        return redirect(url_for("web.progress", task_id=task_id))
+
+    if is_queue_full():
+        return render_template("index.html", error="当前排队任务较多，请稍后再试", history=[])
+
+    priority = PRIORITY_HIGH if request.args.get("admin") == ADMIN_KEY else PRIORITY_NORMAL
+    task_id = create_task(url, uid=uid, priority=priority)
     log_event("task_created", task_id=task_id, url=url, uid=uid, ip=client_ip, cached=False)
     return redirect(url_for("web.progress", task_id=task_id))
 
@@ -83,6 +99,8 @@ def progress(task_id):
     task = tasks.get(task_id)
     if not task:
         return redirect(url_for("web.index"))
+    if task["status"] == "forwarded":
+        return redirect(url_for("web.progress", task_id=resolve_task(task_id)))
     if task["status"] == "done" and task.get("episode_id"):
         return redirect(url_for("web.view", episode_id=task["episode_id"]))
     log_event("page_view", path="/progress", uid=request.cookies.get("uid", ""),
@@ -92,35 +110,52 @@ def progress(task_id):
 
 @web.route("/stream/<task_id>")
 def stream(task_id):
-    """SSE 端点 — 推送实时进度"""
+    """
+    SSE 端点 — 推送实时进度
+
+    阻塞等待任务状态变化再推送，期间只发心跳注释；耗时由前端本地计时。
+    任务转到同一集的另一个任务时（forwarded_to），接着推送那个任务的进度。
+    """
     def generate():
-        last_sent = ""
+        if task_channel(resolve_task(task_id)) is None:
+            yield f"data: {json.dumps({'done': True, 'error': 'Task not found'})}\n\n"
+            return
+
+        sse_connections.inc()
+        try:
+            yield from _push_progress()
+        finally:      # 客户端断开时 generator 被关闭，同样走到这里
+            sse_connections.dec()
+
+    def _push_progress():
+        current, channel, seen = None, None, -1
         while True:
-            task = tasks.get(task_id)
-            if not task:
+            target = resolve_task(task_id)
+            if target != current:
+                current, channel, seen = target, task_channel(target), -1
+            task = tasks.get(current)
+            if not task or channel is None:
                 yield f"data: {json.dumps({'done': True, 'error': 'Task not found'})}\n\n"
                 break
 
+            version = channel.wait(seen, SSE_HEARTBEAT_SEC)
+            if version == seen:
+                yield ": ping\n\n"
+                continue
+            seen = version
+            if resolve_task(task_id) != current:
+                continue
+
+            # 共享的 payload 加上本连接的计时字段（状态变化时才推送，解析一次的开销可以忽略）
             now = time.time()
-            payload = json.dumps({
-                "steps": task["steps"],
-                "episode_id": task["episode_id"],
-                "error": task["error"],
-                "metadata": task["metadata"],
-                "done": task["status"] in ("done", "error"),
-                "elapsed": round(now - task.get("started_at", now)),
-                "step_elapsed": round(now - task.get("step_started_at", now)),
-            }, ensure_ascii=False)
-
-            if payload != last_sent:
-                yield f"data: {payload}\n\n"
-                last_sent = payload
+            data = {**json.loads(task_payload(current)),
+                    "elapsed": round(now - task.get("started_at", now)),
+                    "step_elapsed": round(now - task.get("step_started_at", now))}
+            yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
             if task["status"] in ("done", "error"):
                 break
 
-            time.sleep(1)
-
     return Response(generate(), mimetype="text/event-stream",
                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
@@ -137,4 +172,4 @@ def view(episode_id):
     log_event("page_view", path="/view", episode_id=episode_id,
               uid=request.cookies.get("uid", ""),
               ip=request.headers.get("X-Real-IP", request.remote_addr))
-    return send_file(html_path, mimetype="text/html")
+    return send_precompressed(html_path, "text/html")
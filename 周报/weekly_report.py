@@ -4,108 +4,53 @@ Lucky US 周度日报生成脚本
 生成包含经营数据、用户结构、单杯实收、频次、次周留存率的周度报表
 """
 
-import json
-import subprocess
-import time
+import os
+import sys
 import pandas as pd
 from datetime import datetime, timedelta
-from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cyberdata'))
+from cyberdata_query import CyberDataClient, QueryError
+from daily_store import DailyStore
 
 # 配置
-AUTH_FILE = Path.home() / ".claude/skills/cyberdata-query/auth.json"
 EXCLUDED_SHOPS = "('NJ Test Kitchen', 'NJ Test Kitchen 2')"
-
-def load_auth():
-    """加载认证信息"""
-    with open(AUTH_FILE) as f:
-        return json.load(f)
-
-def run_sql(sql: str, max_retries: int = 5) -> list:
-    """执行 SQL 查询并返回结果"""
-    import requests
-
-    auth = load_auth()
-    cookies = auth['cookies']
-    jwttoken = auth['jwttoken']
-    timestamp = int(time.time() * 1000)
-
-    headers = {
-        'accept': 'application/json, text/plain, */*',
-        'content-type': 'application/json; charset=UTF-8',
-        'jwttoken': jwttoken,
-        'productkey': 'CyberData',
-        'origin': 'https://idpcd.luckincoffee.us',
-        'Cookie': cookies
-    }
-
-    payload = {
-        "_t": timestamp,
-        "tenantId": "1001",
-        "userId": "47",
-        "projectId": "1906904360294313985",
-        "resourceGroupId": 1,
-        "taskId": "1990991087752757249",
-        "variables": {},
-        "sqlStatement": sql,
-        "env": 5
-    }
-
-    # 提交查询
-    resp = requests.post(
-        'https://idpcd.luckincoffee.us/api/dev/task/run',
-        headers=headers,
-        json=payload
-    )
-    response = resp.json()
-
-    if response.get('code') != '200':
-        raise Exception(f"查询提交失败: {response}")
-
-    task_id = response['data']
-    print(f"  任务ID: {task_id}")
-
-    # 等待执行
-    time.sleep(8)
-
-    # 获取结果
-    for retry in range(max_retries):
-        timestamp = int(time.time() * 1000)
-        result_payload = {
-            "_t": timestamp,
-            "tenantId": "1001",
-            "userId": "47",
-            "projectId": "1906904360294313985",
-            "env": 5,
-            "taskInstanceId": task_id
-        }
-
-        resp = requests.post(
-            'https://idpcd.luckincoffee.us/api/logger/getQueryLog',
-            headers=headers,
-            json=result_payload
-        )
-        response = resp.json()
-
-        if response.get('code') == '200' and response.get('data'):
-            for item in response['data']:
-                columns_data = item.get('columns', [])
-                if columns_data and len(columns_data) > 1:  # 至少有表头和一行数据
-                    print(f"  获取到 {len(columns_data) - 1} 行数据")
-                    return columns_data
-                # 检查是否还在运行
-                status = item.get('status', '')
-                if status:
-                    print(f"  任务状态: {status}")
-
-        # 如果还没完成，等待后重试
-        print(f"  等待结果... (重试 {retry + 1}/{max_retries})")
-        if retry < max_retries - 1:
-            time.sleep(5)
-
-    print("  查询超时或无结果")
-    # Debug: 打印最后一次响应
-    print(f"  最后响应: {json.dumps(response, ensure_ascii=False)[:500]}")
-    return []
+TEXT_COLUMNS = ('week_id', 'shop_name', 'user_type')  # YEARWEEK 等维度列保持字符串，便于 pivot/isin
+
+_client = None
+_store = None
+
+def get_client() -> CyberDataClient:
+    global _client
+    if _client is None:
+        _client = CyberDataClient()
+    return _client
+
+def get_store(start: str, end: str):
+    """本地门店日度聚合（只补拉缺失/未落地的分区），同步失败返回 None"""
+    global _store
+    if _store is None:
+        _store = DailyStore(get_client())
+    try:
+        synced = _store.sync(start, end)
+    except QueryError as e:
+        print(f"  同步门店日度数据失败: {e}")
+        return None
+    print(f"  本地门店日度数据: 补拉 {len(synced)} 个分区")
+    return _store
+
+def query_frames(queries: dict) -> dict:
+    """批量执行查询，返回 {label: DataFrame}；数值列已按类型转换，失败的查询为空表"""
+    try:
+        frames = get_client().query_many(queries, text_columns=TEXT_COLUMNS)
+    except QueryError as e:
+        print(f"  查询失败: {e}")
+        return {label: pd.DataFrame() for label in queries}
+    return {label: frame.to_pandas() for label, frame in frames.items()}
+
+def run_sql(sql: str) -> pd.DataFrame:
+    """执行单条 SQL，返回 DataFrame"""
+    return query_frames({'': sql})['']
 
 def get_week_dates(year_week: str) -> tuple:
     """将 YYYYWW 格式转换为日期范围（周一到周日）"""
@@ -150,49 +95,23 @@ def get_recent_weeks(n: int = 6) -> list:
 
 
 def query_business_metrics(weeks: list) -> pd.DataFrame:
-    """查询经营数据指标 - 在数据库端完成聚合"""
+    """查询经营数据指标 - 基于本地门店日度聚合按周汇总"""
     print("查询经营数据...")
 
     # 获取完整日期范围
     all_start = get_week_dates(weeks[0])[0]
     all_end = get_week_dates(weeks[-1])[1]
 
-    # 基础指标查询（从汇总表），包含营业天数
-    sql = f"""
-    SELECT
-        YEARWEEK(dt, 1) AS week_id,
-        COUNT(DISTINCT shop_name) AS shop_count,
-        COUNT(DISTINCT dt) AS biz_days,
-        SUM(sku_cnt) AS total_cups,
-        SUM(order_cnt) AS total_orders,
-        ROUND(SUM(pay_amount), 2) AS total_revenue
-    FROM dw_ads.ads_mg_sku_shop_sales_statistic_d_1d
-    WHERE tenant = 'LKUS'
-      AND one_category_name = 'Drink'
-      AND shop_name NOT IN {EXCLUDED_SHOPS}
-      AND dt >= '{all_start}'
-      AND dt <= '{all_end}'
-    GROUP BY week_id
-    ORDER BY week_id
-    """
-
-    result = run_sql(sql)
-    if not result:
+    store = get_store(all_start, all_end)
+    if store is None:
         return pd.DataFrame()
 
-    headers = result[0]
-    data = result[1:]
-    df = pd.DataFrame(data, columns=headers)
-
+    # 基础指标（Drink 品类、剔除测试店），包含营业天数
+    df = store.weekly(all_start, all_end).rename(columns={
+        'sku_cnt': 'total_cups', 'order_cnt': 'total_orders', 'pay_amount': 'total_revenue'})
     if df.empty:
         return pd.DataFrame()
-
-    # 转换数据类型
-    df['shop_count'] = df['shop_count'].astype(float)
-    df['biz_days'] = df['biz_days'].astype(float)
-    df['total_cups'] = df['total_cups'].astype(float)
-    df['total_orders'] = df['total_orders'].astype(float)
-    df['total_revenue'] = df['total_revenue'].astype(float)
+    df['total_revenue'] = df['total_revenue'].round(2)
 
     # 计算衍生指标
     # 店日均杯量 = 总杯量 / (店铺数 × 营业天数)
@@ -214,42 +133,21 @@ def query_channel_metrics(weeks: list) -> pd.DataFrame:
     return pd.DataFrame()
 
 def query_shop_details(weeks: list) -> pd.DataFrame:
-    """查询各门店日均杯量 - 在数据库端完成聚合"""
+    """查询各门店日均杯量 - 基于本地门店日度聚合"""
     print("查询门店明细...")
 
     # 获取完整日期范围
     all_start = get_week_dates(weeks[0])[0]
     all_end = get_week_dates(weeks[-1])[1]
 
-    sql = f"""
-    SELECT
-        shop_name,
-        YEARWEEK(dt, 1) AS week_id,
-        COUNT(DISTINCT dt) AS biz_days,
-        SUM(sku_cnt) AS cups,
-        SUM(order_cnt) AS orders,
-        ROUND(SUM(pay_amount), 2) AS revenue
-    FROM dw_ads.ads_mg_sku_shop_sales_statistic_d_1d
-    WHERE tenant = 'LKUS'
-      AND one_category_name = 'Drink'
-      AND shop_name NOT IN {EXCLUDED_SHOPS}
-      AND dt >= '{all_start}'
-      AND dt <= '{all_end}'
-    GROUP BY shop_name, week_id
-    ORDER BY shop_name, week_id
-    """
-
-    result = run_sql(sql)
-    if not result:
+    store = get_store(all_start, all_end)
+    if store is None:
         return pd.DataFrame()
 
-    headers = result[0]
-    data = result[1:]
-    df = pd.DataFrame(data, columns=headers)
-
+    df = store.shop_weekly(all_start, all_end).rename(columns={
+        'sku_cnt': 'cups', 'order_cnt': 'orders', 'pay_amount': 'revenue'})
     if not df.empty:
-        df['cups'] = df['cups'].astype(float)
-        df['biz_days'] = df['biz_days'].astype(float)
+        df['revenue'] = df['revenue'].round(2)
         # 计算日均杯量
         df['daily_cups'] = df['cups'] / df['biz_days']
 
@@ -259,11 +157,11 @@ def query_shop_details(weeks: list) -> pd.DataFrame:
 def query_user_structure(weeks: list) -> pd.DataFrame:
     """
     查询用户结构（新客/留存/回流）- 单周查询版本
-    为避免超时，按周分别查询
+    为避免超时，按周拆成多条查询，一次性提交后统一等待
     """
     print("查询用户结构...")
 
-    all_results = []
+    queries = {}
 
     for week in weeks:
         week_start, week_end = get_week_dates(week)
@@ -320,23 +218,13 @@ def query_user_structure(weeks: list) -> pd.DataFrame:
         FROM user_type_calc
         GROUP BY user_type
         """
+        queries[week] = sql
 
-        result = run_sql(sql)
-        if result and len(result) > 1:
-            headers = result[0]
-            data = result[1:]
-            week_df = pd.DataFrame(data, columns=headers)
-            all_results.append(week_df)
-
+    all_results = [df for df in query_frames(queries).values() if not df.empty]
     if not all_results:
         return pd.DataFrame()
 
-    result_df = pd.concat(all_results, ignore_index=True)
-    result_df['user_count'] = result_df['user_count'].astype(float)
-    result_df['order_count'] = result_df['order_count'].astype(float)
-    result_df['total_revenue'] = result_df['total_revenue'].astype(float)
-
-    return result_df
+    return pd.concat(all_results, ignore_index=True)
 
 
 def query_weekly_retention(weeks: list) -> pd.DataFrame:
@@ -359,16 +247,10 @@ def query_weekly_retention(weeks: list) -> pd.DataFrame:
     ORDER BY week_id
     """
 
-    result = run_sql(sql)
-    if not result:
+    df = run_sql(sql)
+    if df.empty:
         return pd.DataFrame()
 
-    headers = result[0]
-    data = result[1:]
-    df = pd.DataFrame(data, columns=headers)
-
-    df['src_users'] = df['src_users'].astype(float)
-    df['retained_users'] = df['retained_users'].astype(float)
     df['retention_rate'] = df['retained_users'] / df['src_users'] * 100
 
     return df
@@ -469,10 +351,6 @@ def generate_report(weeks: list):
         print("\n【模块2: 用户结构】")
         print("-" * 40)
 
-        user_df['user_count'] = user_df['user_count'].astype(float)
-        user_df['order_count'] = user_df['order_count'].astype(float)
-        user_df['total_revenue'] = user_df['total_revenue'].astype(float)
-
         # 按周汇总
         weekly_totals = user_df.groupby('week_id').agg({
             'user_count': 'sum',
@@ -741,7 +619,11 @@ def main():
     print(f"分析周期: {weeks}")
 
     # 生成报表
-    generate_report(weeks)
+    try:
+        generate_report(weeks)
+    finally:
+        if _store is not None:
+            _store.close()
 
 
 if __name__ == "__main__":
@@ -4,103 +4,40 @@ Lucky US 日报生成脚本
 包含：业务结果、用户模块、品类模块、核心商品渗透
 """
 
-import json
-import time
+import sys
 import pandas as pd
 from datetime import datetime, timedelta
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "cyberdata"))
+from cyberdata_query import CyberDataClient, QueryError
+from daily_store import DailyStore
+
 # 配置
-AUTH_FILE = Path.home() / ".claude/skills/cyberdata-query/auth.json"
 EXCLUDED_SHOPS = "('NJ Test Kitchen', 'NJ Test Kitchen 2')"
 
-def load_auth():
-    """加载认证信息"""
-    with open(AUTH_FILE) as f:
-        return json.load(f)
-
-def run_sql(sql: str, max_retries: int = 5) -> list:
-    """执行 SQL 查询并返回结果"""
-    import requests
-
-    auth = load_auth()
-    cookies = auth['cookies']
-    jwttoken = auth['jwttoken']
-    timestamp = int(time.time() * 1000)
-
-    headers = {
-        'accept': 'application/json, text/plain, */*',
-        'content-type': 'application/json; charset=UTF-8',
-        'jwttoken': jwttoken,
-        'productkey': 'CyberData',
-        'origin': 'https://idpcd.luckincoffee.us',
-        'Cookie': cookies
-    }
-
-    payload = {
-        "_t": timestamp,
-        "tenantId": "1001",
-        "userId": "47",
-        "projectId": "1906904360294313985",
-        "resourceGroupId": 1,
-        "taskId": "1990991087752757249",
-        "variables": {},
-        "sqlStatement": sql,
-        "env": 5
-    }
-
-    # 提交查询
-    resp = requests.post(
-        'https://idpcd.luckincoffee.us/api/dev/task/run',
-        headers=headers,
-        json=payload
-    )
-    response = resp.json()
-
-    if response.get('code') != '200':
-        raise Exception(f"查询提交失败: {response}")
-
-    task_id = response['data']
-    print(f"  任务ID: {task_id}")
-
-    # 等待执行
-    time.sleep(8)
-
-    # 获取结果
-    for retry in range(max_retries):
-        timestamp = int(time.time() * 1000)
-        result_payload = {
-            "_t": timestamp,
-            "tenantId": "1001",
-            "userId": "47",
-            "projectId": "1906904360294313985",
-            "env": 5,
-            "taskInstanceId": task_id
-        }
-
-        resp = requests.post(
-            'https://idpcd.luckincoffee.us/api/logger/getQueryLog',
-            headers=headers,
-            json=result_payload
-        )
-        response = resp.json()
+_client = None
+
 
-        if response.get('code') == '200' and response.get('data'):
-            for item in response['data']:
-                columns_data = item.get('columns', [])
-                if columns_data and len(columns_data) > 1:
-                    print(f"  获取到 {len(columns_data) - 1} 行数据")
-                    return columns_data
-                status = item.get('status', '')
-                if status:
-                    print(f"  任务状态: {status}")
+def get_client() -> CyberDataClient:
+    global _client
+    if _client is None:
+        _client = CyberDataClient()
+    return _client
 
-        print(f"  等待结果... (重试 {retry + 1}/{max_retries})")
-        if retry < max_retries - 1:
-            time.sleep(5)
 
-    print("  查询超时或无结果")
-    return []
+def run_sql(sql: str) -> list:
+    """执行 SQL 查询并返回结果（首行为表头），失败或无数据返回 []"""
+    try:
+        headers, rows = get_client().run(sql)
+    except QueryError as e:
+        print(f"  查询失败: {e}")
+        return []
+    if not rows:
+        print("  查询无结果")
+        return []
+    print(f"  获取到 {len(rows)} 行数据")
+    return [headers] + rows
 
 
 def get_recent_dates(n: int = 3) -> list:
@@ -117,37 +54,23 @@ def query_business_metrics(dates: list) -> pd.DataFrame:
     """模块1: 业务结果 - 杯量、单杯实收、店日均杯量"""
     print("\n【模块1】查询业务结果...")
 
-    date_list = "'" + "','".join(dates) + "'"
-
-    sql = f"""
-    SELECT
-        dt AS 日期,
-        COUNT(DISTINCT shop_name) AS 营业店铺数,
-        SUM(sku_cnt) AS 杯量,
-        SUM(order_cnt) AS 订单数,
-        ROUND(SUM(pay_amount), 2) AS 销售额,
-        ROUND(SUM(pay_amount) / SUM(sku_cnt), 2) AS 单杯实收
-    FROM dw_ads.ads_mg_sku_shop_sales_statistic_d_1d
-    WHERE tenant = 'LKUS'
-      AND one_category_name = 'Drink'
-      AND shop_name NOT IN {EXCLUDED_SHOPS}
-      AND dt IN ({date_list})
-    GROUP BY dt
-    ORDER BY dt
-    """
-
-    result = run_sql(sql)
-    if not result:
+    # 门店日度聚合存在本地，只补拉缺失/未落地的分区
+    store = DailyStore(get_client())
+    try:
+        store.sync(min(dates), max(dates))
+        df = store.daily(dates)
+    except QueryError as e:
+        print(f"  同步门店日度数据失败: {e}")
+        return pd.DataFrame()
+    finally:
+        store.close()
+    if df.empty:
         return pd.DataFrame()
 
-    headers = result[0]
-    data = result[1:]
-    df = pd.DataFrame(data, columns=headers)
-
-    # 转换数据类型
-    for col in ['营业店铺数', '杯量', '订单数', '销售额', '单杯实收']:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = df.rename(columns={'dt': '日期', 'shop_count': '营业店铺数', 'sku_cnt': '杯量',
+                            'order_cnt': '订单数', 'pay_amount': '销售额'})
+    df['销售额'] = df['销售额'].round(2)
+    df['单杯实收'] = (df['销售额'] / df['杯量']).round(2)
 
     # 计算店日均杯量
     df['店日均杯量'] = (df['杯量'] / df['营业店铺数']).round(0)
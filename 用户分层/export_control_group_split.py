@@ -1,86 +1,83 @@
 #!/usr/bin/env python3
-"""对照组3 奇偶桶号切分 → 导出Excel（用curl绕过Python SSL问题）"""
+"""
+对照组3 奇偶桶号切分 → 导出Excel
 
+按 user_no 分页拉取，每页追加到本地 CSV 暂存并记下最后一个 user_no；中断后
+重跑从断点继续拉。拉完后顺序读两遍暂存文件，写出子组 A / B 和「先 A 后 B」
+的汇总表，全程不在内存里攒全量用户。
+"""
+
+import csv
 import json
-import time
-import subprocess
 import os
-
-auth_file = os.path.expanduser("~/.claude/skills/cyberdata-query/auth.json")
-with open(auth_file) as f:
-    auth = json.load(f)
-
-COOKIES = auth['cookies']
-JWTTOKEN = auth['jwttoken']
-BASE_URL = 'https://idpcd.luckincoffee.us'
-
-
-def curl_post(url, payload):
-    """用 curl 发 POST 请求"""
-    cmd = [
-        'curl', '-s', '--connect-timeout', '15', '--max-time', '30',
-        url,
-        '-H', 'accept: application/json, text/plain, */*',
-        '-H', 'content-type: application/json; charset=UTF-8',
-        '-b', COOKIES,
-        '-H', f'jwttoken: {JWTTOKEN}',
-        '-H', 'productkey: CyberData',
-        '-H', f'origin: {BASE_URL}',
-        '--data-raw', json.dumps(payload)
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    return json.loads(result.stdout)
-
-
-def run_sql(sql, wait=7, max_retries=6):
-    """提交SQL并获取结果"""
-    payload = {
-        "_t": int(time.time() * 1000),
-        "tenantId": "1001", "userId": "47",
-        "projectId": "1906904360294313985",
-        "resourceGroupId": 1,
-        "taskId": "1990991087752757249",
-        "variables": {},
-        "sqlStatement": sql,
-        "env": 5
-    }
-
-    # 提交（带重试）
-    for attempt in range(3):
-        try:
-            data = curl_post(f"{BASE_URL}/api/dev/task/run", payload)
-            if data.get('code') == '200':
-                break
-        except Exception as e:
-            if attempt == 2:
-                raise
-            print(f"    提交重试 {attempt+1}: {e}")
-            time.sleep(5)
-
-    task_id = data['data']
-
-    # 获取结果（带重试）
-    for attempt in range(max_retries):
-        time.sleep(wait)
-        try:
-            payload2 = {
-                "_t": int(time.time() * 1000),
-                "tenantId": "1001", "userId": "47",
-                "projectId": "1906904360294313985",
-                "env": 5,
-                "taskInstanceId": task_id
-            }
-            result = curl_post(f"{BASE_URL}/api/logger/getQueryLog", payload2)
-            if result.get('code') == '200' and result.get('data'):
-                for item in result['data']:
-                    cols = item.get('columns', [])
-                    if cols and len(cols) > 1:
-                        return cols[0], cols[1:]
-        except Exception as e:
-            print(f"    获取重试 {attempt+1}: {e}")
-        wait = min(wait + 2, 15)
-
-    raise Exception(f"查询超时, task_id={task_id}")
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cyberdata'))
+from cyberdata_query import CyberDataClient, QueryError
+from stream import XlsxSink, iter_batches
+
+HEADERS = ['user_no', 'ab_bash_10000', 'sub_group']
+SPOOL_FILE = "/tmp/control_group_split_users.csv"
+PROGRESS_FILE = "/tmp/control_group_split_progress.json"
+WRITE_BATCH = 1000
+
+SQL = """
+SELECT g.user_no, l.ab_bash_10000
+FROM dw_ads.ads_marketing_t_user_group_d_his g
+JOIN dw_ads.user_label_df l
+  ON g.user_no = l.user_no AND l.tenant = 'LKUS' AND l.dt = '2026-03-09'
+WHERE g.tenant = 'LKUS' AND g.dt = '2026-03-09'
+  AND g.group_name = '0212价格实验40%分流对照组3'
+  AND l.ab_bash_10000 BETWEEN 6000 AND 9999
+"""
+
+
+def fetch(client):
+    """分页拉取到暂存 CSV，返回累计用户数"""
+    # 断点续传：进度文件记录最后一个 user_no 和对应的暂存文件长度，
+    # 写完一页但没来得及记进度就中断时，截掉多出来的半页，避免重复行
+    after, total, offset = None, 0, 0
+    if os.path.exists(PROGRESS_FILE) and os.path.exists(SPOOL_FILE):
+        with open(PROGRESS_FILE) as f:
+            progress = json.load(f)
+        after, total, offset = progress['after'], progress['rows'], progress['offset']
+        print(f"恢复进度: 已有 {total} 用户, 从 user_no > {after} 继续")
+
+    with open(SPOOL_FILE, 'a+', newline='') as fp:
+        fp.truncate(offset)
+        fp.seek(offset)
+        writer = csv.writer(fp)
+        for page, (_, rows) in enumerate(iter_batches(client, SQL, key='user_no',
+                                                      label='对照组3', after=after), 1):
+            writer.writerows(rows)
+            fp.flush()
+            total += len(rows)
+            with open(PROGRESS_FILE, 'w') as f:
+                json.dump({'after': rows[-1][0], 'rows': total, 'offset': fp.tell()}, f)
+            print(f"  第{page}页: +{len(rows)}, 累计{total}")
+    return total
+
+
+def read_group(parity):
+    """从暂存文件按桶号奇偶读出一组，yield [user_no, bucket, sub_group]"""
+    sub_group = 'A_偶数桶' if parity == 0 else 'B_奇数桶'
+    with open(SPOOL_FILE, newline='') as fp:
+        for user_no, bucket in csv.reader(fp):
+            bucket = int(bucket)
+            if bucket % 2 == parity:
+                yield [user_no, bucket, sub_group]
+
+
+def write_group(parity, *sinks):
+    batch = []
+    for row in read_group(parity):
+        batch.append(row)
+        if len(batch) >= WRITE_BATCH:
+            for sink in sinks:
+                sink.write(HEADERS, batch)
+            batch = []
+    for sink in sinks:
+        sink.write(HEADERS, batch)
 
 
 def main():
@@ -88,126 +85,37 @@ def main():
     print("对照组3 奇偶桶号切分 → 导出Excel")
     print("=" * 60)
 
-    # 断点续传
-    progress_file = "/tmp/control_group_split_progress.json"
-    all_users = []
-    start_from = 6000
-
-    if os.path.exists(progress_file):
-        with open(progress_file) as f:
-            progress = json.load(f)
-        all_users = progress.get('users', [])
-        start_from = progress.get('next_start', 6000)
-        print(f"恢复进度: 已有 {len(all_users)} 用户, 从桶号 {start_from} 继续")
-
-    BATCH_SIZE = 30
-    batch_num = 0
-    failed_batches = []
-
-    for start in range(start_from, 10000, BATCH_SIZE):
-        end = min(start + BATCH_SIZE - 1, 9999)
-        batch_num += 1
-
-        sql = f"""
-        SELECT g.user_no, l.ab_bash_10000
-        FROM dw_ads.ads_marketing_t_user_group_d_his g
-        JOIN dw_ads.user_label_df l
-          ON g.user_no = l.user_no AND l.tenant = 'LKUS' AND l.dt = '2026-03-09'
-        WHERE g.tenant = 'LKUS' AND g.dt = '2026-03-09'
-          AND g.group_name = '0212价格实验40%分流对照组3'
-          AND l.ab_bash_10000 BETWEEN {start} AND {end}
-        """
-
-        try:
-            header, rows = run_sql(sql, wait=7)
-            batch_count = len(rows)
-            all_users.extend(rows)
-            warn = " ⚠️截断!" if batch_count >= 500 else ""
-            print(f"  批次{batch_num}: 桶号{start}-{end}, +{batch_count}{warn}, 累计{len(all_users)}")
-        except Exception as e:
-            print(f"  ❌ 批次{batch_num} (桶号{start}-{end}): {e}")
-            failed_batches.append((start, end))
-            # 保存进度并继续（不中断）
-            with open(progress_file, 'w') as f:
-                json.dump({'users': all_users, 'next_start': end + 1}, f)
-
-        # 每20批保存进度
-        if batch_num % 20 == 0:
-            with open(progress_file, 'w') as f:
-                json.dump({'users': all_users, 'next_start': end + 1}, f)
-            print(f"  --- 进度已保存 ({len(all_users)} 用户) ---")
-
-        time.sleep(1.5)
-
-    # 重试失败的批次
-    if failed_batches:
-        print(f"\n重试 {len(failed_batches)} 个失败批次...")
-        time.sleep(5)
-        for start, end in failed_batches:
-            sql = f"""
-            SELECT g.user_no, l.ab_bash_10000
-            FROM dw_ads.ads_marketing_t_user_group_d_his g
-            JOIN dw_ads.user_label_df l
-              ON g.user_no = l.user_no AND l.tenant = 'LKUS' AND l.dt = '2026-03-09'
-            WHERE g.tenant = 'LKUS' AND g.dt = '2026-03-09'
-              AND g.group_name = '0212价格实验40%分流对照组3'
-              AND l.ab_bash_10000 BETWEEN {start} AND {end}
-            """
-            try:
-                header, rows = run_sql(sql, wait=10)
-                all_users.extend(rows)
-                print(f"  ✅ 重试成功: 桶号{start}-{end}, +{len(rows)}条")
-            except Exception as e:
-                print(f"  ❌ 重试仍失败: 桶号{start}-{end}: {e}")
-            time.sleep(2)
-
-    print(f"\n总计获取 {len(all_users)} 个用户")
-
-    # 去重（以防重试导致重复）
-    seen = set()
-    unique_users = []
-    for row in all_users:
-        if row[0] not in seen:
-            seen.add(row[0])
-            unique_users.append(row)
-    print(f"去重后: {len(unique_users)} 个用户")
-
-    # 切分
-    group_a, group_b = [], []
-    for row in unique_users:
-        user_no, bucket = row[0], int(row[1])
-        entry = {'user_no': user_no, 'ab_bash_10000': bucket,
-                 'sub_group': 'A_偶数桶' if bucket % 2 == 0 else 'B_奇数桶'}
-        (group_a if bucket % 2 == 0 else group_b).append(entry)
-
-    print(f"子组A (偶数桶): {len(group_a)} 人")
-    print(f"子组B (奇数桶): {len(group_b)} 人")
-
-    # 导出 Excel
-    import openpyxl
     output_dir = os.path.expanduser("~/Downloads")
-
-    def save_excel(data, filename, sheet_name):
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = sheet_name
-        ws.append(['user_no', 'ab_bash_10000', 'sub_group'])
-        for u in data:
-            ws.append([u['user_no'], u['ab_bash_10000'], u['sub_group']])
-        path = os.path.join(output_dir, filename)
-        wb.save(path)
-        return path
-
-    p1 = save_excel(group_a, "对照组3_子组A_偶数桶.xlsx", "子组A_偶数桶")
-    print(f"\n✅ 子组A: {p1} ({len(group_a)}人)")
-    p2 = save_excel(group_b, "对照组3_子组B_奇数桶.xlsx", "子组B_奇数桶")
-    print(f"✅ 子组B: {p2} ({len(group_b)}人)")
-    p3 = save_excel(group_a + group_b, "对照组3_切分汇总.xlsx", "对照组3_切分汇总")
-    print(f"✅ 汇总表: {p3} ({len(group_a)+len(group_b)}人)")
-
-    # 清理进度文件
-    if os.path.exists(progress_file):
-        os.remove(progress_file)
+    client = CyberDataClient(verbose=False)
+
+    try:
+        total = fetch(client)
+    except QueryError as e:
+        print(f"❌ 查询失败: {e}")
+        print(f"进度已保存到 {PROGRESS_FILE}，重新运行即可从断点继续")
+        sys.exit(1)
+    print(f"\n总计: {total} 用户")
+
+    sink_a = XlsxSink(os.path.join(output_dir, "对照组3_子组A_偶数桶.xlsx"), "子组A_偶数桶")
+    sink_b = XlsxSink(os.path.join(output_dir, "对照组3_子组B_奇数桶.xlsx"), "子组B_奇数桶")
+    sink_all = XlsxSink(os.path.join(output_dir, "对照组3_切分汇总.xlsx"), "对照组3_切分汇总")
+    try:
+        write_group(0, sink_a, sink_all)
+        write_group(1, sink_b, sink_all)
+    finally:
+        for sink in (sink_a, sink_b, sink_all):
+            sink.close()
+
+    # 全部写完才清理，导出失败时暂存数据还在，重跑不用再拉
+    for path in (PROGRESS_FILE, SPOOL_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+    print(f"\n子组A (偶数桶): {sink_a.rows} 人")
+    print(f"子组B (奇数桶): {sink_b.rows} 人")
+    print(f"\n✅ 子组A: {sink_a.path} ({sink_a.rows}人)")
+    print(f"✅ 子组B: {sink_b.path} ({sink_b.rows}人)")
+    print(f"✅ 汇总表: {sink_all.path} ({sink_all.rows}人)")
 
     print(f"\n{'=' * 60}")
     print("完成！3个文件已保存到 ~/Downloads/")